@@ -0,0 +1,508 @@
+"""
+Pip on asyncio: Bolt's AsyncApp behind a small ASGI app
+
+Same behaviour as main.py, but Slack Web API calls are awaited on one shared
+aiohttp connection pool instead of holding a thread each, so a worker keeps
+many events in flight at once. Classification, the thread and event stores,
+metrics and live config all come from main.py.
+
+Run with:
+    uvicorn async_main:asgi_app --host 0.0.0.0 --port 3000 --workers 2
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from urllib.parse import parse_qs
+
+import aiohttp
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.request.async_request import AsyncBoltRequest
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
+
+import main
+from main import (
+    SLACK_BOT_TOKEN, SLACK_SIGNING_SECRET,
+    MESSAGE_WORKERS, MESSAGE_QUEUE_DEPTH, REACTION_COALESCE_SECONDS,
+    metrics, slack_api_stats, STARTUP_METRICS,
+    get_config, get_thread_key, is_duplicate_event, is_internal_team_member, triage_message,
+    correlation_id, log_event,
+)
+
+# Connections kept open to slack.com, shared by every in-flight event in the worker
+SLACK_HTTP_POOL_SIZE = int(os.environ.get("SLACK_HTTP_POOL_SIZE", 100))
+
+# Client messages being processed at once per worker; beyond this they're dropped,
+# like a full work queue in main.py
+ASYNC_MAX_IN_FLIGHT = int(os.environ.get("ASYNC_MAX_IN_FLIGHT", MESSAGE_WORKERS * MESSAGE_QUEUE_DEPTH))
+
+# ============================================
+# SLACK API DISPATCHER
+# ============================================
+
+_session = None
+_async_bot = None
+
+def async_slack_client():
+    return get_async_bot().client
+
+async def async_slack_call(method, best_effort=False, **kwargs):
+    """
+    Await a Slack Web API method on the shared connection pool
+    Rate-limit buckets and retry policy are main.SlackCall's, as in main.slack_call
+    """
+    call = main.SlackCall(method, kwargs, best_effort)
+    client_method = getattr(async_slack_client(), method.replace(".", "_"))
+
+    while True:
+        wait = call.wait()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = call.wait()
+        if wait is None:
+            return None
+        call.sending()
+        try:
+            result = await client_method(**kwargs)
+        except (SlackApiError, aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as e:
+            await asyncio.sleep(call.failed(e))
+            continue
+        call.succeeded()
+        return result
+
+async def run_steps(steps):
+    """
+    main.run_steps on the event loop: Slack calls are awaited on the shared pool and
+    blocking steps (SQLite) run on a thread, so a slow database never stalls the loop
+    """
+    value, error = None, None
+    while True:
+        try:
+            step = steps.throw(error) if error else steps.send(value)
+        except StopIteration as stop:
+            return stop.value
+        value, error = None, None
+        try:
+            value = await _run_step(*step)
+        except Exception as e:
+            error = e
+
+async def _run_step(kind, target, args):
+    if kind == "slack":
+        return await async_slack_call(target, **args)
+    if kind == "reaction":
+        result = getattr(reactions, target)(*args)
+        return await result if asyncio.iscoroutine(result) else result
+    return await asyncio.to_thread(target, *args)
+
+class AsyncReactionCoalescer:
+    """main.ReactionCoalescer on the event loop: call_later instead of the scheduler thread"""
+
+    def __init__(self, window_seconds):
+        self.window = window_seconds
+        self._pending = {}
+
+    def show(self, channel_id, message_ts, name):
+        key = (channel_id, message_ts)
+        entry = {"name": name, "applied": False, "handle": None, "task": None}
+        self._pending[key] = entry
+        if self.window > 0:
+            entry["handle"] = asyncio.get_running_loop().call_later(self.window, self._start_flush, key, entry)
+        else:
+            self._start_flush(key, entry)
+
+    def _start_flush(self, key, entry):
+        entry["task"] = asyncio.ensure_future(self._flush(key, entry))
+
+    async def _flush(self, key, entry):
+        try:
+            await async_slack_call("reactions.add", best_effort=True, channel=key[0], timestamp=key[1], name=entry["name"])
+        except Exception as e:
+            log_event("Error adding reaction", level=logging.ERROR, channel=key[0], ts=key[1], error=str(e))
+        entry["applied"] = True
+
+    async def finish(self, channel_id, message_ts, name=None):
+        entry = self._pending.pop((channel_id, message_ts), None)
+
+        if entry:
+            if entry["handle"]:
+                entry["handle"].cancel()
+            if entry["task"]:
+                await entry["task"]
+            if entry["applied"]:
+                try:
+                    await async_slack_call("reactions.remove", best_effort=True, channel=channel_id, timestamp=message_ts, name=entry["name"])
+                except Exception as e:
+                    log_event("Error removing reaction", level=logging.ERROR, channel=channel_id, ts=message_ts, error=str(e))
+            else:
+                slack_api_stats.add("reactions_coalesced", 2)
+
+        if name is None:
+            return
+        try:
+            await async_slack_call("reactions.add", best_effort=True, channel=channel_id, timestamp=message_ts, name=name)
+        except Exception as e:
+            log_event("Error adding reaction", level=logging.ERROR, channel=channel_id, ts=message_ts, error=str(e))
+
+reactions = AsyncReactionCoalescer(REACTION_COALESCE_SECONDS)
+
+# ============================================
+# IN-FLIGHT MESSAGES
+# ============================================
+
+class OrderedTasks:
+    """
+    Event-loop counterpart of main.OrderedWorkQueue
+    Work for the same key runs in arrival order; different keys run concurrently
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._tails = {}
+        self._in_flight = 0
+
+    def submit(self, key, func, *args):
+        """Schedule func(*args); False if the worker is already at its limit"""
+        if self._in_flight >= self.limit:
+            return False
+        self._in_flight += 1
+        previous = self._tails.get(key)
+        task = asyncio.ensure_future(self._run(key, previous, func, args))
+        self._tails[key] = task
+        return True
+
+    async def _run(self, key, previous, func, args):
+        try:
+            if previous:
+                await asyncio.wait([previous])
+            await func(*args)
+        except Exception as e:
+            log_event("Error processing message", level=logging.ERROR, exc_info=True, thread=key, error=str(e))
+        finally:
+            self._in_flight -= 1
+            if self._tails.get(key) is asyncio.current_task():
+                del self._tails[key]
+
+    def pending(self):
+        return self._in_flight
+
+    async def drain(self, timeout):
+        if self._tails:
+            await asyncio.wait(list(self._tails.values()), timeout=timeout)
+
+message_tasks = OrderedTasks(ASYNC_MAX_IN_FLIGHT)
+
+# ============================================
+# HANDLERS
+# ============================================
+
+async def get_welcome_mentions(channel_id):
+    try:
+        member_ids = main.cached_channel_members(channel_id)
+        if member_ids is None:
+            members = {}
+            cursor = None
+            while True:
+                result = await async_slack_call("conversations.members", channel=channel_id, cursor=cursor, limit=1000)
+                members.update(dict.fromkeys(result.get("members", [])))
+                cursor = (result.get("response_metadata") or {}).get("next_cursor")
+                if not cursor:
+                    break
+            main.store_channel_members(channel_id, members)
+            member_ids = list(members)
+    except Exception as e:
+        log_event("Error getting channel members", level=logging.ERROR, channel=channel_id, error=str(e))
+        return "Welcome"
+    return main.external_mentions(member_ids)
+
+class AsyncBurstCoalescer(main.BurstCoalescer):
+    """main.BurstCoalescer with its debounce timers on the event loop"""
+
+    def _schedule(self, delay, func, *args):
+        return asyncio.get_running_loop().call_later(delay, func, *args)
+
+    def _cancel(self, handle):
+        handle.cancel()
+
+def handle_burst(messages, received_at, bodies=()):
+    correlation_id.set(main.message_correlation_id(messages[0]))
+    if len(messages) > 1:
+        metrics.inc("pip_burst_messages_total", value=len(messages) - 1)
+    if dispatch_message(main.merge_burst(messages), received_at) and bodies:
+        # On a loop callback: the SQLite write runs on the default executor
+        asyncio.get_running_loop().run_in_executor(None, main.mark_events_seen, bodies)
+
+bursts = AsyncBurstCoalescer(main.BURST_WINDOW_SECONDS, main.BURST_MAX_SECONDS, handle_burst)
+
+async def handle_message(message, body=None):
+    # Tasks started from here copy the context, so the id follows the message onto message_tasks
+    correlation_id.set(main.message_correlation_id(message))
+    if main.BURST_WINDOW_SECONDS > 0 and "bot_id" not in message and not is_internal_team_member(message.get("user")):
+        bursts.add(main.burst_key(message), message, time.perf_counter(), body)
+    elif dispatch_message(message):
+        await asyncio.to_thread(main.mark_event_seen, body)
+
+def dispatch_message(message, received_at=None):
+    triaged = triage_message(message, received_at)
+    if not triaged:
+        return True
+    decision, received_at = triaged
+
+    thread_key = get_thread_key(message.get("channel"), message.get("thread_ts", message.get("ts")))
+    if not message_tasks.submit(thread_key, process_client_message, message, decision, received_at):
+        log_event("Too many messages in flight, dropping", level=logging.WARNING, thread=thread_key)
+        main.record_outcome("dropped", received_at)
+        return False
+    return True
+
+async def process_client_message(message, decision, received_at):
+    await run_steps(main.client_message_steps(message, decision, received_at))
+
+async def handle_onboard_main(ack, say, command):
+    await ack()
+    if not is_internal_team_member(command["user_id"]):
+        await say(main.TEAM_ONLY_TEXT, ephemeral=True)
+        return
+    client = get_config().client_for(command["channel_id"], command.get("team_id"))
+    await say(text=main.onboard_main_text(await get_welcome_mentions(command["channel_id"]), client))
+
+async def handle_onboard_live(ack, say, command):
+    await ack()
+    if not is_internal_team_member(command["user_id"]):
+        await say(main.TEAM_ONLY_TEXT, ephemeral=True)
+        return
+    await say(text=main.onboard_live_text(await get_welcome_mentions(command["channel_id"])))
+
+async def handle_new_campaign(ack, body, say):
+    await ack()
+    client = get_config().client_for(body.get("channel_id"), body.get("team_id"))
+    await say(text=main.new_campaign_text(client))
+
+async def handle_backfill(ack, command, respond):
+    # The backfill itself runs on a thread with the sync client, as in the Flask app
+    await ack()
+    loop = asyncio.get_running_loop()
+
+    def respond_from_thread(text):
+        asyncio.run_coroutine_threadsafe(respond(text), loop).result()
+
+    await asyncio.to_thread(main.handle_backfill, lambda: None, command, respond_from_thread)
+
+async def handle_broadcast(ack, command, respond):
+    # Same as the Flask app: planned here, posted from a thread with the sync client
+    await ack()
+    loop = asyncio.get_running_loop()
+
+    def respond_from_thread(text):
+        asyncio.run_coroutine_threadsafe(respond(text), loop).result()
+
+    await asyncio.to_thread(main.handle_broadcast, lambda: None, command, respond_from_thread)
+
+async def handle_member_joined(event, body):
+    await asyncio.to_thread(main.handle_member_joined, event, body)
+
+async def handle_member_left(event, body):
+    await asyncio.to_thread(main.handle_member_left, event, body)
+
+# ============================================
+# INITIALIZATION
+# ============================================
+
+def build_async_bot(session):
+    client = AsyncWebClient(token=SLACK_BOT_TOKEN, session=session, base_url=main.SLACK_API_BASE_URL or AsyncWebClient.BASE_URL)
+    bot = AsyncApp(signing_secret=SLACK_SIGNING_SECRET, client=client)
+    bot.event("member_joined_channel")(handle_member_joined)
+    bot.event("member_left_channel")(handle_member_left)
+    bot.command("/pip-onboard")(handle_onboard_main)
+    bot.command("/pip-onboard-live")(handle_onboard_live)
+    bot.command("/new-campaign")(handle_new_campaign)
+    bot.command("/pip-backfill")(handle_backfill)
+    bot.command("/pip-broadcast")(handle_broadcast)
+    bot.message(".*")(handle_message)
+    return bot
+
+def get_async_bot():
+    if _async_bot is None:
+        raise RuntimeError("async app not started; serve asgi_app so the lifespan startup runs")
+    return _async_bot
+
+async def startup():
+    global _session, _async_bot
+    started = time.perf_counter()
+    _session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=SLACK_HTTP_POOL_SIZE))
+    _async_bot = build_async_bot(_session)
+    get_config()
+    main.start_background_workers()
+    STARTUP_METRICS["warmup_seconds"] = round(time.perf_counter() - started, 4)
+    STARTUP_METRICS["worker_pid"] = os.getpid()
+    log_event("Startup (asyncio)", import_seconds=STARTUP_METRICS["import_seconds"],
+              warmup_seconds=STARTUP_METRICS["warmup_seconds"])
+
+async def shutdown():
+    bursts.flush_all()
+    await message_tasks.drain(main.MESSAGE_DRAIN_TIMEOUT_SECONDS)
+    if _session:
+        await _session.close()
+
+metrics.gauge("pip_async_in_flight", message_tasks.pending)
+
+# ============================================
+# ASGI ROUTES
+# ============================================
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        event = await receive()
+        chunks.append(event.get("body", b""))
+        if not event.get("more_body"):
+            return b"".join(chunks)
+
+async def respond(send, status, body, headers=None):
+    if isinstance(body, (dict, list)):
+        body, headers = json.dumps(body), {"Content-Type": "application/json", **(headers or {})}
+    body = body.encode() if isinstance(body, str) else body
+    raw_headers = [(name.lower().encode(), str(value).encode()) for name, value in (headers or {}).items()]
+    await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": body})
+
+async def dispatch_to_bolt(body, headers, query):
+    bolt_request = AsyncBoltRequest(body=body, query=query, headers={name: [value] for name, value in headers.items()})
+    bolt_response = await get_async_bot().async_dispatch(bolt_request)
+    response_headers = {name: values[-1] for name, values in bolt_response.headers.items() if values}
+    return bolt_response.status, bolt_response.body, response_headers
+
+async def slack_events(body, headers, query):
+    # Redelivered events get an immediate 200 without reaching Bolt
+    if await asyncio.to_thread(is_duplicate_event, body, headers):
+        return 200, "", {"X-Slack-No-Retry": "1"}
+    return await dispatch_to_bolt(body, headers, query)
+
+async def slack_commands(body, headers, query):
+    return await dispatch_to_bolt(body, headers, query)
+
+def parse_json(body):
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+# Summaries are persisted (on a thread, it's SQLite) and posted by main.summary_jobs' worker threads
+async def n8n_transcript_summary(body, headers, query):
+    data = parse_json(body)
+    if main.parse_summary_item(data) is None:
+        return 400, {"status": "error", "message": "Invalid payload"}, None
+
+    status, results = await asyncio.to_thread(main.accept_summaries, [data], headers.get("idempotency-key"))
+    return status, (results[0] if status == 202 else results), None
+
+async def n8n_transcript_summaries(body, headers, query):
+    data = parse_json(body)
+    items = data.get("summaries") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items or len(items) > main.SUMMARY_BATCH_MAX:
+        return 400, {"status": "error", "message": f"Expected 1-{main.SUMMARY_BATCH_MAX} summaries"}, None
+
+    status, results = await asyncio.to_thread(main.accept_summaries, items)
+    return status, {"results": results}, None
+
+async def deliver_broadcast(channel_id, client_name, text, semaphore):
+    async with semaphore:
+        started = time.perf_counter()
+        delivery = {"channel": channel_id, "client": client_name, "ok": True, "ts": None, "error": None}
+        try:
+            delivery["ts"] = (await async_slack_call("chat.postMessage", channel=channel_id, text=text))["ts"]
+        except Exception as e:
+            delivery["ok"] = False
+            delivery["error"] = e.response["error"] if isinstance(e, SlackApiError) else str(e)
+        delivery["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    metrics.inc("pip_broadcast_messages_total", result="sent" if delivery["ok"] else "failed")
+    return delivery
+
+async def n8n_broadcast(body, headers, query):
+    status, result = main.parse_broadcast_request(parse_json(body), headers.get("authorization"))
+    if status:
+        return status, {"status": "error", "message": result}, None
+    messages, dry_run = result
+    if dry_run:
+        return 200, main.run_broadcast(messages, dry_run=True), None
+
+    # Posted in the background like main.queue_broadcast; one in-flight slot for the whole fan-out
+    broadcast_id = os.urandom(6).hex()
+    if not message_tasks.submit(f"broadcast:{broadcast_id}", run_broadcast, broadcast_id, messages):
+        return 503, {"status": "error", "message": "Too busy to queue the broadcast, try again shortly"}, None
+    return 202, main.broadcast_accepted(broadcast_id, messages), None
+
+async def run_broadcast(broadcast_id, messages):
+    correlation_id.set(f"broadcast:{broadcast_id}")
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(main.BROADCAST_CONCURRENCY)
+    deliveries = await asyncio.gather(*(deliver_broadcast(*message, semaphore) for message in messages))
+    report = main.broadcast_report(list(deliveries), time.perf_counter() - started)
+    log_event("Broadcast finished", channels=report["channels"], sent=report["sent"],
+              failed=len(report["failed"]), seconds=report["elapsed_seconds"])
+
+async def n8n_job_status(job_id, body, headers, query):
+    job = await asyncio.to_thread(main.summary_jobs.status, job_id)
+    if job is None:
+        return 404, {"status": "error", "message": "Unknown job"}, None
+    return 200, job, None
+
+async def health_check(body, headers, query):
+    return 200, "Pip is running 🐦", None
+
+async def prometheus_metrics(body, headers, query):
+    return 200, await asyncio.to_thread(metrics.render), {"Content-Type": "text/plain; version=0.0.4"}
+
+async def stats(body, headers, query):
+    # Counting summary jobs reads SQLite, so the whole body is built on a thread
+    return 200, await asyncio.to_thread(main.service_stats, message_tasks.pending()), None
+
+async def sla(body, headers, query):
+    return 200, await asyncio.to_thread(main.sla_ledger.summary, query.get("dimension")), None
+
+ROUTES = {
+    ("GET", "/health"): health_check,
+    ("GET", "/metrics"): prometheus_metrics,
+    ("GET", "/stats"): stats,
+    ("GET", "/sla"): sla,
+    ("POST", "/slack/events"): slack_events,
+    ("POST", "/slack/commands"): slack_commands,
+    ("POST", "/n8n/transcript-summary"): n8n_transcript_summary,
+    ("POST", "/n8n/transcript-summaries"): n8n_transcript_summaries,
+    ("POST", "/n8n/broadcast"): n8n_broadcast,
+}
+JOB_STATUS_PREFIX = "/n8n/jobs/"
+
+async def asgi_app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            event = await receive()
+            if event["type"] == "lifespan.startup":
+                try:
+                    await startup()
+                except Exception as e:
+                    await shutdown()
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif event["type"] == "lifespan.shutdown":
+                await shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    route = ROUTES.get((scope["method"], scope["path"]))
+    if route is None and scope["method"] == "GET" and scope["path"].startswith(JOB_STATUS_PREFIX):
+        route = functools.partial(n8n_job_status, scope["path"][len(JOB_STATUS_PREFIX):])
+    if route is None:
+        await respond(send, 404, "Not Found")
+        return
+
+    body = (await read_body(receive)).decode("utf-8")
+    headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+    query = parse_qs(scope.get("query_string", b"").decode())
+    status, response_body, response_headers = await route(body, headers, query)
+    await respond(send, status, response_body, response_headers)
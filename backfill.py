@@ -0,0 +1,48 @@
+"""
+Answer client questions that were posted while Pip was down
+
+Pages through the history (and threads) of every channel the bot is in, or the
+ones given, since a point in time. Each client message goes through the same
+classification as live events. Pip replies only where neither the team nor
+Pip has answered. Progress is checkpointed after every thread, so running the
+same command again resumes instead of starting over.
+
+Usage:
+    python backfill.py --since 6h --dry-run
+    python backfill.py --since 1717430400.000000 --channel C0123 --channel C0456
+    python backfill.py --since 2d --workers 8 --checkpoint /var/lib/pip/backfill.json
+"""
+
+import argparse
+import sys
+
+import main
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Reply to client questions Pip missed while it was down")
+    parser.add_argument("--since", required=True, help="how far back to look: 6h, 90m, 2d or a Slack timestamp")
+    parser.add_argument("--channel", action="append", help="only this channel (repeatable; default: every channel Pip is in)")
+    parser.add_argument("--workers", type=int, default=main.BACKFILL_WORKERS, help="channels scanned in parallel")
+    parser.add_argument("--checkpoint", default=main.BACKFILL_CHECKPOINT_PATH, help="progress file used to resume")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be answered without posting")
+    args = parser.parse_args()
+
+    try:
+        since = main.parse_since(args.since)
+    except ValueError:
+        parser.error(f"can't parse --since {args.since!r}")
+
+    totals = main.run_backfill(
+        since, channels=args.channel, dry_run=args.dry_run,
+        checkpoint_path=args.checkpoint, workers=args.workers, progress=print
+    )
+
+    print(f"Done: {totals.get('channels', 0)} channels ({totals.get('skipped', 0)} already finished), "
+          f"{totals.get('scanned', 0)} client messages scanned, {totals.get('replied', 0)} "
+          f"{'would be answered' if args.dry_run else 'answered'}, {totals.get('answered', 0)} already answered")
+    if totals.get("errors"):
+        print(f"{totals['errors']} channels failed; run the same command again to resume")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main_cli()
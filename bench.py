@@ -0,0 +1,447 @@
+"""
+Offline replay benchmark for Pip's message-handling hot path
+
+Replays Slack message events through handle_message against a stub Slack
+client (no network, no workspace) and reports throughput, latency
+percentiles, allocations and Slack API calls per message for each outcome.
+It also runs every classifier implementation over the same corpus, and with
+--concurrency compares how many client messages the threaded work queue
+(Flask mode) and the asyncio mode (async_main.py) keep in flight at once.
+--bursts replays questions split over several quick messages with and
+without burst coalescing.
+
+Usage:
+    python bench.py                          # 5000 synthetic events
+    python bench.py --synthetic 20000 --seed 7
+    python bench.py --corpus events.jsonl    # one message event (or event_callback) per line
+    python bench.py --api-latency-ms 50 --json results.json
+    python bench.py --concurrency 500 --api-latency-ms 100
+    python bench.py --bursts 500
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+
+# Keep benchmark state away from the real SQLite file and metrics directory,
+# and don't let client-side rate budgeting sleep between stubbed calls
+_scratch = tempfile.mkdtemp(prefix="pip-bench-")
+os.environ["STATE_DB_PATH"] = os.path.join(_scratch, "state.db")
+os.environ["METRICS_DIR"] = os.path.join(_scratch, "metrics")
+os.environ["SLACK_RATE_LIMITING"] = "0"
+# Replay times each event inline; bursts are measured separately with --bursts
+os.environ["BURST_WINDOW_SECONDS"] = "0"
+# Only warnings and errors, so log output doesn't mix with the results
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import main
+from legacy_classifier import legacy_classify
+
+CLIENT_USERS = ["UCLIENT001", "UCLIENT002", "UCLIENT003", "UCLIENT004"]
+CHANNELS = [f"C{index:08d}" for index in range(50)]
+CHATTER = ["sounds good", "thanks!", "ok", "great", "will do", "haha nice", "see you then", "👍"]
+
+# ============================================
+# STUB SLACK CLIENT
+# ============================================
+
+class StubSlackClient:
+    """Answers any Web API method with a canned response and counts the calls"""
+
+    def __init__(self, latency_seconds=0.0):
+        self.latency = latency_seconds
+        self.calls = Counter()
+
+    def respond(self, method, kwargs):
+        self.calls[method] += 1
+        if method == "conversations.replies":
+            return {"ok": True, "messages": [{"ts": kwargs.get("ts"), "user": CLIENT_USERS[0]}]}
+        if method == "conversations.members":
+            return {"ok": True, "members": CLIENT_USERS + list(main.INTERNAL_TEAM_IDS)}
+        return {"ok": True, "ts": f"{time.time():.6f}"}
+
+    def __getattr__(self, name):
+        method = name.replace("_", ".", 1)
+
+        def call(**kwargs):
+            if self.latency:
+                time.sleep(self.latency)
+            return self.respond(method, kwargs)
+
+        return call
+
+class AsyncStubSlackClient(StubSlackClient):
+    """StubSlackClient for async_main: the latency is awaited, not slept"""
+
+    def __getattr__(self, name):
+        method = name.replace("_", ".", 1)
+
+        async def call(**kwargs):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return self.respond(method, kwargs)
+
+        return call
+
+class InlineQueue:
+    """Runs queued work immediately so each event's full cost lands in its own timing"""
+
+    def submit(self, key, func, *args, timeout=None):
+        # Same signature as OrderedWorkQueue.submit; an inline job never waits for room
+        func(*args)
+        return True
+
+    def pending(self):
+        return 0
+
+# ============================================
+# CORPUS
+# ============================================
+
+def synthetic_events(count, seed):
+    """Message events built from the FAQ, routing and meeting vocabularies"""
+    rng = random.Random(seed)
+    faq_patterns = [pattern for faq in main.FAQ_DATABASE for pattern in faq["question_patterns"]]
+    routing_keywords = [keyword for config in main.QUESTION_ROUTING.values() for keyword in config["keywords"]]
+    team_ids = sorted(main.INTERNAL_TEAM_IDS)
+    recent_threads = []
+    base_ts = 1700000000
+
+    for index in range(count):
+        ts = f"{base_ts + index}.{index % 1000000:06d}"
+        channel_id = rng.choice(CHANNELS)
+        roll = rng.random()
+
+        if roll < 0.30:
+            text = rng.choice(CHATTER + main.SHORT_ACKS)
+        elif roll < 0.45:
+            text = f"{rng.choice(faq_patterns)}?"
+        elif roll < 0.60:
+            text = f"hey, {rng.choice(main.MEETING_KEYWORDS)} this week?"
+        elif roll < 0.80:
+            text = f"{rng.choice(main.QUESTION_STARTERS)} is the {rng.choice(routing_keywords)} looking"
+        else:
+            text = f"we're {rng.choice(main.CONCERN_WORDS)} about the {rng.choice(routing_keywords)}, please advise"
+
+        event = {"type": "message", "channel": channel_id, "user": rng.choice(CLIENT_USERS), "text": text, "ts": ts}
+
+        # Some replies land in existing threads, some come from the team or a bot
+        if recent_threads and rng.random() < 0.25:
+            event["channel"], event["thread_ts"] = rng.choice(recent_threads)
+            if rng.random() < 0.3:
+                event["user"] = rng.choice(team_ids)
+        elif rng.random() < 0.03:
+            event["bot_id"] = "BPIP"
+        recent_threads.append((event["channel"], event.get("thread_ts", ts)))
+        recent_threads = recent_threads[-200:]
+        yield event
+
+def corpus_events(path):
+    """Message events from a JSONL file; event_callback envelopes are unwrapped"""
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            event = record.get("event", record)
+            if event.get("type", "message") == "message" and "text" in event:
+                yield event
+
+# ============================================
+# CLASSIFIERS
+# ============================================
+
+CLASSIFIERS = {
+    "legacy": legacy_classify,
+    "compiled": lambda message_text: main.get_classifier().classify(message_text),
+    "compiled+fuzzy_faq": lambda message_text: main._classify(message_text, main.get_config(), None),
+    # Same decisions, served from the per-snapshot cache after the first sighting of a text
+    "decision_cache": main.classify_message,
+}
+
+def bench_classifiers(texts, repeat):
+    results = {}
+    reference = [legacy_classify(text) for text in texts]
+    for name, classify in CLASSIFIERS.items():
+        classify(texts[0])  # build any lazy tables outside the timing
+        started = time.perf_counter()
+        for _ in range(repeat):
+            decisions = [classify(text) for text in texts]
+        elapsed = time.perf_counter() - started
+        agree = sum(1 for decision, expected in zip(decisions, reference) if decision == expected)
+        results[name] = {
+            "messages_per_sec": round(len(texts) * repeat / elapsed),
+            "us_per_message": round(elapsed / (len(texts) * repeat) * 1e6, 2),
+            "agreement_with_legacy": round(agree / len(texts), 4),
+        }
+    return results
+
+# ============================================
+# HOT PATH REPLAY
+# ============================================
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def replay(events, stub, trace_allocations):
+    """Run each event through handle_message; returns per-outcome samples"""
+    outcomes = []
+    record_outcome = main.record_outcome
+
+    def capture(outcome, received_at, **labels):
+        outcomes.append(outcome)
+        record_outcome(outcome, received_at, **labels)
+
+    main.record_outcome = capture
+    samples = defaultdict(lambda: {"latency": [], "api_calls": [], "alloc_bytes": []})
+    try:
+        for event in events:
+            calls_before = sum(stub.calls.values())
+            outcomes.append("bot_message")
+            if trace_allocations:
+                tracemalloc.reset_peak()
+                memory_before = tracemalloc.get_traced_memory()[0]
+            started = time.perf_counter()
+            main.handle_message(dict(event))
+            elapsed = time.perf_counter() - started
+
+            outcome = outcomes[-1]
+            sample = samples[outcome]
+            sample["latency"].append(elapsed)
+            sample["api_calls"].append(sum(stub.calls.values()) - calls_before)
+            if trace_allocations:
+                sample["alloc_bytes"].append(tracemalloc.get_traced_memory()[1] - memory_before)
+    finally:
+        main.record_outcome = record_outcome
+    return samples
+
+def summarize(samples):
+    report = {}
+    for outcome, sample in sorted(samples.items()):
+        latency = sorted(sample["latency"])
+        count = len(latency)
+        report[outcome] = {
+            "messages": count,
+            "p50_ms": round(percentile(latency, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(latency, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(latency, 0.99) * 1000, 3),
+            "api_calls_per_message": round(sum(sample["api_calls"]) / count, 2),
+        }
+        if sample["alloc_bytes"]:
+            report[outcome]["peak_alloc_bytes"] = round(sum(sample["alloc_bytes"]) / count)
+    return report
+
+# ============================================
+# CONCURRENCY
+# ============================================
+
+def fresh_thread_store(name):
+    return main.SharedKeyStore(
+        os.path.join(_scratch, f"{name}.db"), "handled_threads", main.HANDLED_THREAD_TTL_SECONDS,
+        main.HANDLED_THREAD_MAX_ENTRIES, main.HANDLED_THREAD_LOCAL_CACHE, encode=main.encode_thread_key
+    )
+
+def client_messages(count):
+    """count root-level client questions, each in its own thread, already triaged"""
+    messages = []
+    for event in synthetic_events(count * 10, seed=1):
+        if "bot_id" in event or "thread_ts" in event or event["user"] not in CLIENT_USERS:
+            continue
+        event = dict(event, ts=f"{1800000000 + len(messages)}.000000")
+        triaged = main.triage_message(event)
+        if triaged:
+            messages.append((event, triaged[0]))
+        if len(messages) == count:
+            break
+    return messages
+
+def run_threaded(messages, latency):
+    """Flask mode: every message holds a MESSAGE_WORKERS thread for its Slack round-trips"""
+    stub = StubSlackClient(latency)
+    main.slack_client = lambda: stub
+    main.handled_threads = fresh_thread_store("threaded")
+    work_queue = main.OrderedWorkQueue("bench", main.MESSAGE_WORKERS, len(messages), enqueue_timeout=1)
+    done = threading.Semaphore(0)
+
+    def process(message, decision, received_at):
+        main.process_client_message(message, decision, received_at)
+        done.release()
+
+    started = time.perf_counter()
+    for message, decision in messages:
+        work_queue.submit(main.get_thread_key(message["channel"], message["ts"]), process, message, decision, started)
+    for _ in messages:
+        done.acquire()
+    elapsed = time.perf_counter() - started
+    work_queue.shutdown(1)
+    return {"in_flight": main.MESSAGE_WORKERS, "elapsed_s": round(elapsed, 3), "api_calls": sum(stub.calls.values())}
+
+def run_async(messages, latency):
+    """asyncio mode: all messages in flight on one event loop"""
+    import async_main
+
+    stub = AsyncStubSlackClient(latency)
+    async_main.async_slack_client = lambda: stub
+    main.handled_threads = fresh_thread_store("async")
+    tasks = async_main.OrderedTasks(len(messages))
+    peak = 0
+
+    async def drive():
+        nonlocal peak
+        started = time.perf_counter()
+        for message, decision in messages:
+            tasks.submit(main.get_thread_key(message["channel"], message["ts"]),
+                         async_main.process_client_message, message, decision, started)
+        while tasks.pending():
+            peak = max(peak, tasks.pending())
+            await asyncio.sleep(latency / 10 or 0.001)
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(drive())
+    return {"in_flight": peak, "elapsed_s": round(elapsed, 3), "api_calls": sum(stub.calls.values())}
+
+def bench_concurrency(count, latency):
+    messages = client_messages(count)
+    results = {}
+    for name, run in [("threaded", run_threaded), ("asyncio", run_async)]:
+        result = run(messages, latency)
+        result["messages"] = len(messages)
+        result["messages_per_sec"] = round(len(messages) / result["elapsed_s"])
+        results[name] = result
+    return results
+
+# ============================================
+# BURSTS
+# ============================================
+
+BURST_OPENERS = ["hey", "hi team", "quick question", "so"]
+
+def burst_corpus(count, seed):
+    """Client questions split over 2-4 root-level messages: an opener, then the question in pieces"""
+    rng = random.Random(seed)
+    bursts = []
+    for event in synthetic_events(count * 10, seed):
+        if "bot_id" in event or "thread_ts" in event or event["user"] not in CLIENT_USERS:
+            continue
+        if not main.triage_message(dict(event)):
+            continue
+        words = event["text"].split()
+        cut = rng.randint(1, max(1, len(words) - 1))
+        texts = [" ".join(words[:cut]), " ".join(words[cut:])]
+        if rng.random() < 0.5:
+            texts.insert(0, rng.choice(BURST_OPENERS))
+        texts = [text for text in texts if text]
+        base = 1900000000 + len(bursts) * 10
+        bursts.append([dict(event, text=text, ts=f"{base + index}.000000") for index, text in enumerate(texts)])
+        if len(bursts) == count:
+            break
+    return bursts
+
+def bench_bursts(count):
+    """API calls and replies for the same bursts, message by message vs coalesced"""
+    bursts = burst_corpus(count, seed=3)
+    results = {}
+    for name in ["per_message", "coalesced"]:
+        stub = StubSlackClient()
+        main.slack_client = lambda: stub
+        main.handled_threads = fresh_thread_store(f"burst-{name}")
+        for burst in bursts:
+            if name == "coalesced":
+                main.handle_burst(burst, time.perf_counter())
+            else:
+                for message in burst:
+                    main.dispatch_message(message)
+        results[name] = {
+            "bursts": len(bursts),
+            "messages": sum(len(burst) for burst in bursts),
+            "replies": stub.calls["chat.postMessage"],
+            "api_calls": sum(stub.calls.values()),
+        }
+    return results
+
+def print_table(title, rows, columns):
+    print(f"\n{title}")
+    print("  " + "".join(f"{column:>24}" for column in ["name"] + columns))
+    for name, row in rows.items():
+        print("  " + f"{name:>24}" + "".join(f"{row.get(column, ''):>24}" for column in columns))
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Replay Slack message events through Pip offline")
+    parser.add_argument("--corpus", help="JSONL file of message events (default: synthetic)")
+    parser.add_argument("--synthetic", type=int, default=5000, help="number of synthetic events")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="simulated Slack API latency")
+    parser.add_argument("--classifier-repeat", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="also process this many concurrent client messages in threaded and asyncio modes")
+    parser.add_argument("--bursts", type=int, default=0,
+                        help="also replay this many multi-message questions with and without burst coalescing")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    events = list(corpus_events(args.corpus) if args.corpus else synthetic_events(args.synthetic, args.seed))
+    if not events:
+        parser.error("no message events to replay")
+
+    stub = StubSlackClient(args.api_latency_ms / 1000)
+    main.slack_client = lambda: stub
+    main.message_queue = InlineQueue()
+    main.get_classifier()
+
+    # Timed pass, then a separate pass under tracemalloc (fresh threads so nothing is "already handled")
+    started = time.perf_counter()
+    samples = replay(events, stub, trace_allocations=False)
+    elapsed = time.perf_counter() - started
+    hot_path = summarize(samples)
+
+    main.handled_threads = fresh_thread_store("alloc")
+    main.team_thread_index.clear()
+    tracemalloc.start()
+    for outcome, row in summarize(replay(events, stub, trace_allocations=True)).items():
+        hot_path.setdefault(outcome, {})["peak_alloc_bytes"] = row.get("peak_alloc_bytes", 0)
+    tracemalloc.stop()
+
+    texts = [event.get("text", "") for event in events]
+    classifiers = bench_classifiers(texts, args.classifier_repeat)
+
+    total_calls = sum(sum(sample["api_calls"]) for sample in samples.values())
+    overall = {
+        "events": len(events),
+        "messages_per_sec": round(len(events) / elapsed),
+        "api_calls_per_message": round(total_calls / len(events), 3),
+    }
+
+    print(f"Replayed {overall['events']} events: {overall['messages_per_sec']} msg/s, "
+          f"{overall['api_calls_per_message']} Slack API calls per message")
+    print_table("Hot path by outcome", hot_path,
+                ["messages", "p50_ms", "p95_ms", "p99_ms", "api_calls_per_message", "peak_alloc_bytes"])
+    print_table("Classifiers", classifiers, ["messages_per_sec", "us_per_message", "agreement_with_legacy"])
+
+    results = {"overall": overall, "hot_path": hot_path, "classifiers": classifiers}
+    if args.concurrency:
+        # Without simulated latency there is nothing to overlap
+        latency = (args.api_latency_ms or 100) / 1000
+        results["concurrency"] = bench_concurrency(args.concurrency, latency)
+        print_table(f"Concurrent client messages ({latency * 1000:.0f} ms per Slack call)", results["concurrency"],
+                    ["messages", "in_flight", "elapsed_s", "messages_per_sec", "api_calls"])
+
+    if args.bursts:
+        results["bursts"] = bench_bursts(args.bursts)
+        print_table("Multi-message questions", results["bursts"], ["bursts", "messages", "replies", "api_calls"])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,239 @@
+"""
+Classify exported Slack history offline, to tune the keyword and FAQ tables
+
+Streams messages from JSONL files (one message or event_callback per line, "-"
+for stdin) or from a Slack export (the unzipped directory or the .zip itself).
+Each message goes through the same classification as live events, spread over
+a process pool. It writes one decision per message as JSONL, plus aggregate
+stats. Input is read lazily, and only a bounded number of batches is in flight
+at once, so memory stays flat however large the export is.
+
+Set PIP_CONFIG_PATH to classify against a candidate config instead of the
+built-in tables.
+
+Usage:
+    python classify_export.py export.zip -o decisions.jsonl --stats stats.json
+    python classify_export.py messages.jsonl other.jsonl --workers 8
+    cat events.jsonl | python classify_export.py - --exact-only > decisions.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+import zipfile
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import main
+
+# ============================================
+# READERS
+# ============================================
+
+def _message_record(message, channel_id):
+    return {
+        "channel": message.get("channel", channel_id),
+        "ts": message.get("ts"),
+        "thread_ts": message.get("thread_ts"),
+        "user": message.get("user"),
+        "team": message.get("team"),
+        "text": message.get("text", ""),
+        "bot_id": message.get("bot_id"),
+        "subtype": message.get("subtype"),
+    }
+
+def read_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        event = record.get("event", record)
+        if event.get("type", "message") == "message" and "text" in event:
+            yield _message_record(event, event.get("channel"))
+
+def _export_channel_ids(names, read):
+    """Folder name -> channel ID from channels.json / groups.json, when the export has them"""
+    ids = {}
+    for listing in ["channels.json", "groups.json", "mpims.json", "dms.json"]:
+        if listing in names:
+            for channel in json.loads(read(listing)):
+                ids[channel.get("name") or channel["id"]] = channel["id"]
+    return ids
+
+def read_slack_export(names, read):
+    """Messages from a Slack export: one JSON array per channel per day, read one file at a time"""
+    channel_ids = _export_channel_ids(set(names), read)
+    for name in sorted(names):
+        folder, _, file_name = name.rpartition("/")
+        if not folder or not file_name.endswith(".json"):
+            continue
+        channel_id = channel_ids.get(folder.rsplit("/", 1)[-1], folder.rsplit("/", 1)[-1])
+        for message in json.loads(read(name)):
+            if message.get("type", "message") == "message" and "text" in message:
+                yield _message_record(message, channel_id)
+
+def read_path(path):
+    if path == "-":
+        yield from read_jsonl(sys.stdin)
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            yield from read_slack_export(archive.namelist(), lambda name: archive.read(name))
+    elif os.path.isdir(path):
+        names = [os.path.relpath(os.path.join(root, file_name), path).replace(os.sep, "/")
+                 for root, _, files in os.walk(path) for file_name in files]
+
+        def read(name):
+            with open(os.path.join(path, name), "rb") as f:
+                return f.read()
+
+        yield from read_slack_export(names, read)
+    else:
+        with open(path) as f:
+            yield from read_jsonl(f)
+
+def batches(records, size):
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+# ============================================
+# CLASSIFICATION
+# ============================================
+
+def classify_record(record, exact_only=False):
+    """The decision handle_message would reach for one message, without touching Slack"""
+    decision = {"channel": record["channel"], "ts": record["ts"], "user": record["user"]}
+    if record["bot_id"] or record["subtype"]:
+        decision["outcome"] = "skipped"
+        return decision
+    if main.is_internal_team_member(record["user"]):
+        decision["outcome"] = "team_member"
+        return decision
+
+    config = main.get_config()
+    client = config.client_for(record["channel"], record["team"])
+    if exact_only:
+        result = config.matcher_for(client)[0].classify(record["text"])
+    else:
+        result = main.classify_message(record["text"], config, client)
+
+    faq = result["faq"]
+    decision.update({
+        "client": client.name if client else None,
+        "needs_response": result["needs_response"],
+        "is_meeting": result["is_meeting"],
+        "category": result["category"],
+        "team_member": result["team_member"],
+        "faq_category": faq["category"] if faq else None,
+        "faq_score": faq.get("score") if faq else None,
+    })
+    if not result["needs_response"]:
+        decision["outcome"] = "ignored_ack"
+    elif result["is_meeting"]:
+        decision["outcome"] = "meeting"
+    elif faq:
+        decision["outcome"] = "faq"
+    else:
+        decision["outcome"] = "escalation"
+    return decision
+
+def classify_batch(batch, exact_only):
+    return [classify_record(record, exact_only) for record in batch]
+
+class ExportStats:
+    """Running totals, updated one decision at a time"""
+
+    def __init__(self):
+        self.outcomes = Counter()
+        self.categories = Counter()
+        self.faq_categories = Counter()
+        self.fuzzy_faq = 0
+
+    def add(self, decision):
+        self.outcomes[decision["outcome"]] += 1
+        if decision.get("needs_response"):
+            self.categories[decision["category"]] += 1
+        if decision["outcome"] == "faq":
+            self.faq_categories[decision["faq_category"]] += 1
+            if decision["faq_score"] is not None:
+                self.fuzzy_faq += 1
+
+    def report(self):
+        total = sum(self.outcomes.values())
+        needs_response = sum(self.outcomes[outcome] for outcome in ["meeting", "faq", "escalation"])
+
+        def rate(count, whole):
+            return round(count / whole, 4) if whole else 0.0
+
+        return {
+            "messages": total,
+            "client_messages": total - self.outcomes["skipped"] - self.outcomes["team_member"],
+            "needs_response": needs_response,
+            "outcomes": dict(self.outcomes.most_common()),
+            "category_distribution": dict(self.categories.most_common()),
+            "faq_categories": dict(self.faq_categories.most_common()),
+            "faq_hit_rate": rate(self.outcomes["faq"], needs_response),
+            "fuzzy_faq_share": rate(self.fuzzy_faq, self.outcomes["faq"]),
+            "meeting_rate": rate(self.outcomes["meeting"], needs_response),
+            "escalation_rate": rate(self.outcomes["escalation"], needs_response),
+        }
+
+def _quiet_worker():
+    # Decisions may be going to stdout; keep Pip's own log lines off it
+    sys.stdout = sys.stderr
+
+def classify_stream(records, workers, batch_size, exact_only):
+    """
+    Decisions in input order
+    At most 2 batches per worker are queued or running, so the reader never runs far ahead
+    """
+    if workers <= 1:
+        for batch in batches(records, batch_size):
+            yield from classify_batch(batch, exact_only)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_quiet_worker) as pool:
+        in_flight = deque()
+        for batch in batches(records, batch_size):
+            in_flight.append(pool.submit(classify_batch, batch, exact_only))
+            if len(in_flight) >= workers * 2:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Classify exported Slack messages the way Pip would")
+    parser.add_argument("inputs", nargs="+", help="JSONL files, Slack export directories or .zip files ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="per-message decisions as JSONL (default stdout)")
+    parser.add_argument("--stats", help="write the aggregate stats here as JSON (always printed to stderr)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--exact-only", action="store_true", help="skip the fuzzy FAQ fallback")
+    args = parser.parse_args()
+
+    records = (record for path in args.inputs for record in read_path(path))
+    stats = ExportStats()
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    _quiet_worker()
+    try:
+        for decision in classify_stream(records, args.workers, args.batch_size, args.exact_only):
+            stats.add(decision)
+            output.write(json.dumps(decision) + "\n")
+    finally:
+        if args.output != "-":
+            output.close()
+
+    report = stats.report()
+    print(json.dumps(report, indent=2), file=sys.stderr)
+    if args.stats:
+        with open(args.stats, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,25 @@
+# Picked up automatically by `gunicorn main:app` when run from this directory.
+# Bind address and worker count still come from the command line / WEB_CONCURRENCY.
+import gc
+import os
+
+# Import main.py once in the master and fork workers from it
+# (set GUNICORN_PRELOAD=0 to import in every worker instead)
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+def when_ready(server):
+    if not preload_app:
+        return
+    import main
+    main.warm_up()
+    # Keep the preloaded objects out of the cyclic GC so collections in the
+    # workers don't touch (and un-share) their copy-on-write pages
+    gc.freeze()
+
+def post_fork(server, worker):
+    import main
+    main.STARTUP_METRICS["worker_pid"] = os.getpid()
+    if not preload_app:
+        main.warm_up()
+    # Post summaries left over from before a restart without waiting for a webhook
+    main.start_background_workers()
@@ -0,0 +1,44 @@
+"""
+The keyword scans the compiled MessageClassifier replaced, one table at a time
+Kept as the reference both the equivalence test and bench.py compare it against
+"""
+
+import main
+
+def legacy_classify(message_text):
+    """The original keyword scans, one table at a time (reference implementation)"""
+    message_lower = message_text.lower()
+    stripped = message_lower.strip()
+
+    if stripped in main.SHORT_ACKS or (len(message_text) < 10 and "?" not in message_text):
+        needs_response = False
+    else:
+        needs_response = (
+            "?" in message_text
+            or any(stripped.startswith(starter) for starter in main.QUESTION_STARTERS)
+            or any(word in stripped for word in main.CONCERN_WORDS)
+            or any(phrase in stripped for phrase in main.REQUEST_PHRASES)
+        )
+
+    team_member, category = main.DEFAULT_HANDOFF, "general"
+    for name, config in main.QUESTION_ROUTING.items():
+        if any(keyword in message_lower for keyword in config["keywords"]):
+            team_member, category = config["team_member"], name
+            break
+
+    faq = None
+    if needs_response:
+        for entry in main.FAQ_DATABASE:
+            if any(pattern in message_lower for pattern in entry["question_patterns"]):
+                faq = {"answer": entry["answer"], "category": entry["category"]}
+                if entry["category"] in main.QUESTION_ROUTING:
+                    faq["team_member"] = main.QUESTION_ROUTING[entry["category"]]["team_member"]
+                break
+
+    return {
+        "needs_response": needs_response,
+        "is_meeting": any(keyword in message_lower for keyword in main.MEETING_KEYWORDS),
+        "team_member": team_member,
+        "category": category,
+        "faq": faq,
+    }
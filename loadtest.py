@@ -0,0 +1,423 @@
+"""
+Load test for Pip's HTTP stack, with a local stand-in for the Slack Web API
+
+Starts a mock Slack API server (configurable latency and 429 injection), then
+for each server configuration starts Pip under gunicorn or uvicorn pointed at
+it through SLACK_API_BASE_URL. It drives /slack/events and /slack/commands with
+message events and slash commands signed with SLACK_SIGNING_SECRET, open loop
+at a target request rate. Latency is measured from each request's scheduled
+send time, so a server that falls behind shows it in the tail. It reports
+throughput, error rate and latency percentiles per configuration, plus the
+Slack API calls Pip made.
+
+Pip still budgets its own calls to Slack's real per-method limits, so at high
+question rates replies queue up behind chat.postMessage (reactions are just
+skipped once their budget is spent); set SLACK_RATE_LIMITING=0 to measure what the servers alone can take.
+
+Usage:
+    python loadtest.py --rate 100 --duration 20
+    python loadtest.py --configs gunicorn:1x8,gunicorn:2x4,gunicorn:4x2,uvicorn:2 --rate 300
+    python loadtest.py --api-latency-ms 150 --api-429-rate 0.02 --json loadtest.json
+    python loadtest.py --target http://127.0.0.1:3000 --rate 50   # a Pip already running with the same secret
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import secrets
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode
+
+import aiohttp
+
+import main
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CHANNELS = [f"C0LOAD{index:04d}" for index in range(50)]
+CLIENT_USERS = [f"UCLIENT{index:03d}" for index in range(20)]
+QUESTIONS = [
+    "How do I change my billing plan?",
+    "When will the first draft of the script be ready?",
+    "Can you send over the latest analytics report?",
+    "I'm worried the thumbnails aren't converting, what should we change?",
+    "Could we book a call this week to go over the campaign?",
+    "what's the turnaround time for edits?",
+]
+CHATTER = ["thanks!", "sounds good", "ok", "great, will do", "👍", "haha nice"]
+TEAM_REPLIES = ["On it, will get back to you today.", "Looking into this now."]
+
+# ============================================
+# MOCK SLACK API
+# ============================================
+
+class MockSlackHandler(BaseHTTPRequestHandler):
+    """Answers Web API methods (/api/<method>, GET or POST) and response_url posts with canned JSON"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _params(self, query, body):
+        params = {key: values[0] for key, values in parse_qs(query).items()}
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            params.update(json.loads(body or b"{}"))
+        else:
+            params.update((key, values[0]) for key, values in parse_qs(body.decode()).items())
+        return params
+
+    def _reply(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.do_POST()
+
+    def do_POST(self):
+        mock = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path, _, query = self.path.partition("?")
+        method = path.rsplit("/", 1)[-1] if path.startswith("/api/") else "response_url"
+        if mock.latency:
+            time.sleep(mock.latency * random.uniform(0.5, 1.5))
+
+        # auth.test is made once per worker; failing it only tests Bolt's startup
+        if method != "auth.test" and random.random() < mock.rate_429:
+            mock.count(method, "429")
+            self._reply(429, {"ok": False, "error": "ratelimited"}, {"Retry-After": "1"})
+            return
+        mock.count(method, "ok")
+
+        params = self._params(query, body)
+        if method == "auth.test":
+            payload = {"ok": True, "url": "https://mock.slack.com/", "team": "Mock", "user": "pip",
+                       "team_id": "T0MOCK", "user_id": "U0PIP", "bot_id": "B0PIP"}
+        elif method == "conversations.replies":
+            payload = {"ok": True, "messages": [{"ts": params.get("ts"), "user": CLIENT_USERS[0]}],
+                       "response_metadata": {"next_cursor": ""}}
+        elif method == "conversations.members":
+            payload = {"ok": True, "members": CLIENT_USERS[:3] + sorted(mock.team_users),
+                       "response_metadata": {"next_cursor": ""}}
+        elif method == "chat.postMessage":
+            payload = {"ok": True, "channel": params.get("channel"), "ts": f"{time.time():.6f}"}
+        else:
+            payload = {"ok": True}
+        self._reply(200, payload)
+
+class MockSlackServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, port, latency, rate_429, team_users):
+        super().__init__(("127.0.0.1", port), MockSlackHandler)
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.team_users = team_users
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, method, result):
+        with self._lock:
+            self.calls[(method, result)] += 1
+
+    def take_calls(self):
+        with self._lock:
+            calls, self.calls = self.calls, Counter()
+        return calls
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+def start_mock(latency, rate_429, team_users):
+    mock = MockSlackServer(0, latency, rate_429, team_users)
+    threading.Thread(target=mock.serve_forever, name="mock-slack", daemon=True).start()
+    return mock
+
+# ============================================
+# SIGNED REQUESTS
+# ============================================
+
+def sign(secret, body, timestamp=None):
+    """Headers Slack sends with a request: v0 HMAC-SHA256 of "v0:<timestamp>:<body>" """
+    timestamp = str(int(timestamp or time.time()))
+    digest = hmac.new(secret.encode(), f"v0:{timestamp}:{body}".encode(), hashlib.sha256).hexdigest()
+    return {"X-Slack-Request-Timestamp": timestamp, "X-Slack-Signature": f"v0={digest}"}
+
+class RequestMix:
+    """Random message events and slash commands in roughly the proportions Pip sees"""
+
+    def __init__(self, seed, team_users, command_share, team_share, response_url):
+        self.random = random.Random(seed)
+        self.team_users = sorted(team_users)
+        self.command_share = command_share
+        self.team_share = team_share
+        self.response_url = response_url
+        self.sent = 0
+        self.threads = []  # recent client question ts, for team replies and follow-ups
+
+    def next(self):
+        """(kind, path, body, content_type)"""
+        self.sent += 1
+        if self.random.random() < self.command_share:
+            return self._command()
+        return self._event()
+
+    def _event(self):
+        rand = self.random
+        channel_id = rand.choice(CHANNELS)
+        ts = f"{time.time():.6f}"
+        event = {"type": "message", "channel": channel_id, "ts": ts, "channel_type": "channel"}
+        if self.threads and rand.random() < self.team_share:
+            event["channel"], event["thread_ts"] = rand.choice(self.threads)
+            event.update(user=rand.choice(self.team_users), text=rand.choice(TEAM_REPLIES))
+            kind = "event:team"
+        elif rand.random() < 0.4:
+            event.update(user=rand.choice(CLIENT_USERS), text=rand.choice(CHATTER))
+            kind = "event:chatter"
+        else:
+            event.update(user=rand.choice(CLIENT_USERS), text=rand.choice(QUESTIONS))
+            self.threads = (self.threads + [(channel_id, ts)])[-500:]
+            kind = "event:question"
+        body = {
+            "token": "loadtest", "team_id": "T0MOCK", "api_app_id": "A0LOAD", "type": "event_callback",
+            "event_id": f"Ev{self.sent:010d}{rand.randrange(1 << 30):08x}", "event_time": int(time.time()),
+            "event": event,
+        }
+        return kind, "/slack/events", json.dumps(body), "application/json"
+
+    def _command(self):
+        rand = self.random
+        if rand.random() < 0.5:
+            command, user_id = "/new-campaign", rand.choice(CLIENT_USERS)
+        else:
+            command, user_id = "/pip-onboard", rand.choice(self.team_users)
+        body = urlencode({
+            "token": "loadtest", "team_id": "T0MOCK", "team_domain": "mock", "channel_id": rand.choice(CHANNELS),
+            "channel_name": "loadtest", "user_id": user_id, "user_name": "loadtest", "command": command, "text": "",
+            "api_app_id": "A0LOAD", "response_url": f"{self.response_url}commands/{self.sent}",
+            "trigger_id": f"{self.sent}.{rand.randrange(1 << 30)}",
+        })
+        return f"command:{command.lstrip('/')}", "/slack/commands", body, "application/x-www-form-urlencoded"
+
+# ============================================
+# SERVERS
+# ============================================
+
+def server_command(spec, port):
+    """gunicorn:<workers>x<threads> (Flask app) or uvicorn:<workers> (asyncio app)"""
+    kind, _, shape = spec.partition(":")
+    if kind == "gunicorn":
+        workers, _, threads = shape.partition("x")
+        return [sys.executable, "-m", "gunicorn", "main:app", "--bind", f"127.0.0.1:{port}",
+                "--workers", workers or "1", "--threads", threads or "1"]
+    if kind == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "async_main:asgi_app", "--host", "127.0.0.1", "--port", str(port),
+                "--workers", shape or "1", "--no-access-log"]
+    raise ValueError(f"unknown server config {spec!r}")
+
+def free_port():
+    with ThreadingHTTPServer(("127.0.0.1", 0), BaseHTTPRequestHandler) as probe:
+        return probe.server_address[1]
+
+def wait_healthy(target, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process and process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(f"{target}/health", timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+def start_server(spec, secret, mock, scratch):
+    """Pip under spec, with its own state and metrics directories; returns (process, target, log path)"""
+    port = free_port()
+    state_dir = tempfile.mkdtemp(prefix=spec.replace(":", "-") + "-", dir=scratch)
+    env = dict(
+        os.environ,
+        SLACK_SIGNING_SECRET=secret,
+        SLACK_BOT_TOKEN=os.environ.get("SLACK_BOT_TOKEN") or "xoxb-loadtest",
+        SLACK_API_BASE_URL=mock.base_url + "api/",
+        STATE_DB_PATH=os.path.join(state_dir, "state.db"),
+        METRICS_DIR=os.path.join(state_dir, "metrics"),
+        BACKFILL_CHECKPOINT_PATH=os.path.join(state_dir, "backfill.json"),
+    )
+    log_path = os.path.join(state_dir, "server.log")
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(server_command(spec, port), cwd=HERE, env=env,
+                                   stdout=log, stderr=subprocess.STDOUT)
+    return process, f"http://127.0.0.1:{port}", log_path
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+# ============================================
+# LOAD
+# ============================================
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+async def drive(target, secret, mix, rate, duration, max_connections, timeout):
+    """Send rate requests/s for duration seconds on a fixed schedule; returns [(kind, status, seconds)]"""
+    results = []
+    loop = asyncio.get_running_loop()
+    connector = aiohttp.TCPConnector(limit=max_connections)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async def send(session, kind, path, body, content_type, scheduled):
+        headers = dict(sign(secret, body), **{"Content-Type": content_type})
+        try:
+            async with session.post(target + path, data=body.encode(), headers=headers) as response:
+                await response.read()
+                status = response.status
+        except asyncio.TimeoutError:
+            status = "timeout"
+        except aiohttp.ClientError as e:
+            status = type(e).__name__
+        results.append((kind, status, loop.time() - scheduled))
+
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        tasks = []
+        started = loop.time()
+        for index in range(int(rate * duration)):
+            scheduled = started + index / rate
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(send(session, *mix.next(), scheduled)))
+        await asyncio.gather(*tasks)
+    return results
+
+def summarize(results, elapsed):
+    rows = {}
+    by_kind = defaultdict(list)
+    for kind, status, seconds in results:
+        by_kind[kind].append((status, seconds))
+        by_kind["all"].append((status, seconds))
+    for kind, samples in sorted(by_kind.items()):
+        errors = sum(1 for status, _ in samples if status != 200)
+        latencies = sorted(seconds * 1000 for _, seconds in samples)
+        rows[kind] = {
+            "requests": len(samples),
+            "per_sec": round((len(samples) - errors) / elapsed, 1),
+            "error_rate": round(errors / len(samples), 4),
+            "p50_ms": round(percentile(latencies, 0.5), 1),
+            "p95_ms": round(percentile(latencies, 0.95), 1),
+            "p99_ms": round(percentile(latencies, 0.99), 1),
+            "max_ms": round(latencies[-1], 1),
+        }
+    return rows
+
+def run_config(name, target, secret, mock, args, team_users):
+    mix = RequestMix(args.seed, team_users, args.command_share, args.team_share, mock.base_url)
+    mock.take_calls()
+    started = time.perf_counter()
+    results = asyncio.run(drive(target, secret, mix, args.rate, args.duration, args.max_connections, args.timeout))
+    elapsed = time.perf_counter() - started
+    # Replies are posted after the 200; give queued ones a moment to reach the mock
+    time.sleep(args.drain_seconds)
+    calls = mock.take_calls()
+
+    rows = summarize(results, elapsed)
+    statuses = Counter(str(status) for _, status, _ in results)
+    return {
+        "config": name,
+        "target_rate": args.rate,
+        "elapsed_s": round(elapsed, 2),
+        "statuses": dict(statuses),
+        "slack_api_calls": sum(count for (_, result), count in calls.items() if result == "ok"),
+        "slack_api_429s": sum(count for (_, result), count in calls.items() if result == "429"),
+        "slack_api_by_method": {f"{method}:{result}": count for (method, result), count in sorted(calls.items())},
+        "by_kind": rows,
+    }
+
+def print_table(title, rows, columns):
+    print(f"\n{title}")
+    print("  " + "".join(f"{column:>18}" for column in ["name"] + columns))
+    for name, row in rows.items():
+        print("  " + f"{name:>18}" + "".join(f"{str(row.get(column, '')):>18}" for column in columns))
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Drive Pip's HTTP endpoints with signed Slack requests")
+    parser.add_argument("--configs", default="gunicorn:1x8,gunicorn:2x4",
+                        help="comma-separated gunicorn:<workers>x<threads> / uvicorn:<workers> to compare")
+    parser.add_argument("--target", help="load an already-running Pip at this URL instead of starting servers")
+    parser.add_argument("--rate", type=float, default=100, help="requests per second")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of load per configuration")
+    parser.add_argument("--command-share", type=float, default=0.05, help="fraction of requests that are slash commands")
+    parser.add_argument("--team-share", type=float, default=0.15, help="fraction of events that are team replies")
+    parser.add_argument("--api-latency-ms", type=float, default=80, help="mean mock Slack API latency")
+    parser.add_argument("--api-429-rate", type=float, default=0.0, help="fraction of mock API calls answered with 429")
+    parser.add_argument("--max-connections", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=10, help="seconds before a request counts as failed")
+    parser.add_argument("--drain-seconds", type=float, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    secret = os.environ.get("SLACK_SIGNING_SECRET")
+    if args.target and not secret:
+        parser.error("--target needs SLACK_SIGNING_SECRET set to the server's signing secret")
+    secret = secret or secrets.token_hex(16)
+    team_users = main.get_config().internal_team_ids
+    mock = start_mock(args.api_latency_ms / 1000, args.api_429_rate, team_users)
+    print(f"Mock Slack API on {mock.base_url} ({args.api_latency_ms:.0f} ms, {args.api_429_rate:.1%} 429s)")
+
+    reports = []
+    if args.target:
+        # An external server only reaches the mock if it was started with SLACK_API_BASE_URL pointing here
+        reports.append(run_config(args.target, args.target.rstrip("/"), secret, mock, args, team_users))
+    else:
+        scratch = tempfile.mkdtemp(prefix="pip-loadtest-")
+        for spec in args.configs.split(","):
+            process, target, log_path = start_server(spec, secret, mock, scratch)
+            try:
+                if not wait_healthy(target, process):
+                    print(f"{spec}: server didn't come up, see {log_path}")
+                    continue
+                print(f"{spec}: {args.rate:.0f} req/s for {args.duration:.0f}s against {target}")
+                reports.append(run_config(spec, target, secret, mock, args, team_users))
+            finally:
+                stop_server(process)
+
+    for report in reports:
+        print_table(
+            f"{report['config']}: {report['statuses']}, {report['slack_api_calls']} Slack API calls "
+            f"({report['slack_api_429s']} rate-limited)",
+            report["by_kind"], ["requests", "per_sec", "error_rate", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,139 @@
+"""
+Structured logging: JSON lines (or text) on stdout, written by a background thread
+
+log_event() only queues a record; a listener thread started in each process
+formats and writes it, so a slow stdout never holds up an event. Records carry
+the correlation id of the context they were logged from.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")  # "text" for local runs
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 0.05))  # share of "ignoring message" lines kept
+LOG_QUEUE_MAX = int(os.environ.get("LOG_QUEUE_MAX", 10000))
+
+# Which event a log line belongs to: set when a message or job starts and carried
+# into work-queue jobs, so one message can be followed through classification,
+# Slack calls and the reply
+correlation_id = contextvars.ContextVar("correlation_id", default=None)
+logger = logging.getLogger("pip")
+logger.setLevel(LOG_LEVEL)
+logger.propagate = False
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, message, correlation id and the record's fields"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+        }
+        if record.correlation_id:
+            entry["cid"] = record.correlation_id
+        entry.update(record.fields)
+        entry["pid"] = record.process
+        entry["thread"] = record.threadName
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    """The same records for reading in a terminal (LOG_FORMAT=text)"""
+
+    def format(self, record):
+        fields = " ".join(f"{key}={value}" for key, value in record.fields.items())
+        text = f"{self.formatTime(record)} {record.levelname} [{record.correlation_id or '-'}] {record.getMessage()} {fields}"
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text.rstrip()
+
+class BackgroundQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener thread as they are
+    The stock QueueHandler formats in the caller's thread; only the correlation id is taken here,
+    and a full queue drops the record instead of blocking the event
+    """
+
+    def prepare(self, record):
+        record.correlation_id = correlation_id.get()
+        return record
+
+    def enqueue(self, record):
+        global _dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with _dropped_lock:
+                _dropped += 1
+
+class BackgroundQueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Blocks rather than failing when the queue is full; the listener is draining it
+        self.queue.put(self._sentinel)
+
+_log_pid = None
+_log_listener = None
+_log_lock = threading.Lock()
+_dropped = 0
+_dropped_lock = threading.Lock()
+
+def _ensure_log_listener():
+    # The listener thread doesn't survive a fork, so each worker process starts its own
+    global _log_pid, _log_listener, _dropped
+    if _log_pid == os.getpid():
+        return
+    with _log_lock:
+        if _log_pid == os.getpid():
+            return
+        _dropped = 0
+        records = queue.Queue(maxsize=LOG_QUEUE_MAX)
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(BackgroundQueueHandler(records))
+        _log_listener = BackgroundQueueListener(records, output)
+        _log_listener.start()
+        _log_pid = os.getpid()
+
+def stop_logging():
+    """Write out everything still queued (at exit)"""
+    global _log_listener
+    with _log_lock:
+        if _log_pid == os.getpid() and _log_listener:
+            _log_listener.stop()
+            _log_listener = None
+
+def dropped_records():
+    """Records this process dropped because the log queue was full"""
+    with _dropped_lock:
+        return _dropped
+
+# Registered before the queues' shutdown handlers, so it runs after them and keeps their last lines
+atexit.register(stop_logging)
+
+def log_event(message, level=logging.INFO, sampled=False, exc_info=False, **fields):
+    """
+    Queue a structured log record; formatting and writing happen on the listener thread
+    sampled=True marks lines logged for most events (ignored messages), kept at LOG_SAMPLE_RATE
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if sampled:
+        if LOG_SAMPLE_RATE < 1 and random.random() >= LOG_SAMPLE_RATE:
+            return
+        fields["sample_rate"] = LOG_SAMPLE_RATE
+    _ensure_log_listener()
+    logger.log(level, message, exc_info=exc_info, extra={"fields": fields})
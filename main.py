@@ -1,9 +1,39 @@
+import atexit
+import bisect
+import contextvars
+import hashlib
+import hmac
+import json
+import logging
 import os
+import queue
+import random
 import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+# Taken before the third-party imports so the startup metric includes them
+_import_started = time.perf_counter()
+
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from math import log
+from urllib.error import URLError
+import numpy as np
 from slack_bolt import App
+from slack_sdk.errors import SlackApiError
+from slack_sdk.signature import SignatureVerifier
 from slack_bolt.adapter.flask import SlackRequestHandler
 from flask import Flask, request, jsonify
 
+from logs import correlation_id, dropped_records, log_event
+from metrics import MetricsRegistry, StatsCounter
+from shared_store import SharedKeyStore, encode_thread_key
+from work_queue import OrderedWorkQueue, Scheduler
+
 # ============================================
 # CONFIGURATION
 # ============================================
@@ -13,6 +43,12 @@ SLACK_SIGNING_SECRET = os.environ.get("SLACK_SIGNING_SECRET")
 CALENDLY_LINK = os.environ.get("CALENDLY_LINK", "https://calendly.com/mayank-cleverviral/30min")
 NOTION_FORM_LINK = os.environ.get("NOTION_FORM_LINK", "https://cleverviral.notion.site/2ef95faff36c80a29755e31b12bd5e9a?pvs=105")
 
+# "1" restores the blocking auth.test at startup; otherwise Bolt verifies the token on the first request
+SLACK_VERIFY_TOKEN_ON_STARTUP = os.environ.get("SLACK_VERIFY_TOKEN_ON_STARTUP") == "1"
+
+# Send Web API calls somewhere other than slack.com, e.g. loadtest.py's mock server
+SLACK_API_BASE_URL = os.environ.get("SLACK_API_BASE_URL")
+
 # Team member IDs
 TEAM_MEMBERS = {
     "hassan": "U04Q9SG853P",
@@ -22,21 +58,980 @@ TEAM_MEMBERS = {
     "suraj": "U04UR5DBFGT",
 }
 
-INTERNAL_TEAM_IDS = list(TEAM_MEMBERS.values())
+INTERNAL_TEAM_IDS = frozenset(TEAM_MEMBERS.values())
 DEFAULT_HANDOFF = TEAM_MEMBERS["hassan"]
 
+# Shared state (one SQLite file for all gunicorn workers on the host)
+STATE_DB_PATH = os.environ.get("STATE_DB_PATH", os.path.join(tempfile.gettempdir(), "pip_state.db"))
+HANDLED_THREAD_TTL_SECONDS = int(os.environ.get("HANDLED_THREAD_TTL_SECONDS", 14 * 24 * 3600))
+HANDLED_THREAD_MAX_ENTRIES = int(os.environ.get("HANDLED_THREAD_MAX_ENTRIES", 200000))
+HANDLED_THREAD_LOCAL_CACHE = int(os.environ.get("HANDLED_THREAD_LOCAL_CACHE", 20000))
+
+# Which threads the team has posted in, learned from message events
+TEAM_THREAD_INDEX_MAX = int(os.environ.get("TEAM_THREAD_INDEX_MAX", 50000))
+TEAM_THREAD_NEGATIVE_TTL_SECONDS = int(os.environ.get("TEAM_THREAD_NEGATIVE_TTL_SECONDS", 300))
+
+# Background processing of client messages
+MESSAGE_WORKERS = int(os.environ.get("MESSAGE_WORKERS", 8))
+MESSAGE_QUEUE_DEPTH = int(os.environ.get("MESSAGE_QUEUE_DEPTH", 100))
+MESSAGE_ENQUEUE_TIMEOUT_SECONDS = float(os.environ.get("MESSAGE_ENQUEUE_TIMEOUT_SECONDS", 0.5))
+MESSAGE_DRAIN_TIMEOUT_SECONDS = float(os.environ.get("MESSAGE_DRAIN_TIMEOUT_SECONDS", 10))
+
+# Quick follow-up messages from the same client in the same thread are merged
+# and answered once; each new message restarts the window, up to BURST_MAX_SECONDS
+BURST_WINDOW_SECONDS = float(os.environ.get("BURST_WINDOW_SECONDS", 2.0))  # 0 disables
+BURST_MAX_SECONDS = float(os.environ.get("BURST_MAX_SECONDS", 6.0))
+# A burst that finds the work queue full is offered again this often, up to MESSAGE_ENQUEUE_TIMEOUT_SECONDS
+BURST_RESUBMIT_SECONDS = float(os.environ.get("BURST_RESUBMIT_SECONDS", 0.05))
+
+# Outbound Slack API calls
+SLACK_MAX_RETRIES = int(os.environ.get("SLACK_MAX_RETRIES", 3))
+SLACK_RATE_SCALE = float(os.environ.get("SLACK_RATE_SCALE", 1.0))  # e.g. 1/number of workers
+SLACK_RATE_LIMITING = os.environ.get("SLACK_RATE_LIMITING", "1") == "1"  # "0" for mocks and benchmarks
+REACTION_COALESCE_SECONDS = float(os.environ.get("REACTION_COALESCE_SECONDS", 1.5))
+
+# Slack redeliveries we have already accepted
+SEEN_EVENT_TTL_SECONDS = int(os.environ.get("SEEN_EVENT_TTL_SECONDS", 3600))
+SEEN_EVENT_MAX_ENTRIES = int(os.environ.get("SEEN_EVENT_MAX_ENTRIES", 100000))
+
+# Prometheus metrics; each worker process drops a snapshot file here for /metrics to merge
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(tempfile.gettempdir(), "pip_metrics"))
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", 5))
+METRICS_STALE_SECONDS = float(os.environ.get("METRICS_STALE_SECONDS", 3600))
+
+# Fuzzy FAQ matching for questions that don't contain a pattern word for word
+FAQ_MATCH_THRESHOLD = float(os.environ.get("FAQ_MATCH_THRESHOLD", 0.55))
+
+# Keyword/FAQ/team tables can be overridden from a JSON file (or a directory of them)
+# and are reloaded without a restart when the files change
+PIP_CONFIG_PATH = os.environ.get("PIP_CONFIG_PATH")
+CONFIG_POLL_SECONDS = float(os.environ.get("CONFIG_POLL_SECONDS", 5))
+
+# Backfill of questions posted while Pip was down (backfill.py and /pip-backfill)
+BACKFILL_WORKERS = int(os.environ.get("BACKFILL_WORKERS", 4))
+# Threads started this long before `since` are still read if they got replies after it
+BACKFILL_THREAD_LOOKBACK_SECONDS = float(os.environ.get("BACKFILL_THREAD_LOOKBACK_SECONDS", 14 * 86400))
+BACKFILL_CHECKPOINT_PATH = os.environ.get(
+    "BACKFILL_CHECKPOINT_PATH", os.path.join(tempfile.gettempdir(), "pip_backfill.json")
+)
+
+# Compiled classifiers for clients with their own owners or FAQs (built on first message)
+CLIENT_MATCHER_CACHE_MAX = int(os.environ.get("CLIENT_MATCHER_CACHE_MAX", 64))
+
+# Decisions for recently seen message texts ("any update?"), per config snapshot (0 disables)
+DECISION_CACHE_MAX = int(os.environ.get("DECISION_CACHE_MAX", 20000))
+DECISION_CACHE_MAX_BYTES = int(os.environ.get("DECISION_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+
+# n8n call summaries: accepted into SQLite, posted by background workers
+SUMMARY_WORKERS = int(os.environ.get("SUMMARY_WORKERS", 2))
+SUMMARY_MAX_ATTEMPTS = int(os.environ.get("SUMMARY_MAX_ATTEMPTS", 5))
+SUMMARY_POLL_SECONDS = float(os.environ.get("SUMMARY_POLL_SECONDS", 2))
+SUMMARY_JOB_TTL_SECONDS = int(os.environ.get("SUMMARY_JOB_TTL_SECONDS", 7 * 24 * 3600))
+SUMMARY_CHUNK_CHARS = int(os.environ.get("SUMMARY_CHUNK_CHARS", 3900))  # Slack truncates past 4000
+SUMMARY_BATCH_MAX = int(os.environ.get("SUMMARY_BATCH_MAX", 100))
+
+# Response-time ledger: escalations and first team replies, written in batches
+SLA_FLUSH_SECONDS = float(os.environ.get("SLA_FLUSH_SECONDS", 1))
+SLA_BATCH_MAX = int(os.environ.get("SLA_BATCH_MAX", 500))
+SLA_QUEUE_MAX = int(os.environ.get("SLA_QUEUE_MAX", 10000))
+SLA_OPEN_TTL_SECONDS = int(os.environ.get("SLA_OPEN_TTL_SECONDS", 30 * 24 * 3600))
+# Histogram bucket bounds for time to first response (1m ... 1 week)
+SLA_BUCKETS = [60, 300, 900, 1800, 3600, 2 * 3600, 4 * 3600, 8 * 3600, 24 * 3600, 48 * 3600, 7 * 24 * 3600]
+
+# Announcements to many client channels (/pip-broadcast and POST /n8n/broadcast)
+BROADCAST_TOKEN = os.environ.get("BROADCAST_TOKEN")  # bearer token for the HTTP endpoint; unset disables it
+BROADCAST_CONCURRENCY = int(os.environ.get("BROADCAST_CONCURRENCY", 16))
+BROADCAST_MAX_CHANNELS = int(os.environ.get("BROADCAST_MAX_CHANNELS", 500))
+
+# Channel membership for the onboarding commands
+CHANNEL_MEMBER_CACHE_MAX = int(os.environ.get("CHANNEL_MEMBER_CACHE_MAX", 500))
+CHANNEL_MEMBER_TTL_SECONDS = int(os.environ.get("CHANNEL_MEMBER_TTL_SECONDS", 6 * 3600))
+
+# ============================================
+# LOGGING
+# ============================================
+
+# Where the message being handled came from: "live" events, a "backfill", or a
+# "backfill_dry_run" (whose outcomes are not recorded at all)
+message_source = contextvars.ContextVar("message_source", default="live")
+
+def message_correlation_id(message):
+    return f"{message.get('channel')}:{message.get('ts')}"
+
+# ============================================
+# SUMMARY JOB QUEUE
+# ============================================
+
+class LeaseLost(Exception):
+    """Another worker took over a summary job whose lease ran out mid-post"""
+
+class SummaryJobQueue:
+    """
+    Durable queue of call summaries to post, shared by every worker process through SQLite
+    Jobs are keyed by an idempotency key, so a retried webhook finds its job instead of adding one
+    Workers lease a job, call post(job, mark_progress) and retry failures with backoff;
+    a lease that expires (worker killed mid-post) makes the job available again.
+    mark_progress renews the lease after every chunk, and raises LeaseLost if another
+    worker has already re-leased the job, so the two never post the same chunks
+    """
+
+    LEASE_SECONDS = 120
+    PURGE_EVERY = 100
+
+    def __init__(self, path, post, workers, max_attempts, poll_seconds, ttl_seconds):
+        self.path = path
+        self.post = post
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self.ttl_seconds = ttl_seconds
+        self._connections = threading.local()
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._lock = threading.Lock()
+        self._inserts = 0
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork
+        conn = getattr(self._connections, "conn", None)
+        if conn is None or self._connections.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS summary_jobs ("
+                "key TEXT PRIMARY KEY, channel TEXT NOT NULL, summary TEXT NOT NULL, "
+                "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                "available_at REAL NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+                "parent_ts TEXT, chunks_posted INTEGER NOT NULL DEFAULT 0, error TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS summary_jobs_ready ON summary_jobs (status, available_at)")
+            self._connections.conn = conn
+            self._connections.pid = os.getpid()
+        return conn
+
+    def start(self):
+        """Start this process's workers (idempotent); start_background_workers() calls it at boot"""
+        self._ensure_started()
+
+    def _ensure_started(self):
+        # Threads don't survive a fork, so start them in each worker process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._wakeup = threading.Event()
+            for index in range(self.workers):
+                threading.Thread(target=self._run, name=f"summary-worker-{index}", daemon=True).start()
+            self._pid = os.getpid()
+
+    def enqueue(self, jobs):
+        """
+        Persist [(key, channel, summary)] in one transaction
+        Returns [(key, accepted)]; accepted is False when the key was already queued or posted
+        """
+        self._ensure_started()
+        now = time.time()
+        conn = self._connection()
+        results = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for key, channel_id, summary in jobs:
+                cursor = conn.execute(
+                    "INSERT INTO summary_jobs (key, channel, summary, status, available_at, created_at, updated_at) "
+                    "VALUES (?, ?, ?, 'queued', ?, ?, ?) ON CONFLICT(key) DO NOTHING",
+                    (key, channel_id, summary, now, now, now)
+                )
+                results.append((key, cursor.rowcount == 1))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self._wakeup.set()
+        self._inserts += len(jobs)
+        if self._inserts >= self.PURGE_EVERY:
+            self._inserts = 0
+            self.purge()
+        return results
+
+    def _lease(self):
+        """Take the oldest ready job, or None"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT key, channel, summary, attempts, parent_ts, chunks_posted FROM summary_jobs "
+                "WHERE status IN ('queued', 'posting') AND available_at <= ? ORDER BY created_at LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE summary_jobs SET status = 'posting', attempts = attempts + 1, "
+                    "available_at = ?, updated_at = ? WHERE key = ?",
+                    (now + self.LEASE_SECONDS, now, row[0])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if not row:
+            return None
+        keys = ["key", "channel", "summary", "attempts", "parent_ts", "chunks_posted"]
+        job = dict(zip(keys, row))
+        job["attempts"] += 1
+        return job
+
+    def _renew(self, job):
+        """Extend the lease; False if another worker has leased the job since"""
+        now = time.time()
+        cursor = self._connection().execute(
+            "UPDATE summary_jobs SET available_at = ?, updated_at = ?, parent_ts = ?, chunks_posted = ? "
+            "WHERE key = ? AND status = 'posting' AND attempts = ?",
+            (now + self.LEASE_SECONDS, now, job["parent_ts"], job["chunks_posted"], job["key"], job["attempts"])
+        )
+        return cursor.rowcount == 1
+
+    def _update(self, key, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._connection().execute(f"UPDATE summary_jobs SET {assignments} WHERE key = ?", (*fields.values(), key))
+
+    def _run(self):
+        while True:
+            try:
+                job = self._lease()
+            except Exception as e:
+                log_event("Error leasing summary job", level=logging.ERROR, error=str(e))
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_seconds)
+                self._wakeup.clear()
+                continue
+            self._process(job)
+
+    def _process(self, job):
+        correlation_id.set(f"summary:{job['key']}")
+
+        def mark_progress(parent_ts, chunks_posted):
+            job["parent_ts"], job["chunks_posted"] = parent_ts, chunks_posted
+            if not self._renew(job):
+                raise LeaseLost(job["key"])
+
+        try:
+            self.post(job, mark_progress)
+        except LeaseLost:
+            log_event("Summary job lease lost", level=logging.WARNING, job=job["key"], chunks_posted=job["chunks_posted"])
+            metrics.inc("pip_summary_jobs_total", result="lease_lost")
+            return
+        except Exception as e:
+            # Slack rejected the request outright (bad channel, not in channel): retrying won't help.
+            # A 5xx that outlasted slack_call's retries is an outage, so it backs off like any other failure
+            status = e.response.status_code if isinstance(e, SlackApiError) else None
+            permanent = status is not None and status < 500 and status != 429
+            if permanent or job["attempts"] >= self.max_attempts:
+                log_event("Summary job failed", level=logging.ERROR, job=job["key"], attempts=job["attempts"], error=str(e))
+                metrics.inc("pip_summary_jobs_total", result="failed")
+                self._update(job["key"], status="failed", error=str(e)[:500])
+            else:
+                delay = min(300, 5 * 2 ** job["attempts"]) * random.uniform(0.5, 1.5)
+                metrics.inc("pip_summary_jobs_total", result="retried")
+                self._update(job["key"], status="queued", available_at=time.time() + delay, error=str(e)[:500])
+            return
+        metrics.inc("pip_summary_jobs_total", result="posted")
+        self._update(job["key"], status="done", error=None)
+
+    def status(self, key):
+        row = self._connection().execute(
+            "SELECT status, attempts, parent_ts, chunks_posted, error FROM summary_jobs WHERE key = ?", (key,)
+        ).fetchone()
+        return dict(zip(["status", "attempts", "parent_ts", "chunks_posted", "error"], row)) if row else None
+
+    def counts(self):
+        try:
+            return dict(self._connection().execute("SELECT status, COUNT(*) FROM summary_jobs GROUP BY status"))
+        except Exception as e:
+            log_event("Error counting summary jobs", level=logging.ERROR, error=str(e))
+            return {}
+
+    def purge(self):
+        """Forget finished jobs (and their idempotency keys) after ttl_seconds"""
+        try:
+            self._connection().execute(
+                "DELETE FROM summary_jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - self.ttl_seconds,)
+            )
+        except Exception as e:
+            log_event("Error purging summary jobs", level=logging.ERROR, error=str(e))
+
+# ============================================
+# SLA LEDGER
+# ============================================
+
+class SlaLedger:
+    """
+    Append-only log of escalations and the first team reply in each escalated thread
+    Callers only queue events; a background thread writes them to SQLite in batches.
+    A first reply closes the thread's open escalation and adds the wait to running
+    histograms per category, teammate (the one Pip looped in) and channel, so
+    summary() reads a few hundred rows however long the log gets
+    """
+
+    DIMENSIONS = ["all", "category", "teammate", "channel"]
+    PURGE_EVERY = 1000
+
+    def __init__(self, path, bounds, flush_seconds, batch_max, queue_max, open_ttl_seconds):
+        self.path = path
+        self.bounds = bounds
+        self.flush_seconds = flush_seconds
+        self.batch_max = batch_max
+        self.open_ttl_seconds = open_ttl_seconds
+        self._events = queue.Queue(maxsize=queue_max)
+        self._connections = threading.local()
+        self._pid = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._held = []
+        self._writes = 0
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork
+        conn = getattr(self._connections, "conn", None)
+        if conn is None or self._connections.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sla_events ("
+                "id INTEGER PRIMARY KEY, kind TEXT NOT NULL, channel TEXT NOT NULL, thread_ts TEXT NOT NULL, "
+                "at REAL NOT NULL, user_id TEXT, category TEXT, outcome TEXT, client TEXT, wait_seconds REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sla_open ("
+                "channel TEXT NOT NULL, thread_ts TEXT NOT NULL, escalated_at REAL NOT NULL, "
+                "teammate TEXT, category TEXT, PRIMARY KEY (channel, thread_ts))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sla_histograms ("
+                "dimension TEXT NOT NULL, value TEXT NOT NULL, bucket INTEGER NOT NULL, "
+                "count INTEGER NOT NULL, PRIMARY KEY (dimension, value, bucket))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sla_totals ("
+                "dimension TEXT NOT NULL, value TEXT NOT NULL, count INTEGER NOT NULL, "
+                "sum REAL NOT NULL, max REAL NOT NULL, PRIMARY KEY (dimension, value))"
+            )
+            self._connections.conn = conn
+            self._connections.pid = os.getpid()
+        return conn
+
+    def _ensure_started(self):
+        # Threads don't survive a fork, so start the writer lazily in each worker process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._run, name="sla-writer", daemon=True).start()
+            self._pid = os.getpid()
+
+    def escalated(self, channel_id, thread_ts, message_ts, teammate, category, outcome, client=None):
+        """Pip looped teammate in on a client message; the clock starts at the client's message"""
+        self._record(("escalated", channel_id, thread_ts, float(message_ts), teammate, category, outcome, client))
+
+    def team_replied(self, channel_id, thread_ts, reply_ts, user_id):
+        """A team member posted in a thread; only the first reply to an open escalation is kept"""
+        self._record(("team_reply", channel_id, thread_ts, float(reply_ts), user_id, None, None, None))
+
+    def _record(self, event):
+        self._ensure_started()
+        try:
+            self._events.put_nowait(event)
+        except queue.Full:
+            metrics.inc("pip_sla_events_dropped_total")
+
+    def _run(self):
+        while True:
+            try:
+                event = self._events.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                continue
+            # Held where flush() can see it while a burst of events collects to share one transaction
+            with self._write_lock:
+                self._held.append(event)
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+    def _drain(self, batch):
+        while len(batch) < self.batch_max:
+            try:
+                batch.append(self._events.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """Write whatever is queued now, including an event the writer is holding (writer, exit)"""
+        with self._write_lock:
+            batch, self._held = self._held, []
+            batch = self._drain(batch)
+            while batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    log_event("Error writing SLA events", level=logging.ERROR, events=len(batch), error=str(e))
+                batch = self._drain([])
+
+    def _bucket(self, wait_seconds):
+        return bisect.bisect_left(self.bounds, wait_seconds)
+
+    def _write_batch(self, batch):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for kind, channel_id, thread_ts, at, user_id, category, outcome, client in batch:
+                if kind == "escalated":
+                    # Pip answers a thread once; a second escalation keeps the original start time
+                    conn.execute(
+                        "INSERT INTO sla_open (channel, thread_ts, escalated_at, teammate, category) "
+                        "VALUES (?, ?, ?, ?, ?) ON CONFLICT(channel, thread_ts) DO NOTHING",
+                        (channel_id, thread_ts, at, user_id, category)
+                    )
+                    conn.execute(
+                        "INSERT INTO sla_events (kind, channel, thread_ts, at, user_id, category, outcome, client) "
+                        "VALUES ('escalated', ?, ?, ?, ?, ?, ?, ?)",
+                        (channel_id, thread_ts, at, user_id, category, outcome, client)
+                    )
+                    continue
+                
+                row = conn.execute(
+                    "SELECT escalated_at, teammate, category FROM sla_open WHERE channel = ? AND thread_ts = ?",
+                    (channel_id, thread_ts)
+                ).fetchone()
+                if row is None:
+                    continue
+                escalated_at, teammate, category = row
+                wait = max(0.0, at - escalated_at)
+                conn.execute("DELETE FROM sla_open WHERE channel = ? AND thread_ts = ?", (channel_id, thread_ts))
+                conn.execute(
+                    "INSERT INTO sla_events (kind, channel, thread_ts, at, user_id, category, wait_seconds) "
+                    "VALUES ('first_reply', ?, ?, ?, ?, ?, ?)",
+                    (channel_id, thread_ts, at, user_id, category, wait)
+                )
+                bucket = self._bucket(wait)
+                for dimension, value in zip(self.DIMENSIONS, ["", category or "", teammate or "", channel_id]):
+                    conn.execute(
+                        "INSERT INTO sla_histograms (dimension, value, bucket, count) VALUES (?, ?, ?, 1) "
+                        "ON CONFLICT(dimension, value, bucket) DO UPDATE SET count = count + 1",
+                        (dimension, value, bucket)
+                    )
+                    conn.execute(
+                        "INSERT INTO sla_totals (dimension, value, count, sum, max) VALUES (?, ?, 1, ?, ?) "
+                        "ON CONFLICT(dimension, value) DO UPDATE SET "
+                        "count = count + 1, sum = sum + excluded.sum, max = MAX(max, excluded.max)",
+                        (dimension, value, wait, wait)
+                    )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self._writes += len(batch)
+        if self._writes >= self.PURGE_EVERY:
+            self._writes = 0
+            self.purge()
+
+    def purge(self):
+        """Stop waiting on escalations nobody answered within open_ttl_seconds (the log keeps them)"""
+        try:
+            self._connection().execute(
+                "DELETE FROM sla_open WHERE escalated_at < ?", (time.time() - self.open_ttl_seconds,)
+            )
+        except Exception as e:
+            log_event("Error purging open escalations", level=logging.ERROR, error=str(e))
+
+    def _percentile(self, counts, total, maximum, q):
+        """Linear interpolation inside the histogram bucket holding the q-th wait"""
+        rank = q * total
+        seen = 0
+        for bucket, count in sorted(counts.items()):
+            if seen + count >= rank:
+                lower = self.bounds[bucket - 1] if bucket > 0 else 0.0
+                upper = self.bounds[bucket] if bucket < len(self.bounds) else maximum
+                return round(min(maximum, lower + (upper - lower) * (rank - seen) / count), 1)
+            seen += count
+        return round(maximum, 1)
+
+    def summary(self, dimensions=None):
+        """Time-to-first-response stats per dimension value, plus escalations still waiting"""
+        conn = self._connection()
+        wanted = [dimension for dimension in self.DIMENSIONS if not dimensions or dimension in dimensions]
+        histograms = {}
+        for dimension, value, bucket, count in conn.execute("SELECT dimension, value, bucket, count FROM sla_histograms"):
+            histograms.setdefault((dimension, value), {})[bucket] = count
+
+        result = {dimension: {} for dimension in wanted}
+        for dimension, value, count, total_wait, maximum in conn.execute("SELECT dimension, value, count, sum, max FROM sla_totals"):
+            if dimension not in result:
+                continue
+            counts = histograms.get((dimension, value), {})
+            result[dimension][value] = {
+                "responses": count,
+                "mean_seconds": round(total_wait / count, 1),
+                "p50_seconds": self._percentile(counts, count, maximum, 0.5),
+                "p90_seconds": self._percentile(counts, count, maximum, 0.9),
+                "p99_seconds": self._percentile(counts, count, maximum, 0.99),
+                "max_seconds": round(maximum, 1),
+            }
+        if "all" in result:
+            result["all"] = result["all"].get("", {"responses": 0})
+
+        waiting, oldest = conn.execute("SELECT COUNT(*), MIN(escalated_at) FROM sla_open").fetchone()
+        result["open"] = {
+            "escalations": waiting,
+            "oldest_wait_seconds": round(time.time() - oldest, 1) if oldest else None,
+            "queued_events": self._events.qsize(),
+        }
+        return result
+
+# ============================================
+# METRICS
+# ============================================
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+METRIC_HELP = {
+    "pip_message_handling_seconds": ("histogram", "Time from receiving a message event to finishing with it"),
+    "pip_classification_seconds": ("histogram", "Time spent classifying a message"),
+    "pip_slack_api_seconds": ("histogram", "Slack Web API call latency per method"),
+    "pip_webhook_post_seconds": ("histogram", "Time to post an n8n summary (every chunk) to Slack"),
+    "pip_messages_total": ("counter", "Client messages by outcome"),
+    "pip_slack_api_calls_total": ("counter", "Slack Web API calls by method and result"),
+    "pip_cache_requests_total": ("counter", "Cache lookups by cache and result"),
+    "pip_events_total": ("counter", "Slack event deliveries by dedupe result"),
+    "pip_summary_jobs_total": ("counter", "n8n summary jobs by result (accepted, duplicate, posted, retried, failed, lease_lost)"),
+    "pip_message_queue_depth": ("gauge", "Messages waiting on the work queue"),
+    "pip_burst_messages_total": ("counter", "Client messages merged into an earlier message of the same burst"),
+    "pip_burst_pending": ("gauge", "Message bursts waiting out the debounce window"),
+    "pip_backfill_replies_total": ("counter", "Missed client questions answered (or found, on a dry run) by backfill"),
+    "pip_backfill_messages_total": ("counter", "Client messages handled by a backfill (not a dry run), by outcome"),
+    "pip_broadcast_messages_total": ("counter", "Broadcast posts by result (sent, failed)"),
+    "pip_log_records_dropped_total": ("counter", "Log records dropped because the log queue was full"),
+    "pip_sla_events_dropped_total": ("counter", "SLA ledger events dropped because the write queue was full"),
+    "pip_cache_hit_ratio": ("gauge", "Hits / lookups per cache across all workers"),
+    "pip_startup_import_seconds": ("gauge", "Time to import main.py and its dependencies"),
+    "pip_startup_warmup_seconds": ("gauge", "Time warm_up() took to build the Bolt app and classifier tables"),
+}
+
+metrics = MetricsRegistry(METRICS_DIR, LATENCY_BUCKETS, METRICS_FLUSH_SECONDS, METRICS_STALE_SECONDS, METRIC_HELP)
+# Registered before the queues' shutdown handlers, so the last snapshot counts what they drain
+atexit.register(metrics.write_final_snapshot)
+
+cache_stats = StatsCounter()
+metrics.collector(lambda: [("pip_cache_requests_total", {"cache": cache, "result": result}, value)
+                           for (cache, result), value in cache_stats.copy().items()])
+metrics.collector(lambda: [("pip_log_records_dropped_total", {}, dropped) for dropped in [dropped_records()] if dropped])
+
+# ============================================
+# SLACK API DISPATCHER
+# ============================================
+
+# Requests per minute for each Slack rate-limit tier
+# https://api.slack.com/apis/rate-limits
+SLACK_TIER_LIMITS = {1: 1, 2: 20, 3: 50, 4: 100}
+
+SLACK_METHOD_TIERS = {
+    "auth.test": 4,
+    "conversations.history": 3,
+    "conversations.members": 4,
+    "conversations.replies": 3,
+    "reactions.add": 3,
+    "reactions.remove": 2,
+    "users.conversations": 2,
+}
+
+# chat.postMessage is limited per channel (about one per second, short bursts allowed)
+POST_MESSAGE_RATE = 1.0
+POST_MESSAGE_BURST = 3
+POST_MESSAGE_BUCKETS_MAX = 5000
+
+slack_api_stats = StatsCounter()
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() sleeps until a token is free, reserve() never sleeps"""
+
+    def __init__(self, rate_per_second, burst):
+        self.rate = rate_per_second
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return 0, or return how long to wait before trying again"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if now >= self.paused_until and self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return max(self.paused_until - now, (1 - self.tokens) / self.rate)
+
+    def acquire(self):
+        while True:
+            wait = self.reserve()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold every caller back, e.g. for a 429 Retry-After"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+tier_buckets = {
+    tier: TokenBucket(per_minute * SLACK_RATE_SCALE / 60, max(1, per_minute * SLACK_RATE_SCALE / 6))
+    for tier, per_minute in SLACK_TIER_LIMITS.items()
+}
+post_message_buckets = OrderedDict()
+post_message_buckets_lock = threading.Lock()
+
+def _bucket_for(method, kwargs):
+    if method != "chat.postMessage":
+        return tier_buckets[SLACK_METHOD_TIERS.get(method, 3)]
+    channel_id = kwargs.get("channel")
+    with post_message_buckets_lock:
+        bucket = post_message_buckets.get(channel_id)
+        if bucket is None:
+            bucket = post_message_buckets[channel_id] = TokenBucket(POST_MESSAGE_RATE, POST_MESSAGE_BURST)
+            while len(post_message_buckets) > POST_MESSAGE_BUCKETS_MAX:
+                post_message_buckets.popitem(last=False)
+        post_message_buckets.move_to_end(channel_id)
+    return bucket
+
+def slack_client():
+    return get_bot().client
+
+class SlackCall:
+    """
+    Rate-limit and retry bookkeeping for one Web API call
+    Shared by slack_call and async_main.async_slack_call, which only differ in
+    how they wait and send: wait() -> sending() -> succeeded() or failed(error)
+    """
+
+    def __init__(self, method, kwargs, best_effort=False):
+        self.method = method
+        self.best_effort = best_effort
+        self.bucket = _bucket_for(method, kwargs)
+        self.attempt = 0
+        self.started = None
+
+    def wait(self):
+        """Seconds to wait for the rate limit (0 = send now), or None to skip a best-effort call"""
+        if not SLACK_RATE_LIMITING:
+            return 0
+        wait = self.bucket.reserve()
+        if wait and self.best_effort:
+            slack_api_stats.add("skipped")
+            metrics.inc("pip_slack_api_calls_total", method=self.method, result="skipped")
+            return None
+        return wait
+
+    def sending(self):
+        slack_api_stats.add(self.method)
+        self.started = time.perf_counter()
+
+    def succeeded(self):
+        seconds = time.perf_counter() - self.started
+        metrics.observe("pip_slack_api_seconds", seconds, method=self.method)
+        metrics.inc("pip_slack_api_calls_total", method=self.method, result="ok")
+        log_event("Slack call", level=logging.DEBUG, method=self.method, seconds=round(seconds, 4))
+
+    def failed(self, error):
+        """Seconds to back off before the next attempt; re-raises error if there shouldn't be one"""
+        attempt, self.attempt = self.attempt, self.attempt + 1
+        if isinstance(error, SlackApiError):
+            status = error.response.status_code
+            metrics.observe("pip_slack_api_seconds", time.perf_counter() - self.started, method=self.method)
+            metrics.inc("pip_slack_api_calls_total", method=self.method, result=str(status))
+            log_event("Slack call failed", level=logging.DEBUG, method=self.method, status=status,
+                      error=error.response.get("error"), attempt=attempt)
+            if status == 429:
+                slack_api_stats.add("rate_limited")
+                retry_after = int(error.response.headers.get("Retry-After", 1))
+                # The bucket holds every caller back, so the retry itself doesn't sleep
+                self.bucket.pause(retry_after + random.uniform(0, 1))
+                if self.best_effort or attempt == SLACK_MAX_RETRIES:
+                    raise error
+                return 0
+            # Other 4xx (ok: false) mean the request itself is wrong; a 5xx is Slack having a bad moment
+            if status < 500:
+                raise error
+        else:
+            metrics.inc("pip_slack_api_calls_total", method=self.method, result="connection_error")
+
+        if self.best_effort or attempt == SLACK_MAX_RETRIES:
+            raise error
+        slack_api_stats.add("retried")
+        return min(8, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+def slack_call(method, best_effort=False, **kwargs):
+    """
+    Call a Slack Web API method through the shared client
+    Waits for the method's rate-limit budget, honours 429 Retry-After and
+    retries 5xx responses and connection errors with jittered backoff
+    With best_effort (reactions) it never waits: without a free token the call
+    is skipped and returns None, and a failure is raised without a retry
+    """
+    call = SlackCall(method, kwargs, best_effort)
+    client_method = getattr(slack_client(), method.replace(".", "_"))
+    
+    while True:
+        wait = call.wait()
+        while wait:
+            time.sleep(wait)
+            wait = call.wait()
+        if wait is None:
+            return None
+        call.sending()
+        try:
+            result = client_method(**kwargs)
+        except (SlackApiError, URLError, ConnectionError, TimeoutError) as e:
+            time.sleep(call.failed(e))
+            continue
+        call.succeeded()
+        return result
+
+class ReactionCoalescer:
+    """
+    Progress reactions that settle quickly never reach Slack
+    show() schedules the reaction after a short window; finish() replaces it
+    If the work finishes inside the window only the final reaction is sent
+    Reactions are cosmetic, so they are best-effort: skipped rather than waiting on the rate limit
+    """
+
+    def __init__(self, window_seconds):
+        self.window = window_seconds
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def show(self, channel_id, message_ts, name):
+        key = (channel_id, message_ts)
+        entry = {"name": name, "applied": False, "lock": threading.Lock(), "timer": None}
+        with self._lock:
+            self._pending[key] = entry
+        if self.window > 0:
+            entry["timer"] = timers.call_later(self.window, self._flush_later, key)
+        else:
+            self._flush(key)
+
+    def _flush_later(self, key):
+        # On the scheduler thread: the Slack call goes to a message worker, or is skipped if they're all busy
+        if not message_queue.submit(f"reaction:{key[0]}:{key[1]}", self._flush, key, timeout=0):
+            slack_api_stats.add("skipped")
+
+    def _flush(self, key):
+        with self._lock:
+            entry = self._pending.get(key)
+        if not entry:
+            return
+        with entry["lock"]:
+            if entry["applied"] or self._pending.get(key) is not entry:
+                return
+            try:
+                slack_call("reactions.add", best_effort=True, channel=key[0], timestamp=key[1], name=entry["name"])
+            except Exception as e:
+                log_event("Error adding reaction", level=logging.ERROR, channel=key[0], ts=key[1], error=str(e))
+            entry["applied"] = True
+
+    def finish(self, channel_id, message_ts, name=None):
+        """Replace the progress reaction with name (or just clear it when name is None)"""
+        key = (channel_id, message_ts)
+        with self._lock:
+            entry = self._pending.pop(key, None)
+
+        if entry:
+            if entry["timer"]:
+                timers.cancel(entry["timer"])
+            with entry["lock"]:
+                if entry["applied"]:
+                    try:
+                        slack_call("reactions.remove", best_effort=True, channel=channel_id, timestamp=message_ts, name=entry["name"])
+                    except Exception as e:
+                        log_event("Error removing reaction", level=logging.ERROR, channel=channel_id, ts=message_ts, error=str(e))
+                else:
+                    slack_api_stats.add("reactions_coalesced", 2)
+
+        if name is None:
+            return
+        try:
+            slack_call("reactions.add", best_effort=True, channel=channel_id, timestamp=message_ts, name=name)
+        except Exception as e:
+            log_event("Error adding reaction", level=logging.ERROR, channel=channel_id, ts=message_ts, error=str(e))
+
+timers = Scheduler("timers")
+reactions = ReactionCoalescer(REACTION_COALESCE_SECONDS)
+
+class BurstCoalescer:
+    """
+    Debounces messages per key: flush(messages, received_at, bodies) runs once the key
+    has been quiet for window seconds, or max_wait after its first message
+    bodies are the messages' event bodies, so flush can mark them seen once queued.
+    Windows are timers on the shared scheduler thread, so flush runs there and
+    must only triage and queue
+    """
+
+    def __init__(self, window_seconds, max_wait_seconds, flush):
+        self.window = window_seconds
+        self.max_wait = max_wait_seconds
+        self.flush = flush
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, message, received_at, body=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = {"messages": [], "bodies": [], "received_at": received_at, "started": now, "timer": None}
+            elif any(waiting.get("ts") == message.get("ts") for waiting in entry["messages"]):
+                # Slack's retry of an event still waiting here: it is already in the burst
+                return
+            else:
+                self._cancel(entry["timer"])
+            entry["messages"].append(message)
+            if body is not None:
+                entry["bodies"].append(body)
+            delay = max(0, min(self.window, entry["started"] + self.max_wait - now))
+            entry["timer"] = self._schedule(delay, self._fire, key, entry)
+
+    def _fire(self, key, entry):
+        # A message added while this timer was firing is still in entry, so nothing is lost
+        with self._lock:
+            if self._pending.get(key) is not entry:
+                return
+            del self._pending[key]
+        try:
+            self.flush(entry["messages"], entry["received_at"], entry["bodies"])
+        except Exception as e:
+            log_event("Error flushing message burst", level=logging.ERROR, exc_info=True, error=str(e))
+
+    def _schedule(self, delay, func, *args):
+        return timers.call_later(delay, func, *args)
+
+    def _cancel(self, timer):
+        timers.cancel(timer)
+
+    def pending(self):
+        return len(self._pending)
+
+    def flush_all(self):
+        """Flush every waiting burst now (shutdown)"""
+        with self._lock:
+            entries = list(self._pending.items())
+        for key, entry in entries:
+            self._cancel(entry["timer"])
+            self._fire(key, entry)
+
+def burst_key(message):
+    """Messages merge per (channel, user, thread); root-level messages share one key per user"""
+    return (message.get("channel"), message.get("user"), message.get("thread_ts"))
+
+def merge_burst(messages):
+    """One message standing in for a burst: the first message, carrying every message's text"""
+    merged = dict(messages[0])
+    if len(messages) > 1:
+        merged["burst_texts"] = [message.get("text", "") for message in messages]
+        merged["text"] = "\n".join(text for text in merged["burst_texts"] if text)
+    return merged
+
 # ============================================
 # INITIALIZATION
 # ============================================
 
-bot = App(
-    token=SLACK_BOT_TOKEN,
-    signing_secret=SLACK_SIGNING_SECRET
-)
+# The Bolt app and request handler are built on first use, so importing this
+# module (gunicorn boot, scripts, tests) needs no network and no Slack token
+_bot = None
+_handler = None
+_init_lock = threading.Lock()
+STARTUP_METRICS = {}
+metrics.gauge("pip_startup_import_seconds", lambda: STARTUP_METRICS.get("import_seconds"))
+metrics.gauge("pip_startup_warmup_seconds", lambda: STARTUP_METRICS.get("warmup_seconds"))
+
+def build_bot():
+    bot = App(
+        token=SLACK_BOT_TOKEN,
+        signing_secret=SLACK_SIGNING_SECRET,
+        token_verification_enabled=SLACK_VERIFY_TOKEN_ON_STARTUP
+    )
+    if SLACK_API_BASE_URL:
+        bot.client.base_url = SLACK_API_BASE_URL
+    bot.event("member_joined_channel")(handle_member_joined)
+    bot.event("member_left_channel")(handle_member_left)
+    bot.command("/pip-onboard")(handle_onboard_main)
+    bot.command("/pip-onboard-live")(handle_onboard_live)
+    bot.command("/new-campaign")(handle_new_campaign)
+    bot.command("/pip-backfill")(handle_backfill)
+    bot.command("/pip-broadcast")(handle_broadcast)
+    bot.message(".*")(handle_message)
+    return bot
+
+def get_bot():
+    global _bot
+    if _bot is None:
+        with _init_lock:
+            if _bot is None:
+                _bot = build_bot()
+    return _bot
+
+def get_handler():
+    global _handler
+    if _handler is None:
+        bot = get_bot()
+        with _init_lock:
+            if _handler is None:
+                _handler = SlackRequestHandler(bot)
+    return _handler
 
 app = Flask(__name__)
-handler = SlackRequestHandler(bot)
-handled_threads = set()
+handled_threads = SharedKeyStore(
+    STATE_DB_PATH, "handled_threads",
+    ttl_seconds=HANDLED_THREAD_TTL_SECONDS,
+    max_entries=HANDLED_THREAD_MAX_ENTRIES,
+    local_cache_size=HANDLED_THREAD_LOCAL_CACHE,
+    encode=encode_thread_key,
+    stats=cache_stats
+)
+seen_events = SharedKeyStore(
+    STATE_DB_PATH, "seen_events",
+    ttl_seconds=SEEN_EVENT_TTL_SECONDS,
+    max_entries=SEEN_EVENT_MAX_ENTRIES,
+    local_cache_size=5000,
+    stats=cache_stats
+)
+# atexit runs handlers in reverse order of registration, so at exit: waiting bursts
+# are queued, the queue drains, and then the SLA events its replies recorded are written
+sla_ledger = SlaLedger(
+    STATE_DB_PATH, SLA_BUCKETS,
+    flush_seconds=SLA_FLUSH_SECONDS,
+    batch_max=SLA_BATCH_MAX,
+    queue_max=SLA_QUEUE_MAX,
+    open_ttl_seconds=SLA_OPEN_TTL_SECONDS
+)
+atexit.register(sla_ledger.flush)
+message_queue = OrderedWorkQueue(
+    "message-worker", MESSAGE_WORKERS, MESSAGE_QUEUE_DEPTH, MESSAGE_ENQUEUE_TIMEOUT_SECONDS
+)
+atexit.register(message_queue.shutdown, MESSAGE_DRAIN_TIMEOUT_SECONDS)
+metrics.gauge("pip_message_queue_depth", message_queue.pending)
+bursts = BurstCoalescer(BURST_WINDOW_SECONDS, BURST_MAX_SECONDS, lambda messages, received_at, bodies: handle_burst(messages, received_at, bodies))
+atexit.register(bursts.flush_all)
+metrics.gauge("pip_burst_pending", bursts.pending)
 
 # ============================================
 # QUESTION TYPE ROUTING
@@ -67,94 +1062,134 @@ QUESTION_ROUTING = {
 
 def detect_question_type(message_text):
     """Detect question type for routing"""
-    message_lower = message_text.lower()
-    
-    for category, config in QUESTION_ROUTING.items():
-        if any(keyword in message_lower for keyword in config["keywords"]):
-            return config["team_member"], category
-    
-    return DEFAULT_HANDOFF, "general"
+    decision = classify_message(message_text)
+    return decision["team_member"], decision["category"]
 
 # ============================================
 # HELPER FUNCTIONS
 # ============================================
 
 def is_internal_team_member(user_id):
-    return user_id in INTERNAL_TEAM_IDS
+    return user_id in get_config().internal_team_ids
 
 def format_link(url, text):
     return f"<{url}|{text}>"
 
-def has_team_replied_in_thread(channel_id, thread_ts):
+# (channel_id, thread_ts) -> (team user ids seen in the thread, time of last API check)
+# Positive entries stay until LRU eviction; negative ones expire, since the
+# team reply may have been delivered to another worker
+team_thread_index = OrderedDict()
+team_thread_index_lock = threading.Lock()
+
+def _index_team_thread(channel_id, thread_ts, user_id=None):
+    key = (channel_id, thread_ts)
+    with team_thread_index_lock:
+        members, _ = team_thread_index.get(key, (frozenset(), 0))
+        if user_id:
+            members = members | {user_id}
+        team_thread_index[key] = (members, time.time())
+        team_thread_index.move_to_end(key)
+        while len(team_thread_index) > TEAM_THREAD_INDEX_MAX:
+            team_thread_index.popitem(last=False)
+
+def record_team_reply(channel_id, thread_ts, user_id, reply_ts=None):
+    """Note a team member posting in a thread (called from the message listener)"""
+    _index_team_thread(channel_id, thread_ts, user_id)
+    if reply_ts:
+        sla_ledger.team_replied(channel_id, thread_ts, reply_ts, user_id)
+
+def cached_team_reply(channel_id, thread_ts):
+    """True/False from the thread index, or None if the API has to be asked"""
+    with team_thread_index_lock:
+        entry = team_thread_index.get((channel_id, thread_ts))
+    if entry:
+        members, checked_at = entry
+        if members or time.time() - checked_at < TEAM_THREAD_NEGATIVE_TTL_SECONDS:
+            cache_stats.add(("team_threads", "hit"))
+            return bool(members)
+    cache_stats.add(("team_threads", "miss"))
+    return None
+
+def find_team_reply(messages, thread_ts):
+    """First team member (other than the parent's author) replying in a page of thread messages"""
+    for msg in messages:
+        user_id = msg.get("user")
+        if msg.get("ts") != thread_ts and user_id and is_internal_team_member(user_id):
+            return user_id
+    return None
+
+def team_reply_steps(channel_id, thread_ts):
+    """has_team_replied_in_thread as steps (see run_steps), shared with async_main"""
+    cached = cached_team_reply(channel_id, thread_ts)
+    if cached is not None:
+        return cached
+    
+    # Cache miss - page through the thread, stopping at the first team reply
     try:
-        result = bot.client.conversations_replies(channel=channel_id, ts=thread_ts)
-        if not result["ok"]:
-            return False
-        
-        messages = result.get("messages", [])
-        for msg in messages[1:]:
-            user_id = msg.get("user")
-            if user_id and is_internal_team_member(user_id):
+        cursor = None
+        while True:
+            result = yield ("slack", "conversations.replies", {"channel": channel_id, "ts": thread_ts, "cursor": cursor, "limit": 200})
+            if not result["ok"]:
+                return False
+            
+            user_id = find_team_reply(result.get("messages", []), thread_ts)
+            if user_id:
+                _index_team_thread(channel_id, thread_ts, user_id)
                 return True
+            
+            cursor = (result.get("response_metadata") or {}).get("next_cursor")
+            if not cursor:
+                break
+
+        _index_team_thread(channel_id, thread_ts)
         return False
     except Exception as e:
-        print(f"Error checking thread replies: {e}")
+        log_event("Error checking thread replies", level=logging.ERROR, channel=channel_id, thread_ts=thread_ts, error=str(e))
         return False
 
+def has_team_replied_in_thread(channel_id, thread_ts):
+    return run_steps(team_reply_steps(channel_id, thread_ts))
+
 def get_thread_key(channel_id, thread_ts):
     return f"{channel_id}:{thread_ts}"
 
+# Short acknowledgments that don't need responses
+SHORT_ACKS = [
+    "thanks", "thank you", "ty", "thx",
+    "ok", "okay", "k",
+    "got it", "sounds good", "perfect", "great", "nice",
+    "yes", "no", "yep", "nope", "sure"
+]
+
+# Questions - always respond
+QUESTION_STARTERS = [
+    "how", "what", "when", "where", "why", "who", "which",
+    "can you", "could you", "would you", "do you", "does", "did",
+    "is there", "are there", "will you", "have you", "has",
+    "am i", "are we", "is it", "should i", "should we", "can we", "can i"
+]
+
+# Complaints/concerns - always respond
+CONCERN_WORDS = [
+    "bad", "terrible", "awful", "trash", "horrible", "poor",
+    "not working", "broken", "issue", "problem", "concerned",
+    "worried", "disappointing", "disappointed", "frustrated",
+    "low", "down", "dropping", "declined", "worse"
+]
+
+# Requests - always respond
+REQUEST_PHRASES = [
+    "need to", "want to", "would like", "can we", "could we",
+    "let's", "we should", "please", "help"
+]
+
 def is_needs_response(message_text):
     """
     Determine if message needs a response
     Includes: questions, complaints, concerns, requests
     Excludes: short acknowledgments, thanks, casual chat
     """
-    message_lower = message_text.lower().strip()
-    
-    # Short acknowledgments that don't need responses
-    short_acks = [
-        "thanks", "thank you", "ty", "thx",
-        "ok", "okay", "k",
-        "got it", "sounds good", "perfect", "great", "nice",
-        "yes", "no", "yep", "nope", "sure"
-    ]
-    
-    # If message is just a short acknowledgment, don't respond
-    if message_lower in short_acks:
-        return False
-    
-    # If very short (under 10 chars) and no question mark, probably not meaningful
-    if len(message_text) < 10 and "?" not in message_text:
-        return False
-    
-    # Questions - always respond
-    has_question_mark = "?" in message_text
-    question_starters = [
-        "how", "what", "when", "where", "why", "who", "which",
-        "can you", "could you", "would you", "do you", "does", "did",
-        "is there", "are there", "will you", "have you", "has",
-        "am i", "are we", "is it", "should i", "should we", "can we", "can i"
-    ]
-    starts_with_question = any(message_lower.startswith(starter) for starter in question_starters)
-    
-    # Complaints/concerns - always respond
-    concern_words = [
-        "bad", "terrible", "awful", "trash", "horrible", "poor",
-        "not working", "broken", "issue", "problem", "concerned",
-        "worried", "disappointing", "disappointed", "frustrated",
-        "low", "down", "dropping", "declined", "worse"
-    ]
-    has_concern = any(word in message_lower for word in concern_words)
-    
-    # Requests - always respond
-    request_phrases = [
-        "need to", "want to", "would like", "can we", "could we",
-        "let's", "we should", "please", "help"
-    ]
-    has_request = any(phrase in message_lower for phrase in request_phrases)
-    
-    return has_question_mark or starts_with_question or has_concern or has_request
+    return classify_message(message_text)["needs_response"]
 
 # ============================================
 # FAQ RESPONSES - ACTUAL QUESTIONS ONLY
@@ -290,20 +1325,7 @@ FAQ_DATABASE = [
 
 def find_faq_match(message_text):
     """Match message to FAQ - ONLY if it needs a response"""
-    if not is_needs_response(message_text):
-        return None
-    
-    message_lower = message_text.lower()
-    
-    for faq in FAQ_DATABASE:
-        for pattern in faq["question_patterns"]:
-            if pattern in message_lower:
-                return {
-                    "answer": faq["answer"],
-                    "category": faq["category"]
-                }
-    
-    return None
+    return classify_message(message_text)["faq"]
 
 # Meeting keywords - EXPANDED for better matching
 MEETING_KEYWORDS = [
@@ -328,243 +1350,1603 @@ MEETING_KEYWORDS = [
 ]
 
 # ============================================
-# ONBOARDING COMMANDS (MANUAL, TEAM ONLY)
+# MESSAGE CLASSIFIER
 # ============================================
 
-@bot.command("/pip-onboard")
-def handle_onboard_main(ack, say, command):
-    """Team uses this to send main channel welcome - tags all external stakeholders"""
-    ack()
-    
-    # Only team members can use this
-    user_id = command["user_id"]
-    if not is_internal_team_member(user_id):
-        say("This command is only available to the CleverViral team.", ephemeral=True)
-        return
-    
-    channel_id = command["channel_id"]
-    
-    # Get all channel members
-    try:
-        result = bot.client.conversations_members(channel=channel_id)
-        all_members = result.get("members", [])
-        
-        # Filter to only external stakeholders (non-team members)
-        external_members = [member_id for member_id in all_members if not is_internal_team_member(member_id)]
-        
-        # Create @mentions for all external stakeholders
-        if external_members:
-            welcome_mentions = " ".join([f"<@{member_id}>" for member_id in external_members])
-        else:
-            welcome_mentions = "Welcome"
-    except Exception as e:
-        print(f"Error getting channel members: {e}")
-        welcome_mentions = "Welcome"
-    
-    calendly_link = format_link(CALENDLY_LINK, "book a call")
-    text = (
-        f"{welcome_mentions}\n\n"
-        f"This is your primary channel with the CleverViral team. "
-        f"We'll discuss strategy, share updates, and collaborate on campaigns here.\n\n"
-        f"**Quick actions:**\n"
-        f"• Need a new campaign? Use `/new-campaign`\n"
-        f"• Want to {calendly_link} with the team\n\n"
-        f"I'm Pip. Ask me anything you need."
-    )
-    
-    say(text=text)
+def _build_trie_regex(phrases):
+    """Turn phrases into a trie-shaped regex, so matching cost follows text length, not phrase count"""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = True
 
-@bot.command("/pip-onboard-live")
-def handle_onboard_live(ack, say, command):
-    """Team uses this to send live_responses welcome - tags all external stakeholders"""
-    ack()
-    
-    # Only team members can use this
-    user_id = command["user_id"]
-    if not is_internal_team_member(user_id):
-        say("This command is only available to the CleverViral team.", ephemeral=True)
-        return
-    
-    channel_id = command["channel_id"]
-    
-    # Get all channel members
-    try:
-        result = bot.client.conversations_members(channel=channel_id)
-        all_members = result.get("members", [])
-        
-        # Filter to only external stakeholders
-        external_members = [member_id for member_id in all_members if not is_internal_team_member(member_id)]
-        
-        # Create @mentions for all external stakeholders
-        if external_members:
-            welcome_mentions = " ".join([f"<@{member_id}>" for member_id in external_members])
-        else:
-            welcome_mentions = "Welcome"
-    except Exception as e:
-        print(f"Error getting channel members: {e}")
-        welcome_mentions = "Welcome"
-    
-    text = (
-        f"{welcome_mentions}\n\n"
-        f"This channel shows real-time notifications of positive replies from your campaigns. "
-        f"You can respond to leads via your Master Inbox (accessible from your dashboard).\n\n"
-        f"We'll notify you here whenever someone shows interest."
-    )
-    
-    say(text=text)
+    def to_regex(node):
+        branches = [re.escape(char) + to_regex(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        # Greedy optional group: the longest phrase at a position wins
+        return "(?:" + "|".join(branches) + ")" + ("?" if "" in node else "")
 
-# ============================================
-# MESSAGE HANDLER
-# ============================================
+    return to_regex(trie)
 
-@bot.message(".*")
-def handle_message(message, say, client):
-    """Handle messages - only respond to ACTUAL questions"""
-    
-    if "bot_id" in message:
-        return
-    
-    user_id = message.get("user")
-    message_text = message.get("text", "")
-    message_ts = message.get("ts")
+# Punctuation (anything but letters, digits and "_") at the end of a message
+TRAILING_PUNCTUATION = re.compile(r"[^\w]+$")
+
+class MessageClassifier:
+    """
+    Compiled view of the keyword and FAQ tables
+    One regex scan of the message answers needs-response, meeting, routing and FAQ
+    """
+
+    def __init__(self, short_acks, question_starters, concern_words, request_phrases,
+                 meeting_keywords, question_routing, faq_database, default_handoff):
+        self.short_acks = frozenset(short_acks)
+        self.default_handoff = default_handoff
+        self.routing = [(category, config["team_member"]) for category, config in question_routing.items()]
+        self.faqs = [{"answer": faq["answer"], "category": faq["category"]} for faq in faq_database]
+        for faq in self.faqs:
+            if faq["category"] in question_routing:
+                faq["team_member"] = question_routing[faq["category"]]["team_member"]
+
+        # One bit per rule; the lowest set bit of a group is the first match in table order
+        self.starter_bit = 1 << 0
+        self.concern_bit = 1 << 1
+        self.request_bit = 1 << 2
+        self.meeting_bit = 1 << 3
+        self.routing_shift = 4
+        self.faq_shift = self.routing_shift + len(self.routing)
+        self.routing_mask = ((1 << len(self.routing)) - 1) << self.routing_shift
+        self.faq_mask = ((1 << len(self.faqs)) - 1) << self.faq_shift
+
+        phrase_bits = {}
+        def tag(phrases, bit):
+            for phrase in phrases:
+                phrase = phrase.lower()
+                phrase_bits[phrase] = phrase_bits.get(phrase, 0) | bit
+
+        tag(question_starters, self.starter_bit)
+        tag(concern_words, self.concern_bit)
+        tag(request_phrases, self.request_bit)
+        tag(meeting_keywords, self.meeting_bit)
+        for index, (category, _) in enumerate(self.routing):
+            tag(question_routing[category]["keywords"], 1 << (self.routing_shift + index))
+        for index, faq in enumerate(faq_database):
+            tag(faq["question_patterns"], 1 << (self.faq_shift + index))
+
+        # The scan only reports the longest phrase starting at each position,
+        # so fold in the bits of every shorter phrase that is a prefix of it
+        self.match_bits = {}
+        for phrase in phrase_bits:
+            bits = 0
+            for end in range(1, len(phrase) + 1):
+                bits |= phrase_bits.get(phrase[:end], 0)
+            self.match_bits[phrase] = bits
+
+        self.pattern = re.compile("(?=(" + _build_trie_regex(phrase_bits) + "))")
+
+    def cache_key(self, message_text):
+        """
+        The form a message's decision is cached under and classified from
+        Whitespace runs collapsed to one space, casefolded, trailing punctuation stripped,
+        so "Any update ?" and "any update??" share a key. Whether the text had a "?"
+        is kept alongside it, since a question mark anywhere makes a message need a response
+        """
+        text = TRAILING_PUNCTUATION.sub("", " ".join(message_text.casefold().split()))
+        return ("?" in message_text, text)
+
+    def classify_key(self, key):
+        """The decision for every text sharing a cache key"""
+        has_question_mark, text = key
+        # "ok?" is a question, not an acknowledgement, even though its key text is "ok"
+        return self._decide(text, text in self.short_acks and not has_question_mark,
+                            len(text) < 10, has_question_mark)
+
+    def classify(self, message_text):
+        message_lower = message_text.lower()
+        return self._decide(message_lower, message_lower.strip() in self.short_acks,
+                            len(message_text) < 10, "?" in message_text)
+
+    def _decide(self, message_lower, is_ack, short, has_question_mark):
+        start = len(message_lower) - len(message_lower.lstrip())
+
+        bits = 0
+        starter_bits = 0
+        for match in self.pattern.finditer(message_lower):
+            match_bits = self.match_bits[match.group(1)]
+            bits |= match_bits
+            if match.start() == start:
+                starter_bits = match_bits
+
+        if is_ack:
+            needs_response = False
+        elif short and not has_question_mark:
+            needs_response = False
+        else:
+            needs_response = bool(
+                has_question_mark
+                or starter_bits & self.starter_bit
+                or bits & (self.concern_bit | self.request_bit)
+            )
+
+        team_member, category = self.default_handoff, "general"
+        routing_bits = bits & self.routing_mask
+        if routing_bits:
+            category, team_member = self.routing[(routing_bits & -routing_bits).bit_length() - 1 - self.routing_shift]
+
+        faq = None
+        faq_bits = bits & self.faq_mask
+        if needs_response and faq_bits:
+            faq = dict(self.faqs[(faq_bits & -faq_bits).bit_length() - 1 - self.faq_shift])
+
+        return {
+            "needs_response": needs_response,
+            "is_meeting": bool(bits & self.meeting_bit),
+            "team_member": team_member,
+            "category": category,
+            "faq": faq,
+        }
+
+# ============================================
+# FUZZY FAQ INDEX
+# ============================================
+
+FAQ_NGRAM_SIZES = (3, 4)
+
+def normalize_for_search(text):
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+def _char_ngrams(text):
+    padded = f" {text} "
+    counts = Counter()
+    for size in FAQ_NGRAM_SIZES:
+        for start in range(len(padded) - size + 1):
+            counts[padded[start:start + size]] += 1
+    return counts
+
+class FaqIndex:
+    """
+    Character n-gram TF-IDF vectors for every FAQ question pattern
+    The pattern x n-gram matrix is stored column-wise (CSC), so scoring a message
+    against every pattern is one sparse matrix-vector product
+    """
+
+    def __init__(self, faq_database):
+        self.faqs = [{"answer": faq["answer"], "category": faq["category"]} for faq in faq_database]
+        patterns = [(normalize_for_search(pattern), faq_index)
+                    for faq_index, faq in enumerate(faq_database) for pattern in faq["question_patterns"]]
+        self.patterns = [pattern for pattern, _ in patterns]
+        self.pattern_faq = np.array([faq_index for _, faq_index in patterns], dtype=np.int32)
+
+        rows = [_char_ngrams(pattern) for pattern in self.patterns]
+        document_frequency = Counter(gram for row in rows for gram in row)
+        total = len(rows)
+        self.vocabulary = {gram: column for column, gram in enumerate(sorted(document_frequency))}
+        self.idf = {gram: log((1 + total) / (1 + count)) + 1 for gram, count in document_frequency.items()}
+        self.unknown_idf = log(1 + total) + 1
+
+        # Sublinear tf * idf, L2-normalised per pattern, then transposed into columns
+        columns = [[] for _ in self.vocabulary]
+        for row_index, row in enumerate(rows):
+            weights = {gram: (1 + log(count)) * self.idf[gram] for gram, count in row.items()}
+            norm = sum(weight * weight for weight in weights.values()) ** 0.5 or 1.0
+            for gram, weight in weights.items():
+                columns[self.vocabulary[gram]].append((row_index, weight / norm))
+
+        self.indptr = np.zeros(len(columns) + 1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum([len(column) for column in columns])
+        self.indices = np.array([row for column in columns for row, _ in column], dtype=np.int32)
+        self.data = np.array([weight for column in columns for _, weight in column], dtype=np.float32)
+
+    def search(self, message_text, top_k=3, threshold=0.0):
+        """Best FAQ entries for a message as (faq, score, pattern), highest score first"""
+        counts = _char_ngrams(normalize_for_search(message_text))
+        if not counts or not self.patterns:
+            return []
+
+        query = {}
+        norm = 0.0
+        for gram, count in counts.items():
+            weight = (1 + log(count)) * self.idf.get(gram, self.unknown_idf)
+            norm += weight * weight
+            if gram in self.vocabulary:
+                query[self.vocabulary[gram]] = weight
+        if not query:
+            return []
+
+        # Sparse mat-vec: gather the touched columns and scatter-add into pattern scores
+        columns = np.fromiter(query, dtype=np.int64, count=len(query))
+        weights = np.fromiter(query.values(), dtype=np.float32, count=len(query)) / np.float32(norm ** 0.5)
+        starts, ends = self.indptr[columns], self.indptr[columns + 1]
+        lengths = ends - starts
+        positions = np.repeat(ends - np.cumsum(lengths), lengths) + np.arange(lengths.sum())
+        scores = np.bincount(
+            self.indices[positions],
+            weights=self.data[positions] * np.repeat(weights, lengths),
+            minlength=len(self.patterns)
+        )
+
+        # Best-scoring pattern per FAQ entry
+        candidates = np.flatnonzero(scores >= threshold)
+        results, seen = [], set()
+        for pattern_index in candidates[np.argsort(scores[candidates])[::-1]]:
+            faq_index = int(self.pattern_faq[pattern_index])
+            if faq_index in seen:
+                continue
+            seen.add(faq_index)
+            results.append((dict(self.faqs[faq_index]), float(scores[pattern_index]), self.patterns[pattern_index]))
+            if len(results) == top_k:
+                break
+        return results
+
+def get_faq_index():
+    return get_config().faq_index
+
+def search_faq(message_text, top_k=3):
+    """Top-k fuzzy FAQ matches above FAQ_MATCH_THRESHOLD"""
+    return get_faq_index().search(message_text, top_k=top_k, threshold=FAQ_MATCH_THRESHOLD)
+
+# ============================================
+# LIVE CONFIGURATION
+# ============================================
+
+CONFIG_LIST_KEYS = ["short_acks", "question_starters", "concern_words", "request_phrases", "meeting_keywords"]
+
+class PipConfig:
+    """
+    Immutable snapshot of the team, keyword and FAQ tables plus everything compiled from them
+    A reload builds a whole new snapshot and swaps the reference in one assignment,
+    so a message sees either the old tables or the new ones, never a mix
+    """
+
+    def __init__(self, tables, generation=0, source="built-in"):
+        self.generation = generation
+        self.source = source
+        self.loaded_at = time.time()
+        self.team_members = dict(tables["team_members"])
+        self.internal_team_ids = frozenset(self.team_members.values())
+        self.default_handoff = self.resolve_member(tables["default_handoff"])
+        self.question_routing = {
+            category: {"team_member": self.resolve_member(routing["team_member"]), "keywords": list(routing["keywords"])}
+            for category, routing in tables["question_routing"].items()
+        }
+        self.faq_database = [dict(faq) for faq in tables["faq_database"]]
+        for key in CONFIG_LIST_KEYS:
+            setattr(self, key, list(tables[key]))
+
+        self.classifier = MessageClassifier(
+            self.short_acks, self.question_starters, self.concern_words, self.request_phrases,
+            self.meeting_keywords, self.question_routing, self.faq_database, self.default_handoff
+        )
+        self.faq_index = FaqIndex(self.faq_database)
+
+        # Clients looked up by channel first, then by workspace
+        self.clients = [ClientConfig(entry, self) for entry in tables["clients"]]
+        self.client_by_channel = {channel_id: client for client in self.clients for channel_id in client.channels}
+        self.client_by_team = {client.team_id: client for client in self.clients if client.team_id}
+        self.client_by_name = {client.name: client for client in self.clients}
+        self._matchers = OrderedDict()
+        self._matchers_lock = threading.Lock()
+        # Lives on the snapshot, so a reload starts with an empty cache
+        self._decisions = OrderedDict()  # key -> (decision, approximate bytes)
+        self._decisions_bytes = 0
+        self._decisions_lock = threading.Lock()
+
+    def stats(self):
+        """Generation, source and cache sizes of this snapshot, for /stats"""
+        return {
+            "generation": self.generation, "source": self.source, "loaded_at": self.loaded_at,
+            "clients": len(self.clients), "client_matchers": len(self._matchers),
+            "cached_decisions": len(self._decisions), "cached_decision_bytes": self._decisions_bytes,
+        }
+
+    def resolve_member(self, name_or_id):
+        """Team member by name from team_members, or a raw Slack user ID"""
+        return self.team_members.get(name_or_id, name_or_id)
+
+    def client_for(self, channel_id, team_id=None):
+        """The client owning a channel (or its workspace), or None for the shared defaults"""
+        client = self.client_by_channel.get(channel_id)
+        if client is None and team_id:
+            client = self.client_by_team.get(team_id)
+        return client
+
+    def cached_decision(self, key):
+        with self._decisions_lock:
+            entry = self._decisions.get(key)
+            decision = None
+            if entry is not None:
+                self._decisions.move_to_end(key)
+                decision = entry[0]
+        cache_stats.add(("decisions", "hit" if decision is not None else "miss"))
+        return decision
+
+    def store_decision(self, key, decision, size):
+        """Keep a decision, evicting the least recently used past DECISION_CACHE_MAX entries or _BYTES"""
+        with self._decisions_lock:
+            previous = self._decisions.pop(key, None)
+            if previous is not None:
+                self._decisions_bytes -= previous[1]
+            if size > DECISION_CACHE_MAX_BYTES:
+                return
+            self._decisions[key] = (decision, size)
+            self._decisions_bytes += size
+            while len(self._decisions) > DECISION_CACHE_MAX or self._decisions_bytes > DECISION_CACHE_MAX_BYTES:
+                self._decisions_bytes -= self._decisions.popitem(last=False)[1][1]
+
+    def matcher_for(self, client):
+        """(classifier, faq_index, question_routing) for a client, compiled on first use"""
+        if client is None or not client.has_own_matcher:
+            return self.classifier, self.faq_index, self.question_routing
+
+        with self._matchers_lock:
+            matcher = self._matchers.get(client.name)
+            if matcher:
+                self._matchers.move_to_end(client.name)
+                cache_stats.add(("client_matchers", "hit"))
+                return matcher
+        cache_stats.add(("client_matchers", "miss"))
+
+        # Built outside the lock; two threads racing on a cold client both compile, one wins
+        question_routing = {
+            category: {"team_member": client.routing_owners.get(category, routing["team_member"]), "keywords": routing["keywords"]}
+            for category, routing in self.question_routing.items()
+        }
+        # Client FAQs are listed first, so they win over shared answers to the same question
+        faq_database = client.faq_database + self.faq_database
+        matcher = (
+            MessageClassifier(
+                self.short_acks, self.question_starters, self.concern_words, self.request_phrases,
+                self.meeting_keywords, question_routing, faq_database, client.default_handoff
+            ),
+            FaqIndex(faq_database),
+            question_routing,
+        )
+        with self._matchers_lock:
+            self._matchers[client.name] = matcher
+            while len(self._matchers) > CLIENT_MATCHER_CACHE_MAX:
+                self._matchers.popitem(last=False)
+        return matcher
+
+class ClientConfig:
+    """One client's channels, workspace, links, owners, extra FAQs and broadcast tags/variables from the "clients" config list"""
+
+    def __init__(self, entry, config):
+        self.name = entry["name"]
+        self.channels = list(entry.get("channels", []))
+        self.team_id = entry.get("team_id")
+        self.calendly_link = entry.get("calendly_link") or CALENDLY_LINK
+        self.notion_form_link = entry.get("notion_form_link") or NOTION_FORM_LINK
+        self.default_handoff = config.resolve_member(entry.get("default_handoff") or config.default_handoff)
+        self.routing_owners = {
+            category: config.resolve_member(owner) for category, owner in entry.get("routing_owners", {}).items()
+        }
+        self.faq_database = [dict(faq) for faq in entry.get("faq_database", [])]
+        self.tags = frozenset(entry.get("tags", []))
+        self.variables = dict(entry.get("variables", {}))
+        self.has_own_matcher = bool(entry.get("default_handoff") or self.routing_owners or self.faq_database)
+
+def builtin_tables():
+    return {
+        "team_members": TEAM_MEMBERS,
+        "default_handoff": DEFAULT_HANDOFF,
+        "question_routing": QUESTION_ROUTING,
+        "faq_database": FAQ_DATABASE,
+        "short_acks": SHORT_ACKS,
+        "question_starters": QUESTION_STARTERS,
+        "concern_words": CONCERN_WORDS,
+        "request_phrases": REQUEST_PHRASES,
+        "meeting_keywords": MEETING_KEYWORDS,
+        "clients": [],
+    }
+
+def _config_files(path):
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".json"))
+    return [path]
+
+def _config_signature(path):
+    signature = []
+    for file_path in _config_files(path):
+        try:
+            stat = os.stat(file_path)
+            signature.append((file_path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append((file_path, None, None))
+    return tuple(signature)
+
+def validate_tables(tables):
+    """Raise ValueError if the merged tables can't be compiled"""
+    for key in ["team_members", "question_routing"]:
+        if not isinstance(tables[key], dict):
+            raise ValueError(f"{key} must be an object")
+    for key in CONFIG_LIST_KEYS:
+        if not isinstance(tables[key], list) or not all(isinstance(item, str) for item in tables[key]):
+            raise ValueError(f"{key} must be a list of strings")
+    for category, routing in tables["question_routing"].items():
+        if "team_member" not in routing or not isinstance(routing.get("keywords"), list):
+            raise ValueError(f"question_routing.{category} needs team_member and a keywords list")
+    validate_faqs(tables["faq_database"], "faq_database")
+    
+    if not isinstance(tables["clients"], list):
+        raise ValueError("clients must be a list")
+    names, channels = set(), set()
+    for index, client in enumerate(tables["clients"]):
+        if not isinstance(client, dict) or not client.get("name"):
+            raise ValueError(f"clients[{index}] needs a name")
+        if client["name"] in names:
+            raise ValueError(f"client {client['name']} is listed twice")
+        names.add(client["name"])
+        for channel_id in client.get("channels", []):
+            if channel_id in channels:
+                raise ValueError(f"channel {channel_id} belongs to more than one client")
+            channels.add(channel_id)
+        unknown = set(client.get("routing_owners", {})) - set(tables["question_routing"])
+        if unknown:
+            raise ValueError(f"client {client['name']} routes unknown categories: {sorted(unknown)}")
+        validate_faqs(client.get("faq_database", []), f"client {client['name']} faq_database")
+        tags = client.get("tags", [])
+        if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+            raise ValueError(f"client {client['name']} tags must be a list of strings")
+        variables = client.get("variables", {})
+        if not isinstance(variables, dict) or not all(isinstance(value, str) for value in variables.values()):
+            raise ValueError(f"client {client['name']} variables must map names to strings")
+
+def validate_faqs(faqs, name):
+    if not isinstance(faqs, list):
+        raise ValueError(f"{name} must be a list")
+    for index, faq in enumerate(faqs):
+        if not isinstance(faq.get("question_patterns"), list) or not isinstance(faq.get("answer"), str):
+            raise ValueError(f"{name}[{index}] needs question_patterns and answer")
+        faq.setdefault("category", "general")
+
+def load_tables(path):
+    """Built-in tables with every top-level key from the JSON file(s) at path laid over them"""
+    tables = dict(builtin_tables())
+    for file_path in _config_files(path):
+        with open(file_path) as f:
+            overrides = json.load(f)
+        if not isinstance(overrides, dict):
+            raise ValueError(f"{file_path} must contain a JSON object")
+        tables.update({key: value for key, value in overrides.items() if key in tables})
+    validate_tables(tables)
+    return tables
+
+_config = None
+_config_signature_seen = None
+_config_watcher_pid = None
+_config_lock = threading.Lock()
+_config_watcher_lock = threading.Lock()
+
+def get_config():
+    """Current config snapshot; read it once per message and use that object throughout"""
+    if _config_watcher_pid != os.getpid():
+        _start_config_watcher()
+    return _config
+
+def reload_config():
+    """Rebuild the snapshot if the config files changed; returns True if a new one was swapped in"""
+    global _config, _config_signature_seen
+    with _config_lock:
+        if not PIP_CONFIG_PATH:
+            if _config is None:
+                _config = PipConfig(builtin_tables())
+            return False
+
+        signature = _config_signature(PIP_CONFIG_PATH)
+        if _config is not None and signature == _config_signature_seen:
+            return False
+
+        try:
+            tables = load_tables(PIP_CONFIG_PATH)
+            generation = _config.generation + 1 if _config else 1
+            new_config = PipConfig(tables, generation=generation, source=PIP_CONFIG_PATH)
+        except Exception as e:
+            log_event("Error loading config, keeping current tables", level=logging.ERROR, path=PIP_CONFIG_PATH, error=str(e))
+            if _config is None:
+                _config = PipConfig(builtin_tables())
+            _config_signature_seen = signature
+            return False
+
+        _config = new_config
+        _config_signature_seen = signature
+        log_event("Loaded config", generation=new_config.generation, path=PIP_CONFIG_PATH)
+        return True
+
+def _start_config_watcher():
+    # The pid is set last, so no other thread sees this process as started before a config exists
+    global _config_watcher_pid
+    with _config_watcher_lock:
+        if _config_watcher_pid == os.getpid():
+            return
+        reload_config()
+        if PIP_CONFIG_PATH:
+            threading.Thread(target=_watch_config, name="config-watcher", daemon=True).start()
+        _config_watcher_pid = os.getpid()
+
+def _watch_config():
+    while True:
+        time.sleep(CONFIG_POLL_SECONDS)
+        reload_config()
+
+# ============================================
+# CLASSIFICATION ENTRY POINT
+# ============================================
+
+def get_classifier():
+    return get_config().classifier
+
+def _decision_size(message_text):
+    # Key text plus a rough allowance for the key tuple, decision dict and LRU node
+    return sys.getsizeof(message_text) + 600
+
+def classify_message(message_text, config=None, client=None):
+    """Classify a message in one pass: needs_response, is_meeting, team_member, category, faq"""
+    config = config or get_config()
+    # Clients with their own owners/FAQs decide differently, so they get their own entries
+    text_key = config.matcher_for(client)[0].cache_key(message_text)
+    key = (client.name if client and client.has_own_matcher else None, text_key)
+    if DECISION_CACHE_MAX > 0:
+        cached = config.cached_decision(key)
+        if cached is not None:
+            return dict(cached, faq=dict(cached["faq"]) if cached["faq"] else None)
+    
+    # Decided from the key alone, so every text sharing it gets the same decision
+    decision = _classify_key(text_key, config, client)
+    if DECISION_CACHE_MAX > 0:
+        config.store_decision(key, dict(decision, faq=dict(decision["faq"]) if decision["faq"] else None),
+                              _decision_size(message_text))
+    return decision
+
+def _classify(message_text, config, client):
+    return _classify_key(config.matcher_for(client)[0].cache_key(message_text), config, client)
+
+def _classify_key(text_key, config, client):
+    classifier, faq_index, question_routing = config.matcher_for(client)
+    decision = classifier.classify_key(text_key)
+    
+    # Exact pattern hits win; otherwise fall back to the closest FAQ above the threshold
+    if decision["needs_response"] and decision["faq"] is None:
+        matches = faq_index.search(text_key[1], top_k=1, threshold=FAQ_MATCH_THRESHOLD)
+        if matches:
+            faq, score, _ = matches[0]
+            faq["score"] = round(score, 3)
+            if faq["category"] in question_routing:
+                faq["team_member"] = question_routing[faq["category"]]["team_member"]
+            decision["faq"] = faq
+    return decision
+
+# ============================================
+# CHANNEL MEMBERS
+# ============================================
+
+# channel_id -> (members in Slack order as dict keys, fetched_at)
+# Kept current from member_joined_channel / member_left_channel events
+channel_members = OrderedDict()
+channel_members_lock = threading.Lock()
+
+def cached_channel_members(channel_id):
+    """Cached member IDs of a channel, or None if they have to be fetched"""
+    with channel_members_lock:
+        entry = channel_members.get(channel_id)
+        if entry and time.time() - entry[1] < CHANNEL_MEMBER_TTL_SECONDS:
+            channel_members.move_to_end(channel_id)
+            cache_stats.add(("channel_members", "hit"))
+            return list(entry[0])
+    cache_stats.add(("channel_members", "miss"))
+    return None
+
+def store_channel_members(channel_id, members):
+    with channel_members_lock:
+        channel_members[channel_id] = (members, time.time())
+        channel_members.move_to_end(channel_id)
+        while len(channel_members) > CHANNEL_MEMBER_CACHE_MAX:
+            channel_members.popitem(last=False)
+
+def get_channel_members(channel_id):
+    """All member IDs of a channel, paging through conversations.members on a cache miss"""
+    cached = cached_channel_members(channel_id)
+    if cached is not None:
+        return cached
+    
+    members = {}
+    cursor = None
+    while True:
+        result = slack_call("conversations.members", channel=channel_id, cursor=cursor, limit=1000)
+        members.update(dict.fromkeys(result.get("members", [])))
+        cursor = (result.get("response_metadata") or {}).get("next_cursor")
+        if not cursor:
+            break
+    
+    store_channel_members(channel_id, members)
+    return list(members)
+
+def update_channel_member(channel_id, user_id, joined):
+    with channel_members_lock:
+        entry = channel_members.get(channel_id)
+        if not entry:
+            return
+        if joined:
+            entry[0][user_id] = None
+        else:
+            entry[0].pop(user_id, None)
+
+def handle_member_joined(event, body=None):
+    update_channel_member(event.get("channel"), event.get("user"), joined=True)
+    mark_event_seen(body)
+
+def handle_member_left(event, body=None):
+    update_channel_member(event.get("channel"), event.get("user"), joined=False)
+    mark_event_seen(body)
+
+def external_mentions(member_ids):
+    """@mentions for every external stakeholder in a member list, or "Welcome" """
+    # Filter to only external stakeholders (non-team members)
+    external_members = [member_id for member_id in member_ids if not is_internal_team_member(member_id)]
+    
+    # Create @mentions for all external stakeholders
+    if external_members:
+        return " ".join([f"<@{member_id}>" for member_id in external_members])
+    return "Welcome"
+
+def get_welcome_mentions(channel_id):
+    """@mentions for every external stakeholder in the channel, or "Welcome" """
+    try:
+        return external_mentions(get_channel_members(channel_id))
+    except Exception as e:
+        log_event("Error getting channel members", level=logging.ERROR, channel=channel_id, error=str(e))
+        return "Welcome"
+
+# ============================================
+# ONBOARDING COMMANDS (MANUAL, TEAM ONLY)
+# ============================================
+
+TEAM_ONLY_TEXT = "This command is only available to the CleverViral team."
+
+def onboard_main_text(welcome_mentions, client=None):
+    calendly_link = format_link(client.calendly_link if client else CALENDLY_LINK, "book a call")
+    return (
+        f"{welcome_mentions}\n\n"
+        f"This is your primary channel with the CleverViral team. "
+        f"We'll discuss strategy, share updates, and collaborate on campaigns here.\n\n"
+        f"**Quick actions:**\n"
+        f"• Need a new campaign? Use `/new-campaign`\n"
+        f"• Want to {calendly_link} with the team\n\n"
+        f"I'm Pip. Ask me anything you need."
+    )
+
+def onboard_live_text(welcome_mentions):
+    return (
+        f"{welcome_mentions}\n\n"
+        f"This channel shows real-time notifications of positive replies from your campaigns. "
+        f"You can respond to leads via your Master Inbox (accessible from your dashboard).\n\n"
+        f"We'll notify you here whenever someone shows interest."
+    )
+
+def handle_onboard_main(ack, say, command):
+    """Team uses this to send main channel welcome - tags all external stakeholders"""
+    ack()
+    
+    # Only team members can use this
+    user_id = command["user_id"]
+    if not is_internal_team_member(user_id):
+        say(TEAM_ONLY_TEXT, ephemeral=True)
+        return
+    
+    channel_id = command["channel_id"]
+    
+    welcome_mentions = get_welcome_mentions(channel_id)
+    client = get_config().client_for(channel_id, command.get("team_id"))
+    
+    say(text=onboard_main_text(welcome_mentions, client))
+
+def handle_onboard_live(ack, say, command):
+    """Team uses this to send live_responses welcome - tags all external stakeholders"""
+    ack()
+    
+    # Only team members can use this
+    user_id = command["user_id"]
+    if not is_internal_team_member(user_id):
+        say(TEAM_ONLY_TEXT, ephemeral=True)
+        return
+    
+    channel_id = command["channel_id"]
+    
+    welcome_mentions = get_welcome_mentions(channel_id)
+    
+    say(text=onboard_live_text(welcome_mentions))
+
+# ============================================
+# MESSAGE HANDLER
+# ============================================
+
+def handle_message(message, body=None):
+    """Handle messages - only respond to ACTUAL questions"""
+    correlation_id.set(message_correlation_id(message))
+    # Client messages wait briefly in case more of the same question is on its way
+    if BURST_WINDOW_SECONDS > 0 and "bot_id" not in message and not is_internal_team_member(message.get("user")):
+        # The burst marks its events seen once it is queued
+        bursts.add(burst_key(message), message, time.perf_counter(), body)
+    elif dispatch_message(message):
+        # Only an accepted event counts as seen, so Slack's retry of a dropped one is processed
+        mark_event_seen(body)
+
+def handle_burst(messages, received_at, bodies=()):
+    """
+    Triage a merged burst and queue its reply (runs on the scheduler thread)
+    Never blocks: a full queue is retried from the scheduler until
+    MESSAGE_ENQUEUE_TIMEOUT_SECONDS have passed. The events are marked seen
+    by the queued job, so SQLite is never written on the scheduler thread
+    """
+    # A merged burst is traced under its first message
+    correlation_id.set(message_correlation_id(messages[0]))
+    if len(messages) > 1:
+        metrics.inc("pip_burst_messages_total", value=len(messages) - 1)
+    message = merge_burst(messages)
+    thread_key = get_thread_key(message.get("channel"), message.get("thread_ts", message.get("ts")))
+    triaged = triage_message(message, received_at)
+    if not triaged:
+        # Nothing to reply to; if the queue is busy the events just aren't marked seen
+        if bodies:
+            message_queue.submit(thread_key, mark_events_seen, bodies, timeout=0)
+        return
+    decision, received_at = triaged
+    submit_burst(thread_key, message, decision, received_at, bodies, time.monotonic() + MESSAGE_ENQUEUE_TIMEOUT_SECONDS)
+
+def submit_burst(thread_key, message, decision, received_at, bodies, deadline):
+    if message_queue.submit(thread_key, process_burst, message, decision, received_at, bodies, timeout=0):
+        return
+    if time.monotonic() < deadline:
+        timers.call_later(BURST_RESUBMIT_SECONDS, submit_burst, thread_key, message, decision, received_at, bodies, deadline)
+        return
+    log_event("Message queue full, dropping", level=logging.WARNING, thread=thread_key)
+    record_outcome("dropped", received_at)
+
+def process_burst(message, decision, received_at, bodies):
+    # Queued means accepted, so Slack's retries of these events can be dropped from here on
+    mark_events_seen(bodies)
+    process_client_message(message, decision, received_at)
+
+def mark_events_seen(bodies):
+    for body in bodies:
+        mark_event_seen(body)
+
+def dispatch_message(message, received_at=None):
+    """Triage a message and queue its reply; False if the queue was full and it was dropped"""
+    triaged = triage_message(message, received_at)
+    if not triaged:
+        return True
+    decision, received_at = triaged
+    
+    # Slack calls run on the work queue; same-thread messages stay in order
+    thread_key = get_thread_key(message.get("channel"), message.get("thread_ts", message.get("ts")))
+    if not message_queue.submit(thread_key, process_client_message, message, decision, received_at):
+        log_event("Message queue full, dropping", level=logging.WARNING, thread=thread_key)
+        record_outcome("dropped", received_at)
+        return False
+    return True
+
+def triage_message(message, received_at=None):
+    """
+    The no-network part of message handling
+    Returns (decision, received_at) for a client message that needs a reply, otherwise None
+    """
+    if "bot_id" in message:
+        return None
+    
+    received_at = received_at or time.perf_counter()
+    user_id = message.get("user")
+    message_text = message.get("text", "")
+    message_ts = message.get("ts")
     channel_id = message.get("channel")
     thread_ts = message.get("thread_ts", message_ts)
     
-    # Ignore internal team
+    # Ignore internal team (but remember which threads they replied in)
     if is_internal_team_member(user_id):
-        print(f"Ignoring message from team member: {user_id}")
-        return
+        if thread_ts != message_ts:
+            record_team_reply(channel_id, thread_ts, user_id, message_ts)
+        log_event("Ignoring message from team member", sampled=True, user=user_id)
+        record_outcome("team_member", received_at)
+        return None
+    
+    # One scan of the text decides everything below (with the channel's client overrides, if any)
+    classify_started = time.perf_counter()
+    config = get_config()
+    client = config.client_for(channel_id, message.get("team"))
+    decision = classify_message(message_text, config, client)
+    
+    # Question starters only count at the start of a message, so a merged burst
+    # ("hey" + "how do I...") is also checked from each later message onwards
+    burst_texts = message.get("burst_texts", [])
+    if not decision["needs_response"] and len(burst_texts) > 1:
+        for index in range(1, len(burst_texts)):
+            tail_decision = classify_message("\n".join(burst_texts[index:]), config, client)
+            if tail_decision["needs_response"]:
+                decision = tail_decision
+                break
+    decision["client"] = client
+    # Timed on its own: received_at may be the start of a burst's debounce window
+    metrics.observe("pip_classification_seconds", time.perf_counter() - classify_started)
+    log_event("Classified", level=logging.DEBUG, needs_response=decision["needs_response"],
+              category=decision["category"], meeting=decision["is_meeting"],
+              faq=decision["faq"]["category"] if decision["faq"] else None, client=client.name if client else None)
+    
+    # CRITICAL: Only proceed if this needs a response
+    # (checked first so acks and chatter never touch the thread store or the API)
+    if not decision["needs_response"]:
+        log_event("Doesn't need response, ignoring", sampled=True, text=message_text[:50])
+        record_outcome("ignored_ack", received_at)
+        return None
+    
+    return decision, received_at
+
+def record_outcome(outcome, received_at, **labels):
+    source = message_source.get()
+    if source == "live":
+        metrics.inc("pip_messages_total", outcome=outcome, **labels)
+        metrics.observe("pip_message_handling_seconds", time.perf_counter() - received_at, outcome=outcome)
+    elif source == "backfill":
+        # Kept apart so a backfill doesn't skew live traffic and latency
+        metrics.inc("pip_backfill_messages_total", outcome=outcome, **labels)
+
+def run_steps(steps):
+    """
+    Drive a step generator on this thread, sending each step's result (or raising its error) back in
+    Steps are ("slack", method, kwargs) for Web API calls, ("blocking", func, args) for SQLite
+    and other local I/O, and ("reaction", "show"/"finish", args) for the progress reaction.
+    async_main.run_steps drives the same generators on the event loop
+    """
+    value, error = None, None
+    while True:
+        try:
+            step = steps.throw(error) if error else steps.send(value)
+        except StopIteration as stop:
+            return stop.value
+        value, error = None, None
+        try:
+            value = _run_step(*step)
+        except Exception as e:
+            error = e
+
+def _run_step(kind, target, args):
+    if kind == "slack":
+        return slack_call(target, **args)
+    if kind == "reaction":
+        return getattr(reactions, target)(*args)
+    return target(*args)
+
+def client_message_steps(message, decision, received_at):
+    """Reply to a client message that needs a response, as steps (see run_steps)"""
+    user_id = message.get("user")
+    message_ts = message.get("ts")
+    channel_id = message.get("channel")
+    thread_ts = message.get("thread_ts", message_ts)
     
     # Check if thread already handled
     thread_key = get_thread_key(channel_id, thread_ts)
-    if thread_key in handled_threads:
-        print(f"Thread already handled: {thread_key}")
+    if (yield ("blocking", handled_threads.__contains__, (thread_key,))):
+        log_event("Thread already handled", sampled=True, thread=thread_key)
+        record_outcome("already_handled", received_at)
         return
     
     # Check if team already replied in thread
     if thread_ts != message_ts:
-        if has_team_replied_in_thread(channel_id, thread_ts):
-            print(f"Team already replied in thread: {thread_key}")
-            handled_threads.add(thread_key)
+        if (yield from team_reply_steps(channel_id, thread_ts)):
+            log_event("Team already replied in thread", sampled=True, thread=thread_key)
+            yield ("blocking", handled_threads.add, (thread_key,))
+            record_outcome("team_replied", received_at)
             return
     
-    # CRITICAL: Only proceed if this needs a response
-    if not is_needs_response(message_text):
-        print(f"Doesn't need response, ignoring: {message_text[:50]}")
+    # Claim the thread; another worker may have won the race
+    if not (yield ("blocking", handled_threads.add, (thread_key,))):
+        log_event("Thread claimed by another worker", sampled=True, thread=thread_key)
+        record_outcome("already_handled", received_at)
         return
     
-    # React with hourglass
-    try:
-        client.reactions_add(
-            channel=channel_id,
-            timestamp=message_ts,
-            name="hourglass_flowing_sand"
-        )
-    except Exception as e:
-        print(f"Error adding reaction: {e}")
-    
-    handled_threads.add(thread_key)
+    # React with hourglass (only sent if the reply takes longer than the coalesce window)
+    yield ("reaction", "show", (channel_id, message_ts, "hourglass_flowing_sand"))
     
+    # The reply goes out first; the final reaction is best-effort and never holds it up
+    reply = plan_reply(user_id, decision)
+    try:
+        yield ("slack", "chat.postMessage", {"channel": channel_id, "text": reply["text"], "thread_ts": thread_ts})
+    except Exception:
+        yield ("reaction", "finish", (channel_id, message_ts))
+        raise
+    yield ("reaction", "finish", (channel_id, message_ts, reply["reaction"]))
+    record_outcome(reply["outcome"], received_at, **reply["labels"])
+    # FAQ and meeting replies answer the client themselves, so only escalations wait on the team
+    if reply["outcome"] == "escalation":
+        record_escalation(message, decision, reply)
+    log_reply(reply, received_at)
+
+def process_client_message(message, decision, received_at):
+    """Reply to a client message that needs a response (runs on the work queue)"""
+    run_steps(client_message_steps(message, decision, received_at))
+
+def log_reply(reply, received_at):
+    log_event("Replied", outcome=reply["outcome"], team_member=reply["team_member"],
+              seconds=round(time.perf_counter() - received_at, 4), **reply["labels"])
+
+def record_escalation(message, decision, reply):
+    """Start the clock on the teammate Pip just looped in"""
+    client = decision.get("client")
+    sla_ledger.escalated(
+        message.get("channel"), message.get("thread_ts", message.get("ts")), message.get("ts"),
+        reply["team_member"], reply["labels"].get("category", reply["outcome"]), reply["outcome"],
+        client.name if client else None
+    )
+
+def plan_reply(user_id, decision):
+    """The reply, final reaction and outcome for a claimed client message"""
     # Detect question type for routing
-    team_member_id, question_category = detect_question_type(message_text)
-    
-    # Check for meeting keywords FIRST (before FAQ)
-    message_lower = message_text.lower()
+    team_member_id = decision["team_member"]
     
-    # Better keyword matching - check if ANY keyword is in message
-    is_meeting_request = False
-    for keyword in MEETING_KEYWORDS:
-        if keyword in message_lower:
-            is_meeting_request = True
-            break
+    client = decision.get("client")
     
-    if is_meeting_request:
-        calendly_link = format_link(CALENDLY_LINK, "here")
+    # Check for meeting keywords FIRST (before FAQ)
+    if decision["is_meeting"]:
+        calendly_link = format_link(client.calendly_link if client else CALENDLY_LINK, "here")
         text = f"Hey <@{user_id}>, grab a time {calendly_link}. Looping in <@{team_member_id}> as well."
-        
-        try:
-            client.reactions_remove(channel=channel_id, timestamp=message_ts, name="hourglass_flowing_sand")
-            client.reactions_add(channel=channel_id, timestamp=message_ts, name="white_check_mark")
-        except:
-            pass
-        
-        say(text=text, thread_ts=thread_ts)
-        return
+        return {"text": text, "reaction": "white_check_mark", "outcome": "meeting", "labels": {},
+                "team_member": team_member_id}
     
     # Check for FAQ match
-    faq_match = find_faq_match(message_text)
+    faq_match = decision["faq"]
     if faq_match:
         answer = faq_match.get("answer", "")
         faq_category = faq_match.get("category", "general")
-        
+
         # Get appropriate team member based on FAQ category
         if faq_category != "general":
-            for cat_name, cat_config in QUESTION_ROUTING.items():
-                if cat_name == faq_category:
-                    team_member_id = cat_config["team_member"]
-                    break
-        
+            team_member_id = faq_match.get("team_member", team_member_id)
+
         text = f"Hey <@{user_id}>,\n\n{answer}\n\nLooping in <@{team_member_id}> on this one."
-        
-        try:
-            client.reactions_remove(channel=channel_id, timestamp=message_ts, name="hourglass_flowing_sand")
-            client.reactions_add(channel=channel_id, timestamp=message_ts, name="white_check_mark")
-        except:
-            pass
-        
-        say(text=text, thread_ts=thread_ts)
-        return
+        return {"text": text, "reaction": "white_check_mark", "outcome": "faq", "labels": {"category": faq_category},
+                "team_member": team_member_id}
     
     # No FAQ match - escalate
     text = f"Hey <@{user_id}>, looping in <@{team_member_id}> on this one."
-    
-    try:
-        client.reactions_remove(channel=channel_id, timestamp=message_ts, name="hourglass_flowing_sand")
-        client.reactions_add(channel=channel_id, timestamp=message_ts, name="eyes")
-    except:
-        pass
-    
-    say(text=text, thread_ts=thread_ts)
+    return {"text": text, "reaction": "eyes", "outcome": "escalation", "labels": {"category": decision["category"]},
+            "team_member": team_member_id}
 
 # ============================================
 # SLASH COMMANDS
 # ============================================
 
-@bot.command("/new-campaign")
+def new_campaign_text(client=None):
+    form_link = format_link(client.notion_form_link if client else NOTION_FORM_LINK, "this brief form")
+    return (
+        f"Sounds like a start of a great idea. To make sure we capture all the necessary details, "
+        f"please fill out {form_link}. We'll review and get back to you within 3-5 business days."
+    )
+
 def handle_new_campaign(ack, body, say):
     ack()
     user_id = body["user_id"]
+    client = get_config().client_for(body.get("channel_id"), body.get("team_id"))
     
-    form_link = format_link(NOTION_FORM_LINK, "this brief form")
-    text = (
-        f"Sounds like a start of a great idea. To make sure we capture all the necessary details, "
-        f"please fill out {form_link}. We'll review and get back to you within 3-5 business days."
+    say(text=new_campaign_text(client))
+
+# ============================================
+# BACKFILL
+# ============================================
+
+class BackfillCheckpoint:
+    """
+    Per-channel progress of a backfill, saved as JSON after every thread
+    A run with the same since picks up where the last one stopped
+    """
+
+    def __init__(self, path, since):
+        self.path = path
+        self.since = since
+        self.channels = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    saved = json.load(f)
+                if saved.get("since") == since:
+                    self.channels = saved.get("channels", {})
+            except (OSError, ValueError) as e:
+                log_event("Ignoring unreadable backfill checkpoint", level=logging.WARNING, path=path, error=str(e))
+
+    def done(self, channel_id):
+        return self.channels.get(channel_id, {}).get("done", False)
+
+    def last_ts(self, channel_id):
+        return self.channels.get(channel_id, {}).get("last_ts")
+
+    def update(self, channel_id, last_ts=None, done=False):
+        with self._lock:
+            entry = self.channels.setdefault(channel_id, {})
+            if last_ts:
+                entry["last_ts"] = last_ts
+            entry["done"] = done
+            if not self.path:
+                return
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"since": self.since, "channels": self.channels}, f)
+            os.replace(temp_path, self.path)
+
+def parse_since(text, now=None):
+    """Epoch seconds from "6h", "90m", "2d" or a raw Slack timestamp"""
+    now = now or time.time()
+    text = text.strip().lower()
+    units = {"m": 60, "h": 3600, "d": 86400}
+    if text and text[-1] in units:
+        return now - float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+def _paged(method, key, **kwargs):
+    """Every item under key across all pages of a cursor-paginated method"""
+    cursor = None
+    while True:
+        result = slack_call(method, cursor=cursor, **kwargs)
+        yield from result.get(key, [])
+        cursor = (result.get("response_metadata") or {}).get("next_cursor")
+        if not cursor:
+            return
+
+def backfill_channels():
+    return [channel["id"] for channel in _paged(
+        "users.conversations", "channels", types="public_channel,private_channel", exclude_archived=True, limit=200
+    )]
+
+def _is_pip(msg, identity):
+    return bool(msg.get("bot_id")) and (msg.get("bot_id") == identity.get("bot_id") or msg.get("user") == identity.get("user_id"))
+
+def _backfill_thread(channel_id, messages, identity, since, dry_run, stats):
+    """
+    Answer the first unanswered client question in one thread (or one root-level burst)
+    messages are in time order; the thread counts as answered if the team or Pip posted in it
+    """
+    root = messages[0]
+    thread_ts = root.get("thread_ts", root["ts"])
+    thread_key = get_thread_key(channel_id, thread_ts)
+    
+    if any(_is_pip(msg, identity) for msg in messages):
+        stats["answered"] += 1
+        handled_threads.add(thread_key)
+        return
+    team_user = find_team_reply(messages, thread_ts)
+    if team_user:
+        _index_team_thread(channel_id, thread_ts, team_user)
+        stats["answered"] += 1
+        handled_threads.add(thread_key)
+        return
+    
+    # Client messages from inside the window, with quick follow-ups from the same person merged
+    pending = [msg for msg in messages if float(msg["ts"]) >= since and not msg.get("bot_id") and not msg.get("subtype")
+               and not is_internal_team_member(msg.get("user"))]
+    groups = []
+    for msg in pending:
+        if groups and groups[-1][-1].get("user") == msg.get("user") and \
+                float(msg["ts"]) - float(groups[-1][-1]["ts"]) <= max(BURST_WINDOW_SECONDS, 0):
+            groups[-1].append(msg)
+        else:
+            groups.append([msg])
+    
+    for group in groups:
+        message = merge_burst([dict(msg, channel=channel_id) for msg in group])
+        message["thread_ts"] = thread_ts
+        stats["scanned"] += len(group)
+        correlation_id.set(message_correlation_id(message))
+        triaged = triage_message(message)
+        if not triaged:
+            continue
+        decision, received_at = triaged
+        if thread_key in handled_threads:
+            stats["answered"] += 1
+            return
+        stats["replied"] += 1
+        metrics.inc("pip_backfill_replies_total", dry_run=str(dry_run).lower())
+        if not dry_run:
+            process_client_message(message, decision, received_at)
+        return
+
+def _backfill_channel(channel_id, since, identity, checkpoint, dry_run, stats):
+    resume_after = float(checkpoint.last_ts(channel_id) or 0)
+    # Replies posted during the downtime can be in threads started well before it,
+    # so history is read from further back and kept where the thread is still active
+    history = sorted(
+        (msg for msg in _paged("conversations.history", "messages", channel=channel_id,
+                               oldest=f"{since - BACKFILL_THREAD_LOOKBACK_SECONDS:.6f}", limit=200)
+         if float(msg["ts"]) >= since or (msg.get("reply_count") and float(msg.get("latest_reply") or 0) >= since)),
+        key=lambda msg: float(msg["ts"])
     )
-    say(text=text)
+    
+    # Root messages with replies are read as whole threads; other root messages are their own thread.
+    # Each unit is (position, messages): the checkpoint records the position of the last unit done
+    units, loose = [], []
+    for msg in history:
+        if msg.get("reply_count"):
+            if loose:
+                units.append((loose[-1]["ts"], loose))
+                loose = []
+            replies = list(_paged("conversations.replies", "messages", channel=channel_id, ts=msg["ts"], limit=200))
+            units.append((msg["ts"], replies))
+        elif msg.get("bot_id") or msg.get("subtype") or is_internal_team_member(msg.get("user")):
+            continue
+        else:
+            # Consecutive root messages from one client become one unit, answered like a burst
+            if loose and (loose[-1].get("user") != msg.get("user") or
+                          float(msg["ts"]) - float(loose[-1]["ts"]) > max(BURST_WINDOW_SECONDS, 0)):
+                units.append((loose[-1]["ts"], loose))
+                loose = []
+            loose.append(msg)
+    if loose:
+        units.append((loose[-1]["ts"], loose))
+    
+    for position, messages in units:
+        if float(position) <= resume_after:
+            continue
+        _backfill_thread(channel_id, messages, identity, since, dry_run, stats)
+        checkpoint.update(channel_id, last_ts=position)
+    checkpoint.update(channel_id, done=True)
+
+def run_backfill(since, channels=None, dry_run=False, checkpoint_path=BACKFILL_CHECKPOINT_PATH,
+                 workers=BACKFILL_WORKERS, progress=log_event):
+    """
+    Answer client questions posted since `since` (epoch seconds) that nobody replied to
+    Channels are scanned in parallel; every call goes through slack_call's shared rate budget
+    Returns totals: channels, scanned, replied, answered (already handled), errors
+    """
+    identity = slack_call("auth.test")
+    channels = channels or backfill_channels()
+    checkpoint = BackfillCheckpoint(checkpoint_path, round(since, 6))
+    todo = [channel_id for channel_id in channels if not checkpoint.done(channel_id)]
+    totals = Counter(channels=len(channels), skipped=len(channels) - len(todo))
+    progress(f"Backfill since {since:.0f}: {len(todo)} of {len(channels)} channels to scan"
+             f"{' (dry run)' if dry_run else ''}")
+    
+    def scan(channel_id):
+        correlation_id.set(f"backfill:{channel_id}")
+        message_source.set("backfill_dry_run" if dry_run else "backfill")
+        stats = Counter()
+        try:
+            _backfill_channel(channel_id, since, identity, checkpoint, dry_run, stats)
+        except Exception as e:
+            log_event("Error backfilling channel", level=logging.ERROR, exc_info=True, channel=channel_id, error=str(e))
+            stats["errors"] += 1
+        return channel_id, stats
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for finished, (channel_id, stats) in enumerate(pool.map(scan, todo), 1):
+            totals.update(stats)
+            progress(f"[{finished}/{len(todo)}] {channel_id}: scanned {stats['scanned']}, "
+                     f"replied {stats['replied']}, already answered {stats['answered']}"
+                     f"{', failed' if stats['errors'] else ''}")
+    return dict(totals)
+
+_backfill_lock = threading.Lock()
+
+def handle_backfill(ack, command, respond):
+    """/pip-backfill <since: 6h | 90m | 2d | slack ts> [dry] - team only"""
+    ack()
+    if not is_internal_team_member(command["user_id"]):
+        respond(TEAM_ONLY_TEXT)
+        return
+    
+    args = command.get("text", "").split()
+    try:
+        since = parse_since(args[0])
+    except (IndexError, ValueError):
+        respond("Usage: `/pip-backfill 6h` (or 90m, 2d, or a Slack timestamp), add `dry` to only report")
+        return
+    dry_run = "dry" in args[1:]
+    
+    if not _backfill_lock.acquire(blocking=False):
+        respond("A backfill is already running.")
+        return
+    
+    def run():
+        try:
+            totals = run_backfill(since, dry_run=dry_run)
+            respond(f"Backfill {'dry run ' if dry_run else ''}finished: {totals.get('channels', 0)} channels, "
+                    f"{totals.get('scanned', 0)} client messages scanned, {totals.get('replied', 0)} "
+                    f"{'would get' if dry_run else 'got'} a reply, {totals.get('answered', 0)} were already answered"
+                    f"{', ' + str(totals['errors']) + ' channels failed (run again to resume)' if totals.get('errors') else ''}.")
+        except Exception as e:
+            log_event("Error running backfill", level=logging.ERROR, exc_info=True, error=str(e))
+            respond(f"Backfill failed: {e}. Run the same command again to resume.")
+        finally:
+            _backfill_lock.release()
+    
+    respond(f"Backfill started{' (dry run)' if dry_run else ''}; I'll report back here.")
+    threading.Thread(target=run, name="backfill", daemon=True).start()
+
+# ============================================
+# BROADCAST
+# ============================================
+
+BROADCAST_VARIABLE = re.compile(r"\{(\w+)\}")
+BROADCAST_CHANNEL_MENTION = re.compile(r"^<#(\w+)(?:\|[^>]*)?>$")
+
+def broadcast_targets(targets, config=None):
+    """
+    Channels for a list of targets, in order and without repeats: "all" (every client channel),
+    "tag:<tag>", "client:<name>" (or a bare client name), a channel ID or a <#C123|name> mention
+    Returns ({channel_id: client or None}, [unknown targets])
+    """
+    config = config or get_config()
+    channels, unknown = OrderedDict(), []
+    for target in targets:
+        target = target.strip()
+        mention = BROADCAST_CHANNEL_MENTION.match(target)
+        if target == "all":
+            clients = config.clients
+        elif target.startswith("tag:"):
+            clients = [client for client in config.clients if target[4:] in client.tags]
+        elif target.removeprefix("client:") in config.client_by_name:
+            clients = [config.client_by_name[target.removeprefix("client:")]]
+        elif mention or re.fullmatch(r"[CG][A-Z0-9]{6,}", target):
+            channel_id = mention.group(1) if mention else target
+            channels.setdefault(channel_id, config.client_for(channel_id))
+            continue
+        else:
+            unknown.append(target)
+            continue
+        if not clients:
+            unknown.append(target)
+        for client in clients:
+            for channel_id in client.channels:
+                channels.setdefault(channel_id, client)
+    return channels, unknown
+
+def broadcast_variables(channel_id, client, variables=None):
+    """
+    Values for {placeholders}, later sources winning: built-ins, the client's config variables,
+    then the request's variables for the client's name and for the channel ID
+    """
+    values = {
+        "channel": f"<#{channel_id}>",
+        "client": client.name if client else "",
+        "calendly_link": client.calendly_link if client else CALENDLY_LINK,
+        "notion_form_link": client.notion_form_link if client else NOTION_FORM_LINK,
+    }
+    if client:
+        values.update(client.variables)
+    variables = variables or {}
+    if client:
+        values.update(variables.get(client.name, {}))
+    values.update(variables.get(channel_id, {}))
+    return values
+
+def render_broadcast(template, values):
+    """Fill {name} placeholders; raises KeyError naming the first missing one"""
+    return BROADCAST_VARIABLE.sub(lambda match: str(values[match.group(1)]), template)
+
+def plan_broadcast(template, targets, variables=None):
+    """
+    Render the message for every target channel before anything is posted
+    Returns (messages [(channel_id, client name, text)], errors); nothing should be sent if errors
+    """
+    channels, unknown = broadcast_targets(targets)
+    errors = [f"unknown target {target}" for target in unknown]
+    if not channels and not errors:
+        errors.append("no channels to post to")
+    if len(channels) > BROADCAST_MAX_CHANNELS:
+        errors.append(f"{len(channels)} channels is over the limit of {BROADCAST_MAX_CHANNELS}")
+    
+    messages = []
+    for channel_id, client in channels.items():
+        try:
+            text = render_broadcast(template, broadcast_variables(channel_id, client, variables))
+        except KeyError as e:
+            errors.append(f"{channel_id}: no value for {{{e.args[0]}}}")
+            continue
+        messages.append((channel_id, client.name if client else None, text))
+    return messages, errors
+
+def broadcast_report(deliveries, elapsed, dry_run=False):
+    """Totals, latency percentiles and failures from [{channel, client, ok, ts, latency_ms, error}]"""
+    latencies = sorted(delivery["latency_ms"] for delivery in deliveries if delivery["ok"])
+    
+    def percentile(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else None
+    
+    return {
+        "dry_run": dry_run,
+        "channels": len(deliveries),
+        "sent": sum(1 for delivery in deliveries if delivery["ok"]),
+        "failed": [delivery for delivery in deliveries if not delivery["ok"]],
+        "elapsed_seconds": round(elapsed, 3),
+        "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "max": latencies[-1] if latencies else None},
+        "deliveries": deliveries,
+    }
+
+def _deliver_broadcast(channel_id, client_name, text):
+    started = time.perf_counter()
+    delivery = {"channel": channel_id, "client": client_name, "ok": True, "ts": None, "error": None}
+    try:
+        delivery["ts"] = slack_call("chat.postMessage", channel=channel_id, text=text)["ts"]
+    except Exception as e:
+        delivery["ok"] = False
+        delivery["error"] = e.response["error"] if isinstance(e, SlackApiError) else str(e)
+    delivery["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    metrics.inc("pip_broadcast_messages_total", result="sent" if delivery["ok"] else "failed")
+    return delivery
+
+def run_broadcast(messages, dry_run=False, workers=BROADCAST_CONCURRENCY):
+    """
+    Post planned messages concurrently and report on each
+    Every post goes through slack_call, so chat.postMessage's per-channel limit and 429s are honoured
+    """
+    started = time.perf_counter()
+    if dry_run:
+        deliveries = [{"channel": channel_id, "client": client_name, "ok": True, "ts": None, "error": None,
+                       "latency_ms": 0.0, "text": text} for channel_id, client_name, text in messages]
+        return broadcast_report(deliveries, time.perf_counter() - started, dry_run=True)
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(messages)))) as pool:
+        deliveries = list(pool.map(lambda message: _deliver_broadcast(*message), messages))
+    report = broadcast_report(deliveries, time.perf_counter() - started)
+    log_event("Broadcast finished", channels=report["channels"], sent=report["sent"],
+              failed=len(report["failed"]), seconds=report["elapsed_seconds"])
+    return report
+
+def broadcast_summary_text(report):
+    verb = "Would post to" if report["dry_run"] else "Posted to"
+    text = (f"{verb} {report['sent']} of {report['channels']} channels in {report['elapsed_seconds']}s"
+            f"{' (p95 ' + str(report['latency_ms']['p95']) + ' ms)' if report['latency_ms']['p95'] else ''}.")
+    if report["failed"]:
+        text += "\nFailed: " + ", ".join(f"<#{failure['channel']}> ({failure['error']})" for failure in report["failed"])
+    return text
+
+def handle_broadcast(ack, command, respond):
+    """/pip-broadcast [dry] <targets, comma separated> <message with {placeholders}> - team only"""
+    ack()
+    if not is_internal_team_member(command["user_id"]):
+        respond(TEAM_ONLY_TEXT)
+        return
+    
+    args = command.get("text", "").strip().split(None, 1)
+    dry_run = bool(args) and args[0] == "dry"
+    if dry_run:
+        args = args[1].split(None, 1) if len(args) > 1 else []
+    if len(args) < 2:
+        respond("Usage: `/pip-broadcast [dry] tag:weekly,client:acme,C0123 Hi {client}, ...` "
+                "(targets: all, tag:<tag>, client:<name> or channels)")
+        return
+    
+    messages, errors = plan_broadcast(args[1], args[0].split(","))
+    if errors:
+        respond("Nothing was posted: " + "; ".join(errors))
+        return
+    
+    def run():
+        try:
+            report = run_broadcast(messages, dry_run=dry_run)
+            text = broadcast_summary_text(report)
+            if dry_run:
+                text += f"\nPreview for <#{messages[0][0]}>:\n>>> {messages[0][2]}"
+            respond(text)
+        except Exception as e:
+            log_event("Error running broadcast", level=logging.ERROR, exc_info=True, error=str(e))
+            respond(f"Broadcast failed: {e}")
+    
+    respond(f"{'Previewing' if dry_run else 'Posting'} to {len(messages)} channels...")
+    threading.Thread(target=run, name="broadcast", daemon=True).start()
 
 # ============================================
 # N8N WEBHOOK
 # ============================================
 
+def call_summary_text(summary):
+    return f"📞 **Call Summary**\n\n{summary}"
+
+def split_summary(summary, limit=SUMMARY_CHUNK_CHARS):
+    """Split text into chunks of at most limit chars, at paragraph, then line, then word boundaries"""
+    chunks = []
+    current = ""
+    for paragraph in summary.split("\n\n"):
+        candidate = f"{current}\n\n{paragraph}" if current else paragraph
+        if len(candidate) <= limit:
+            current = candidate
+            continue
+        if current:
+            chunks.append(current)
+
+        # A single paragraph over the limit: break it at lines, then words, then anywhere
+        while len(paragraph) > limit:
+            cut = paragraph.rfind("\n", 0, limit + 1)
+            if cut <= 0:
+                cut = paragraph.rfind(" ", 0, limit + 1)
+            if cut <= 0:
+                cut = limit
+            chunks.append(paragraph[:cut].rstrip())
+            paragraph = paragraph[cut:].lstrip()
+        current = paragraph
+    if current or not chunks:
+        chunks.append(current)
+    return chunks
+
+def post_summary_job(job, mark_progress):
+    """Post a summary as a top-level message with any overflow as replies in its thread"""
+    started = time.perf_counter()
+    chunks = split_summary(call_summary_text(job["summary"]))
+    parent_ts = job["parent_ts"]
+    # Resume after the last chunk that made it, so a retry never repeats one
+    for index in range(job["chunks_posted"], len(chunks)):
+        if index == 0:
+            result = slack_call("chat.postMessage", channel=job["channel"], text=chunks[0])
+            parent_ts = result["ts"]
+        else:
+            slack_call("chat.postMessage", channel=job["channel"], text=chunks[index], thread_ts=parent_ts)
+        mark_progress(parent_ts, index + 1)
+    metrics.observe("pip_webhook_post_seconds", time.perf_counter() - started)
+
+summary_jobs = SummaryJobQueue(
+    STATE_DB_PATH, post_summary_job,
+    workers=SUMMARY_WORKERS,
+    max_attempts=SUMMARY_MAX_ATTEMPTS,
+    poll_seconds=SUMMARY_POLL_SECONDS,
+    ttl_seconds=SUMMARY_JOB_TTL_SECONDS
+)
+
+def summary_job_key(item, idempotency_key=None):
+    """Caller's idempotency key, or a hash of the content so identical retries collapse"""
+    key = idempotency_key or item.get("idempotency_key")
+    if key:
+        return str(key)
+    return hashlib.sha256(f"{item['channel']}\0{item['summary']}".encode()).hexdigest()
+
+def parse_summary_item(item):
+    """(channel, summary) from a webhook item, or None if it's malformed"""
+    if not isinstance(item, dict) or not item.get("channel") or not isinstance(item.get("summary"), str):
+        return None
+    return item["channel"], item["summary"]
+
+def accept_summaries(items, idempotency_key=None):
+    """
+    Validate and persist webhook items; returns (http status, response body)
+    Shared by the Flask and asyncio routes
+    """
+    jobs, results = [], []
+    for index, item in enumerate(items):
+        parsed = parse_summary_item(item)
+        if parsed is None:
+            results.append({"index": index, "status": "error", "message": "Invalid payload"})
+            continue
+        key = summary_job_key(item, idempotency_key if len(items) == 1 else None)
+        jobs.append((key, *parsed))
+        results.append({"index": index, "job_id": key})
+    
+    if jobs:
+        try:
+            accepted = iter(summary_jobs.enqueue(jobs))
+        except Exception as e:
+            log_event("Error queueing call summaries", level=logging.ERROR, exc_info=True, error=str(e))
+            return 500, {"status": "error", "message": str(e)}
+        for result in results:
+            if "job_id" in result:
+                _, is_new = next(accepted)
+                result["status"] = "accepted" if is_new else "duplicate"
+                metrics.inc("pip_summary_jobs_total", result=result["status"])
+    return (202 if jobs else 400), results
+
 @app.route("/n8n/transcript-summary", methods=["POST"])
 def n8n_transcript_summary():
-    data = request.json
-    
-    if not data or "summary" not in data or "channel" not in data:
+    data = request.get_json(silent=True)
+    if parse_summary_item(data) is None:
         return jsonify({"status": "error", "message": "Invalid payload"}), 400
     
-    summary = data["summary"]
-    target_channel = data["channel"]
+    status, results = accept_summaries([data], request.headers.get("Idempotency-Key"))
+    if status != 202:
+        return jsonify(results), status
+    return jsonify(results[0]), 202
+
+@app.route("/n8n/transcript-summaries", methods=["POST"])
+def n8n_transcript_summaries():
+    data = request.get_json(silent=True)
+    items = data.get("summaries") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items or len(items) > SUMMARY_BATCH_MAX:
+        return jsonify({"status": "error", "message": f"Expected 1-{SUMMARY_BATCH_MAX} summaries"}), 400
+    
+    status, results = accept_summaries(items)
+    return jsonify({"results": results}), status
+
+@app.route("/n8n/jobs/<job_id>", methods=["GET"])
+def n8n_job_status(job_id):
+    job = summary_jobs.status(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown job"}), 404
+    return jsonify(job), 200
+
+def parse_broadcast_request(data, authorization):
+    """
+    (status, error) for a POST /n8n/broadcast body, or (None, (messages, dry_run)) when it can go out
+    Body: {"text", "targets": [...], "variables": {channel or client: {name: value}}, "dry_run"}
+    """
+    if not BROADCAST_TOKEN:
+        return 404, "Broadcast endpoint is disabled (set BROADCAST_TOKEN)"
+    if not hmac.compare_digest((authorization or "").encode(), f"Bearer {BROADCAST_TOKEN}".encode()):
+        return 401, "Missing or wrong bearer token"
+    if not isinstance(data, dict) or not isinstance(data.get("text"), str) or not data["text"].strip() \
+            or not isinstance(data.get("targets"), list) or not isinstance(data.get("variables", {}), dict):
+        return 400, "Expected {\"text\": str, \"targets\": [...], \"variables\"?: {...}}"
+    
+    messages, errors = plan_broadcast(data["text"], [str(target) for target in data["targets"]], data.get("variables"))
+    if errors:
+        return 400, "; ".join(errors)
+    return None, (messages, bool(data.get("dry_run")))
+
+def queue_broadcast(messages):
+    """
+    Queue a planned broadcast on message_queue so the request returns before anything is posted
+    Returns (http status, response body); the delivery report is logged when it finishes
+    """
+    broadcast_id = os.urandom(6).hex()
+    if not message_queue.submit(f"broadcast:{broadcast_id}", run_queued_broadcast, broadcast_id, messages):
+        return 503, {"status": "error", "message": "Too busy to queue the broadcast, try again shortly"}
+    return 202, broadcast_accepted(broadcast_id, messages)
+
+def broadcast_accepted(broadcast_id, messages):
+    return {"status": "accepted", "broadcast_id": broadcast_id, "channels": len(messages)}
+
+def run_queued_broadcast(broadcast_id, messages):
+    correlation_id.set(f"broadcast:{broadcast_id}")
+    run_broadcast(messages)
+
+@app.route("/n8n/broadcast", methods=["POST"])
+def n8n_broadcast():
+    status, result = parse_broadcast_request(request.get_json(silent=True), request.headers.get("Authorization"))
+    if status:
+        return jsonify({"status": "error", "message": result}), status
+    messages, dry_run = result
+    if dry_run:
+        return jsonify(run_broadcast(messages, dry_run=True)), 200
+    status, body = queue_broadcast(messages)
+    return jsonify(body), status
+
+# ============================================
+# EVENT DEDUPLICATION
+# ============================================
+
+event_dedupe_stats = StatsCounter()
+signature_verifier = SignatureVerifier(SLACK_SIGNING_SECRET) if SLACK_SIGNING_SECRET else None
+
+def is_duplicate_event(body, headers):
+    """
+    True if this Events API delivery was already accepted by any worker
+    Only reads the store; each event handler marks its event seen once handled
+    (a message once its reply is queued)
+    """
+    headers = {name.lower(): value for name, value in headers.items()}
+    if headers.get("x-slack-retry-num"):
+        event_dedupe_stats.add("retries")
+    
+    # Without a signing secret nothing is ever marked seen, so there is nothing to look up
+    if not signature_verifier or not signature_verifier.is_valid_request(body, headers):
+        return False
     
     try:
-        bot.client.chat_postMessage(
-            channel=target_channel,
-            text=f"📞 **Call Summary**\n\n{summary}"
-        )
-        return jsonify({"status": "success"}), 200
-    except Exception as e:
-        print(f"Error posting to Slack: {e}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+        payload = json.loads(body)
+    except ValueError:
+        return False
+    # Keyed on event_id alone: one message can arrive as several events (message, app_mention)
+    if payload.get("type") != "event_callback" or not payload.get("event_id"):
+        return False
+    
+    if f"event:{payload['event_id']}" in seen_events:
+        event_dedupe_stats.add("hits")
+        return True
+    event_dedupe_stats.add("misses")
+    return False
+
+def mark_event_seen(body):
+    """Record an accepted event (Bolt's request body) so redeliveries are dropped"""
+    # Bolt has verified the request by now; unsigned setups never write to the store
+    if signature_verifier and body and body.get("event_id"):
+        seen_events.add(f"event:{body['event_id']}")
+
+metrics.collector(lambda: [("pip_events_total", {"result": result}, value) for result, value in event_dedupe_stats.copy().items()])
 
 # ============================================
 # FLASK ROUTES
@@ -574,21 +2956,75 @@ def n8n_transcript_summary():
 def health_check():
     return "Pip is running 🐦", 200
 
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+def service_stats(message_queue_depth):
+    """The /stats body; each serving mode passes the depth of its own message queue"""
+    return {
+        "startup": STARTUP_METRICS,
+        "event_dedupe": event_dedupe_stats.copy(),
+        "slack_api": slack_api_stats.copy(),
+        "caches": {f"{cache}:{result}": value for (cache, result), value in cache_stats.copy().items()},
+        "message_queue_depth": message_queue_depth,
+        "summary_jobs": summary_jobs.counts(),
+        "config": get_config().stats(),
+    }
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify(service_stats(message_queue.pending())), 200
+
+@app.route("/sla", methods=["GET"])
+def sla():
+    # ?dimension=category (repeatable) limits the breakdown; all of them by default
+    return jsonify(sla_ledger.summary(request.args.getlist("dimension"))), 200
+
 @app.route("/slack/events", methods=["POST"])
 def slack_events():
-    return handler.handle(request)
+    # Redelivered events get an immediate 200 without reaching Bolt
+    if is_duplicate_event(request.get_data(as_text=True), request.headers):
+        return "", 200, {"X-Slack-No-Retry": "1"}
+    return get_handler().handle(request)
 
 @app.route("/slack/commands", methods=["POST"])
 def slack_commands():
-    return handler.handle(request)
+    return get_handler().handle(request)
 
 # ============================================
 # STARTUP
 # ============================================
 
+def warm_up():
+    """
+    Build the Bolt app and classifier tables ahead of the first request
+    Under gunicorn --preload this runs once in the master, and forked workers
+    share the result copy-on-write
+    """
+    started = time.perf_counter()
+    get_config()
+    get_handler()
+    STARTUP_METRICS["warmup_seconds"] = round(time.perf_counter() - started, 4)
+    STARTUP_METRICS["warmed_in_pid"] = os.getpid()
+    log_event("Startup", import_seconds=STARTUP_METRICS["import_seconds"], warmup_seconds=STARTUP_METRICS["warmup_seconds"])
+
+def start_background_workers():
+    """
+    Start this process's background threads that don't wait for a request
+    Summary jobs left queued, retrying or with an expired lease by a restart are
+    picked up straight away instead of on the next webhook. Call it in each
+    serving process (after the fork under gunicorn), never in a preloading master
+    """
+    summary_jobs.start()
+
+STARTUP_METRICS["import_seconds"] = round(time.perf_counter() - _import_started, 4)
+
 if __name__ == "__main__":
-    print("🐦 Pip is starting...")
-    print("✅ Pip is ready")
+    log_event("🐦 Pip is starting...")
+    warm_up()
+    start_background_workers()
+    log_event("✅ Pip is ready")
     
     port = int(os.environ.get("PORT", 3000))
     app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,273 @@
+"""
+Prometheus metrics shared by every worker process, and per-process stats counters
+
+Each process records into its own MetricsRegistry and writes snapshots to a
+directory; whichever worker serves /metrics merges them all.
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from logs import log_event
+
+class MetricsRegistry:
+    """
+    Counters and histograms recorded into per-thread shards (no lock on the hot path)
+    A shard whose thread has exited is folded into a per-process base at the next
+    snapshot, so short-lived threads don't pile up shards
+    Each process periodically (and at exit) writes a merged snapshot to directory,
+    and render() sums every snapshot into Prometheus text format. Files are named by
+    pid and process start time, so a reused pid never overwrites a dead worker's counts.
+    Snapshots of dead workers are dropped stale_seconds after their last write;
+    descriptions maps a metric name to its (type, help text)
+    """
+
+    def __init__(self, directory, buckets, flush_seconds, stale_seconds=3600, descriptions=None):
+        self.directory = directory
+        self.buckets = buckets
+        self.flush_seconds = flush_seconds
+        self.stale_seconds = stale_seconds
+        self.descriptions = descriptions or {}
+        self._local = threading.local()
+        self._shards = []  # (thread, shard)
+        self._base = ({}, {})
+        self._gauges = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pid = None
+        self._started_at = None
+
+    def _check_process(self):
+        # Called with self._lock held. A fresh process (or fork) starts empty, with its own flusher
+        if self._pid != os.getpid():
+            self._shards = []
+            self._base = ({}, {})
+            self._pid = os.getpid()
+            self._started_at = time.time()
+            threading.Thread(target=self._flush_forever, name="metrics-flush", daemon=True).start()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None or self._local.pid != os.getpid():
+            shard = ({}, {})
+            with self._lock:
+                self._check_process()
+                self._shards.append((threading.current_thread(), shard))
+            self._local.shard = shard
+            self._local.pid = os.getpid()
+        return shard
+
+    def inc(self, name, value=1, **labels):
+        counters = self._shard()[0]
+        key = (name, tuple(sorted(labels.items())))
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        histograms = self._shard()[1]
+        key = (name, tuple(sorted(labels.items())))
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        histogram[bisect.bisect_left(self.buckets, seconds)] += 1
+        histogram[-1] += seconds
+
+    def gauge(self, name, func):
+        """Register a gauge read at snapshot time; func returns None while there is no value"""
+        self._gauges[name] = func
+
+    def collector(self, func):
+        """Register a callable returning (name, labels, value) counters, read at snapshot time"""
+        self._collectors.append(func)
+
+    @staticmethod
+    def _merge(into, shard):
+        counters, histograms = into
+        shard_counters, shard_histograms = shard
+        for key, value in dict(shard_counters).items():
+            counters[key] = counters.get(key, 0) + value
+        for key, values in dict(shard_histograms).items():
+            merged = histograms.setdefault(key, [0] * len(values))
+            for index, value in enumerate(list(values)):
+                merged[index] += value
+
+    def snapshot(self):
+        counters, histograms = {}, {}
+        with self._lock:
+            self._check_process()
+            started_at = self._started_at
+            # A dead thread can't write to its shard any more, so it is safe to fold
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    self._merge(self._base, shard)
+            self._shards = live
+            self._merge((counters, histograms), self._base)
+            shards = [shard for _, shard in live]
+        for shard in shards:
+            self._merge((counters, histograms), shard)
+        for collect in self._collectors:
+            for name, labels, value in collect():
+                key = (name, tuple(sorted(labels.items())))
+                counters[key] = counters.get(key, 0) + value
+        # A gauge reading None has nothing to report yet (e.g. warm_up hasn't run)
+        gauges = [(name, func()) for name, func in self._gauges.items()]
+        return {
+            "pid": os.getpid(),
+            "started_at": started_at,
+            "written_at": time.time(),
+            "counters": [[name, dict(labels), value] for (name, labels), value in counters.items()],
+            "histograms": [[name, dict(labels), values] for (name, labels), values in histograms.items()],
+            "gauges": [[name, {}, value] for name, value in gauges if value is not None],
+        }
+
+    def write_snapshot(self):
+        try:
+            with self._write_lock:
+                snapshot = self.snapshot()
+                os.makedirs(self.directory, exist_ok=True)
+                path = os.path.join(self.directory, f"metrics-{snapshot['pid']}-{int(snapshot['started_at'] * 1000)}.json")
+                with open(path + ".tmp", "w") as f:
+                    json.dump(snapshot, f)
+                os.replace(path + ".tmp", path)
+        except Exception as e:
+            log_event("Error writing metrics snapshot", level=logging.ERROR, error=str(e))
+
+    def write_final_snapshot(self):
+        """Write the counts recorded since the last flush (at exit), if this process recorded any"""
+        if self._pid == os.getpid():
+            self.write_snapshot()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            self.write_snapshot()
+
+    def _read_snapshots(self):
+        self.write_snapshot()
+        snapshots = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            snapshot["path"] = path
+            snapshots.append(snapshot)
+
+        # Only the newest process with a pid can be the one running under it
+        newest = {}
+        for snapshot in snapshots:
+            snapshot.setdefault("started_at", 0)  # written before files were named by start time
+            newest[snapshot["pid"]] = max(newest.get(snapshot["pid"], 0), snapshot["started_at"])
+        kept = []
+        for snapshot in snapshots:
+            snapshot["alive"] = snapshot["started_at"] == newest[snapshot["pid"]] and _pid_alive(snapshot["pid"])
+            if not snapshot["alive"] and time.time() - snapshot["written_at"] > self.stale_seconds:
+                os.remove(snapshot["path"])
+                continue
+            kept.append(snapshot)
+        return kept
+
+    def render(self):
+        """Prometheus text exposition of every worker's metrics"""
+        counters, histograms, gauges = {}, {}, []
+        for snapshot in self._read_snapshots():
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(sorted(labels.items())))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, values in snapshot["histograms"]:
+                key = (name, tuple(sorted(labels.items())))
+                merged = histograms.setdefault(key, [0] * len(values))
+                for index, value in enumerate(values):
+                    merged[index] += value
+            if snapshot["alive"]:
+                gauges += [(name, {"pid": str(snapshot["pid"])}, value) for name, _, value in snapshot["gauges"]]
+
+        # Hit ratios are derived from the merged cache counters
+        lookups = {}
+        for (name, labels), value in counters.items():
+            if name == "pip_cache_requests_total":
+                labels = dict(labels)
+                hits, total = lookups.get(labels["cache"], (0, 0))
+                lookups[labels["cache"]] = (hits + (value if labels["result"] == "hit" else 0), total + value)
+        gauges += [("pip_cache_hit_ratio", {"cache": cache}, hits / total) for cache, (hits, total) in lookups.items() if total]
+
+        lines = []
+        def header(name):
+            kind, text = self.descriptions.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def label_text(labels):
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels) + "}"
+
+        last = None
+        for (name, labels), value in sorted(counters.items()):
+            if name != last:
+                header(name)
+                last = name
+            lines.append(f"{name}{label_text(labels)} {value}")
+
+        for (name, labels), values in sorted(histograms.items()):
+            if name != last:
+                header(name)
+                last = name
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{label_text(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{label_text(labels)} {values[-1]}")
+            lines.append(f"{name}_count{label_text(labels)} {cumulative}")
+
+        for name, labels, value in sorted(gauges, key=lambda gauge: gauge[0]):
+            if name != last:
+                header(name)
+                last = name
+            lines.append(f"{name}{label_text(sorted(labels.items()))} {value}")
+
+        return "\n".join(lines) + "\n"
+
+def escape_label(value):
+    """A label value as Prometheus text format expects it: backslash, quote and newline escaped"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+class StatsCounter:
+    """
+    Per-process counts shown on /stats (and exported through collectors)
+    Every worker thread adds to them, so updates and copies take a lock;
+    a bare Counter's "+= 1" can lose increments between threads
+    """
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, key, value=1):
+        with self._lock:
+            self._counts[key] += value
+
+    def copy(self):
+        with self._lock:
+            return dict(self._counts)
@@ -0,0 +1,146 @@
+"""
+A set of keys shared by every worker process on the host, kept in SQLite
+"""
+
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from logs import log_event
+from metrics import StatsCounter
+
+class SharedKeyStore:
+    """
+    Bounded set of keys shared by every worker process through SQLite (WAL mode)
+    Entries expire after ttl_seconds; the table never grows past max_entries
+    A small in-process LRU answers repeat lookups without touching the database.
+    If the database can't be written, add() falls back to that LRU, so a worker
+    still claims a key at most once (other workers can't be checked).
+    LRU hits and misses are counted in stats under (table, "hit"/"miss")
+    """
+
+    EVICT_EVERY = 1000
+
+    def __init__(self, path, table, ttl_seconds, max_entries, local_cache_size, encode=None, stats=None):
+        self.path = path
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.local_cache_size = local_cache_size
+        self.encode = encode or (lambda key: key.encode())
+        self.stats = stats if stats is not None else StatsCounter()
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._connections = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork
+        conn = getattr(self._connections, "conn", None)
+        if conn is None or self._connections.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                f"(key BLOB PRIMARY KEY, seen_at REAL NOT NULL) WITHOUT ROWID"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_seen_at ON {self.table} (seen_at)")
+            self._connections.conn = conn
+            self._connections.pid = os.getpid()
+        return conn
+
+    def _remember(self, key, seen_at):
+        """Record key locally; returns when it was last recorded here, or None"""
+        with self._lock:
+            previous = self._local.get(key)
+            self._local[key] = seen_at
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_cache_size:
+                self._local.popitem(last=False)
+        return previous
+
+    def __contains__(self, key):
+        key = self.encode(key)
+        now = time.time()
+        with self._lock:
+            seen_at = self._local.get(key)
+        if seen_at is not None and now - seen_at < self.ttl_seconds:
+            self.stats.add((self.table, "hit"))
+            return True
+        self.stats.add((self.table, "miss"))
+
+        try:
+            row = self._connection().execute(
+                f"SELECT seen_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        except Exception as e:
+            log_event("Error reading shared store", level=logging.ERROR, table=self.table, error=str(e))
+            return False
+
+        if row and now - row[0] < self.ttl_seconds:
+            self._remember(key, row[0])
+            return True
+        return False
+
+    def add(self, key):
+        """Record key; returns False if another worker already holds a live entry"""
+        key = self.encode(key)
+        now = time.time()
+        previous = self._remember(key, now)
+
+        try:
+            conn = self._connection()
+            cursor = conn.execute(
+                f"INSERT INTO {self.table} (key, seen_at) VALUES (?, ?) "
+                f"ON CONFLICT(key) DO UPDATE SET seen_at = excluded.seen_at WHERE seen_at < ?",
+                (key, now, now - self.ttl_seconds)
+            )
+            claimed = cursor.rowcount == 1
+        except Exception as e:
+            # Without the database only this process can be checked: claim at most once here
+            log_event("Error writing shared store", level=logging.ERROR, table=self.table, error=str(e))
+            return previous is None or now - previous >= self.ttl_seconds
+
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.EVICT_EVERY == 0
+        if evict:
+            self.evict()
+        return claimed
+
+    def evict(self):
+        """Drop expired entries and trim the oldest ones past max_entries"""
+        try:
+            conn = self._connection()
+            conn.execute(f"DELETE FROM {self.table} WHERE seen_at < ?", (time.time() - self.ttl_seconds,))
+            count = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY seen_at LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+        except Exception as e:
+            log_event("Error evicting from shared store", level=logging.ERROR, table=self.table, error=str(e))
+
+    def __len__(self):
+        try:
+            return self._connection().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        except Exception as e:
+            log_event("Error counting shared store", level=logging.ERROR, table=self.table, error=str(e))
+            return len(self._local)
+
+def encode_thread_key(thread_key):
+    """Pack "channel:ts" into channel bytes + 8-byte microsecond timestamp"""
+    channel_id, _, thread_ts = thread_key.partition(":")
+    seconds, _, fraction = thread_ts.partition(".")
+    try:
+        micros = int(seconds) * 1000000 + int(fraction.ljust(6, "0")[:6] or 0)
+    except ValueError:
+        return thread_key.encode()
+    return channel_id.encode() + struct.pack(">Q", micros)
@@ -0,0 +1,104 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web import SlackResponse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# main.py reads its settings at import, so point its state somewhere disposable first
+_scratch = tempfile.mkdtemp(prefix="pip-tests-")
+os.environ.setdefault("STATE_DB_PATH", os.path.join(_scratch, "state.db"))
+os.environ.setdefault("METRICS_DIR", os.path.join(_scratch, "metrics"))
+os.environ.setdefault("SLACK_RATE_LIMITING", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+sys.path.insert(0, ROOT)
+
+import main  # noqa: E402
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+def _api_error(status, error="internal_error"):
+    response = SlackResponse(client=None, http_verb="POST", api_url="", req_args={},
+                             data={"ok": False, "error": error}, headers={}, status_code=status)
+    return SlackApiError(error, response)
+
+@pytest.fixture
+def api_error():
+    """api_error(status, error="internal_error"): the SlackApiError the client raises for that response"""
+    return _api_error
+
+@pytest.fixture
+def wait_for():
+    """wait_for(condition, timeout=5): poll until condition() is true; False on timeout"""
+    return _wait_for
+
+# Prefix for run_main scripts: answers every Slack call without the network
+STUB_BOT = """
+import main
+
+class StubClient:
+    def __getattr__(self, name):
+        return lambda **kwargs: {"ok": True, "ts": "1700000000.000001", "messages": []}
+
+class StubBot:
+    client = StubClient()
+
+main._bot = StubBot()
+"""
+
+@pytest.fixture
+def run_main(tmp_path):
+    """run_main(script, **env): run script after importing main in a fresh process; returns its state DB path"""
+    def run(script, **env):
+        env = dict(os.environ, STATE_DB_PATH=str(tmp_path / "state.db"), METRICS_DIR=str(tmp_path / "metrics"),
+                   **{name: str(value) for name, value in env.items()})
+        subprocess.run([sys.executable, "-c", STUB_BOT + script], cwd=ROOT, env=env, check=True, timeout=60)
+        return tmp_path / "state.db"
+    return run
+
+class StubSlackClient:
+    """
+    Records Web API calls in order; failures[method] is a list of errors raised by its next calls
+    and responses[method](**kwargs) answers a method instead of the canned response
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.failures = {}
+        self.responses = {}
+
+    def __getattr__(self, name):
+        method = name.replace("_", ".", 1)
+
+        def call(**kwargs):
+            self.calls.append((method, kwargs))
+            if self.failures.get(method):
+                raise self.failures[method].pop(0)
+            if method in self.responses:
+                return self.responses[method](**kwargs)
+            return {"ok": True, "ts": "1700000000.000001", "messages": []}
+
+        return call
+
+    def methods(self):
+        return [method for method, _ in self.calls]
+
+@pytest.fixture
+def slack(monkeypatch):
+    """Route main's Slack calls to a StubSlackClient, without backoff sleeps"""
+    client = StubSlackClient()
+    monkeypatch.setattr(main, "_bot", type("StubBot", (), {"client": client})())
+    monkeypatch.setattr(main.random, "uniform", lambda low, high: 0)
+    return client
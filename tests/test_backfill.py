@@ -0,0 +1,75 @@
+import json
+
+import main
+
+SINCE = 1700100000.0
+
+def ts(offset):
+    return f"{SINCE + offset:.6f}"
+
+def question(offset, text="how do i see the report?", **fields):
+    return {"user": "UCLIENT", "text": text, "ts": ts(offset), **fields}
+
+def serve(slack, history, threads):
+    """history: root messages; threads: parent ts -> every message in that thread"""
+    slack.responses["auth.test"] = lambda **kwargs: {"ok": True, "user_id": "UPIP", "bot_id": "BPIP"}
+    slack.responses["conversations.history"] = lambda oldest, **kwargs: {
+        "ok": True, "messages": [msg for msg in history if float(msg["ts"]) >= float(oldest)]}
+    slack.responses["conversations.replies"] = lambda ts, **kwargs: {"ok": True, "messages": threads[ts]}
+
+def replied_in(slack):
+    return [kwargs.get("thread_ts") for method, kwargs in slack.calls if method == "chat.postMessage"]
+
+def test_threads_started_before_since_are_answered_if_they_got_replies_after_it(slack, tmp_path):
+    old_parent = question(-86400, "kicking off the campaign", reply_count=1, latest_reply=ts(60))
+    quiet_parent = question(-7200, "another old thread", reply_count=1, latest_reply=ts(-3600))
+    history = [
+        question(-600, "an old question nobody answered?"),
+        old_parent,
+        quiet_parent,
+        question(120),
+    ]
+    threads = {old_parent["ts"]: [old_parent, question(60, thread_ts=old_parent["ts"])]}
+    serve(slack, history, threads)
+
+    totals = main.run_backfill(SINCE, channels=["CBF1"], checkpoint_path=None)
+    assert sorted(replied_in(slack)) == sorted([old_parent["ts"], ts(120)])
+    assert totals["replied"] == 2
+    # The quiet thread had no replies since the downtime, so it is never read
+    assert {kwargs["ts"] for method, kwargs in slack.calls if method == "conversations.replies"} == {old_parent["ts"]}
+
+def test_dry_run_posts_nothing_and_records_no_live_outcomes(slack, monkeypatch, tmp_path):
+    counted = []
+    monkeypatch.setattr(main.metrics, "inc", lambda name, value=1, **labels: counted.append(name))
+    serve(slack, [question(200), question(400, "thanks")], {})
+
+    totals = main.run_backfill(SINCE + 200, channels=["CBF2"], dry_run=True, checkpoint_path=None)
+    assert totals["replied"] == 1 and totals["scanned"] == 2
+    assert replied_in(slack) == []
+    assert "pip_messages_total" not in counted and "pip_backfill_messages_total" not in counted
+    assert "pip_backfill_replies_total" in counted
+
+def test_backfill_replies_are_counted_apart_from_live_messages(slack, monkeypatch):
+    counted = []
+    monkeypatch.setattr(main.metrics, "inc", lambda name, value=1, **labels: counted.append(name))
+    serve(slack, [question(500)], {})
+    main.run_backfill(SINCE + 500, channels=["CBF3"], checkpoint_path=None)
+    assert "pip_backfill_messages_total" in counted and "pip_messages_total" not in counted
+
+def test_a_rerun_resumes_from_the_checkpoint(slack, tmp_path):
+    path = tmp_path / "checkpoint.json"
+    first, second = question(700), question(800, user="UOTHER")
+    serve(slack, [first, second], {})
+    # A run that stopped after the first message
+    since = round(SINCE + 700, 6)
+    path.write_text(json.dumps({"since": since, "channels": {"CBF4": {"last_ts": first["ts"], "done": False}}}))
+
+    main.run_backfill(since, channels=["CBF4"], checkpoint_path=str(path))
+    assert replied_in(slack) == [second["ts"]]
+    assert json.loads(path.read_text())["channels"]["CBF4"] == {"last_ts": second["ts"], "done": True}
+
+    # A finished channel is skipped without reading its history
+    slack.calls.clear()
+    totals = main.run_backfill(since, channels=["CBF4"], checkpoint_path=str(path))
+    assert totals["skipped"] == 1
+    assert [method for method, _ in slack.calls] == ["auth.test"]
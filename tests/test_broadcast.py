@@ -0,0 +1,66 @@
+import pytest
+
+import main
+
+CLIENTS = [
+    {"name": "Acme", "channels": ["CACME001", "CACME002"], "tags": ["weekly"],
+     "variables": {"account_manager": "Sam", "hours": "24"}},
+    {"name": "Beta", "channels": ["CBETA001"], "tags": ["weekly", "beta"]},
+    {"name": "Gamma", "channels": ["CGAMMA01"]},
+]
+
+@pytest.fixture
+def config(monkeypatch):
+    config = main.PipConfig(dict(main.builtin_tables(), clients=CLIENTS))
+    monkeypatch.setattr(main, "get_config", lambda: config)
+    return config
+
+def test_targets_resolve_in_order_without_repeats(config):
+    channels, unknown = main.broadcast_targets(
+        ["client:Beta", "tag:weekly", " Gamma ", "<#CACME001|acme>", "CNEW0001", "tag:none", "nobody"], config)
+    assert list(channels) == ["CBETA001", "CACME001", "CACME002", "CGAMMA01", "CNEW0001"]
+    assert channels["CACME002"].name == "Acme" and channels["CNEW0001"] is None
+    assert unknown == ["tag:none", "nobody"]
+    assert list(main.broadcast_targets(["all"], config)[0]) == ["CACME001", "CACME002", "CBETA001", "CGAMMA01"]
+
+def test_request_variables_override_client_ones_per_channel(config):
+    acme = config.client_by_name["Acme"]
+    variables = {"Acme": {"hours": "12"}, "CACME002": {"hours": "6"}}
+    template = "Hi {client} in {channel}, {account_manager} will reply within {hours}h"
+    assert main.render_broadcast(template, main.broadcast_variables("CACME001", acme, variables)) == \
+        "Hi Acme in <#CACME001>, Sam will reply within 12h"
+    assert main.render_broadcast(template, main.broadcast_variables("CACME002", acme, variables)) == \
+        "Hi Acme in <#CACME002>, Sam will reply within 6h"
+    with pytest.raises(KeyError, match="account_manager"):
+        main.render_broadcast(template, main.broadcast_variables("CBETA001", config.client_by_name["Beta"]))
+
+def test_a_missing_value_anywhere_plans_nothing(config):
+    messages, errors = main.plan_broadcast("{account_manager} says hi", ["tag:weekly"])
+    assert [channel_id for channel_id, _, _ in messages] == ["CACME001", "CACME002"]
+    assert errors == ["CBETA001: no value for {account_manager}"]
+
+def test_endpoint_queues_the_posts_and_returns_202(config, slack, monkeypatch, wait_for):
+    monkeypatch.setattr(main, "BROADCAST_TOKEN", "secret")
+    client = main.app.test_client()
+    headers = {"Authorization": "Bearer secret"}
+
+    response = client.post("/n8n/broadcast", headers=headers, json={"text": "Hi {client}", "targets": ["tag:weekly"]})
+    assert response.status_code == 202
+    assert response.get_json()["channels"] == 3 and response.get_json()["broadcast_id"]
+    assert wait_for(lambda: len(slack.calls) == 3)
+    assert sorted((kwargs["channel"], kwargs["text"]) for _, kwargs in slack.calls) == [
+        ("CACME001", "Hi Acme"), ("CACME002", "Hi Acme"), ("CBETA001", "Hi Beta")]
+
+    preview = client.post("/n8n/broadcast", headers=headers,
+                          json={"text": "Hi {client}", "targets": ["Gamma"], "dry_run": True})
+    assert preview.status_code == 200 and preview.get_json()["deliveries"][0]["text"] == "Hi Gamma"
+    assert client.post("/n8n/broadcast", json={"text": "Hi", "targets": ["all"]}).status_code == 401
+    assert len(slack.calls) == 3
+
+def test_endpoint_is_503_when_the_queue_is_full(config, slack, monkeypatch):
+    monkeypatch.setattr(main, "BROADCAST_TOKEN", "secret")
+    monkeypatch.setattr(main.message_queue, "submit", lambda key, func, *args, timeout=None: False)
+    response = main.app.test_client().post("/n8n/broadcast", headers={"Authorization": "Bearer secret"},
+                                           json={"text": "Hi", "targets": ["all"]})
+    assert response.status_code == 503
+    assert slack.calls == []
@@ -0,0 +1,75 @@
+import time
+
+import main
+
+def client_message(text, ts, **fields):
+    return {"user": "UCLIENT", "text": text, "ts": ts, "channel": "C9", **fields}
+
+def test_classification_time_excludes_the_debounce_window(monkeypatch):
+    observed = []
+    monkeypatch.setattr(main.metrics, "observe", lambda name, seconds, **labels: observed.append((name, seconds)))
+    burst_started = time.perf_counter() - 2.0
+    main.triage_message(client_message("how do i see the report?", "1700000300.000100"), burst_started)
+    classification = [seconds for name, seconds in observed if name == "pip_classification_seconds"]
+    assert len(classification) == 1 and classification[0] < 1.0
+
+def test_full_queue_is_offered_the_burst_again_without_blocking(monkeypatch, wait_for):
+    monkeypatch.setattr(main, "MESSAGE_ENQUEUE_TIMEOUT_SECONDS", 5)
+    monkeypatch.setattr(main, "BURST_RESUBMIT_SECONDS", 0.01)
+    timeouts = []
+
+    def submit(key, func, *args, timeout=None):
+        timeouts.append(timeout)
+        return len(timeouts) == 3
+
+    monkeypatch.setattr(main.message_queue, "submit", submit)
+    main.handle_burst([client_message("how do i see the report?", "1700000301.000100")], time.perf_counter())
+    assert wait_for(lambda: len(timeouts) == 3)
+    time.sleep(0.05)
+    assert timeouts == [0, 0, 0]
+
+def test_messages_inside_the_window_flush_once_in_order(wait_for):
+    flushed = []
+    bursts = main.BurstCoalescer(0.05, 1.0, lambda messages, received_at, bodies: flushed.append((messages, bodies)))
+    first = client_message("hey", "1700000310.000100")
+    second = client_message("how do i see the report", "1700000311.000100")
+    other = client_message("thanks", "1700000312.000100", user="UOTHER")
+    bursts.add(main.burst_key(first), first, 0, {"event_id": "Ev1"})
+    bursts.add(main.burst_key(other), other, 0)
+    bursts.add(main.burst_key(second), second, 0, {"event_id": "Ev2"})
+
+    assert wait_for(lambda: len(flushed) == 2)
+    assert ([first, second], [{"event_id": "Ev1"}, {"event_id": "Ev2"}]) in flushed
+    assert ([other], []) in flushed
+    assert bursts.pending() == 0
+
+def test_a_burst_flushes_at_max_wait_even_while_messages_keep_coming(wait_for):
+    flushed = []
+    bursts = main.BurstCoalescer(0.1, 0.15, lambda messages, received_at, bodies: flushed.append(messages))
+    started = time.monotonic()
+    for index in range(6):
+        message = client_message(f"part {index}", f"1700000320.00010{index}")
+        bursts.add(main.burst_key(message), message, 0)
+        time.sleep(0.04)
+    assert wait_for(lambda: flushed)
+    assert 1 < len(flushed[0]) < 6
+    assert time.monotonic() - started < 1
+
+def test_merge_burst_keeps_the_first_message_and_joins_every_text():
+    messages = [client_message("hey", "1.0"), client_message("", "2.0"), client_message("how do i see the report", "3.0")]
+    merged = main.merge_burst(messages)
+    assert merged["ts"] == "1.0"
+    assert merged["text"] == "hey\nhow do i see the report"
+    assert merged["burst_texts"] == ["hey", "", "how do i see the report"]
+    assert main.merge_burst(messages[:1]) == messages[0]
+
+def test_a_question_later_in_the_burst_is_found_from_its_own_start():
+    # "how do i" only counts as a question starter at the start of a message
+    merged = main.merge_burst([client_message("hey team", "1.0"), client_message("how do i log in", "2.0")])
+    assert not main.classify_message(merged["text"])["needs_response"]
+    decision, _ = main.triage_message(merged, time.perf_counter())
+    assert decision["needs_response"]
+
+def test_chatter_bursts_are_not_replied_to():
+    merged = main.merge_burst([client_message("ok", "1.0"), client_message("thanks", "2.0")])
+    assert main.triage_message(merged, time.perf_counter()) is None
@@ -0,0 +1,44 @@
+import main
+
+def serve_pages(slack, pages):
+    pages = iter(pages)
+    slack.responses["conversations.members"] = lambda **kwargs: next(pages)
+
+def test_members_are_paged_once_then_served_from_the_cache(slack):
+    team_member = next(iter(main.get_config().internal_team_ids))
+    serve_pages(slack, [
+        {"ok": True, "members": ["UCLIENT1", team_member], "response_metadata": {"next_cursor": "next"}},
+        {"ok": True, "members": ["UCLIENT2", "UCLIENT1"], "response_metadata": {"next_cursor": ""}},
+    ])
+    assert main.get_welcome_mentions("CCM1") == "<@UCLIENT1> <@UCLIENT2>"
+    assert main.get_welcome_mentions("CCM1") == "<@UCLIENT1> <@UCLIENT2>"
+    assert [kwargs["cursor"] for _, kwargs in slack.calls] == [None, "next"]
+
+def test_join_and_leave_events_update_the_cached_list(slack):
+    serve_pages(slack, [{"ok": True, "members": ["UCLIENT1", "UCLIENT2"]}])
+    main.get_channel_members("CCM2")
+    main.handle_member_joined({"channel": "CCM2", "user": "UCLIENT3"})
+    main.handle_member_left({"channel": "CCM2", "user": "UCLIENT1"})
+    # Channels that were never fetched are not cached from events alone
+    main.handle_member_joined({"channel": "CCM3", "user": "UCLIENT3"})
+    assert main.get_channel_members("CCM2") == ["UCLIENT2", "UCLIENT3"]
+    assert main.cached_channel_members("CCM3") is None
+    assert len(slack.calls) == 1
+
+def test_entries_expire_and_are_evicted(slack, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(main.time, "time", lambda: now[0])
+    monkeypatch.setattr(main, "CHANNEL_MEMBER_CACHE_MAX", 2)
+    monkeypatch.setattr(main, "channel_members", main.OrderedDict())
+    for channel_id in ["CCM4", "CCM5", "CCM6"]:
+        main.store_channel_members(channel_id, {"UCLIENT1": None})
+    assert main.cached_channel_members("CCM4") is None
+    assert main.cached_channel_members("CCM6") == ["UCLIENT1"]
+
+    now[0] += main.CHANNEL_MEMBER_TTL_SECONDS
+    assert main.cached_channel_members("CCM6") is None
+
+def test_a_failed_lookup_falls_back_to_a_plain_welcome(slack, api_error):
+    slack.failures["conversations.members"] = [api_error(400, "channel_not_found")]
+    assert main.get_welcome_mentions("CCM7") == "Welcome"
+    assert main.cached_channel_members("CCM7") is None
@@ -0,0 +1,83 @@
+import random
+
+import main
+from legacy_classifier import legacy_classify
+
+EDGE_CASES = [
+    "<https://docs.google.com/spreadsheets/d/1/campaign-report|this sheet>",
+    "see <https://example.com/spam-folder-help>",
+    "<@U04Q9SG853P> ok??",
+    "How do I see the REPORT?",
+    "how  do i see the report?",
+    "  thanks  ",
+    "ok!!!!!!!",
+    "İİİİİ?",
+    "yes",
+    "",
+]
+
+def sample_texts(count, seed=3):
+    """Texts built from every table the classifier compiles, plus edge cases"""
+    rng = random.Random(seed)
+    phrases = (
+        [pattern for faq in main.FAQ_DATABASE for pattern in faq["question_patterns"]]
+        + [keyword for config in main.QUESTION_ROUTING.values() for keyword in config["keywords"]]
+        + main.MEETING_KEYWORDS + main.CONCERN_WORDS + main.REQUEST_PHRASES + main.SHORT_ACKS
+    )
+    texts = list(EDGE_CASES)
+    for _ in range(count):
+        words = [rng.choice(phrases) for _ in range(rng.randint(1, 3))]
+        if rng.random() < 0.3:
+            words.insert(0, rng.choice(main.QUESTION_STARTERS))
+        text = " ".join(words) + rng.choice(["", "?", "!", " please"])
+        texts.append(text.upper() if rng.random() < 0.1 else text)
+    return texts
+
+def test_compiled_classifier_matches_the_original_keyword_scans():
+    classifier = main.get_classifier()
+    for text in sample_texts(2000):
+        assert classifier.classify(text) == legacy_classify(text), text
+
+def test_normalized_variants_share_one_cached_decision(monkeypatch):
+    monkeypatch.setattr(main, "DECISION_CACHE_MAX", 100)
+    config = main.PipConfig(main.builtin_tables())
+    variants = ["Any update ?", "any update?", "  any update ??\n", "ANY UPDATE?"]
+    keys = {config.classifier.cache_key(text) for text in variants}
+    assert len(keys) == 1
+
+    first = main.classify_message(variants[0], config)
+    for text in variants[1:]:
+        assert main.classify_message(text, config) == first
+    assert len(config._decisions) == 1
+
+def test_cache_key_collapses_whitespace_casefolds_and_strips_trailing_punctuation():
+    classifier = main.get_classifier()
+    assert classifier.cache_key("  How   DO i\tsee the Report?!  ") == (True, "how do i see the report")
+    assert classifier.cache_key("thanks!!!") == (False, "thanks")
+    assert classifier.cache_key("Straße :)") == (False, "strasse")
+
+def test_texts_sharing_a_cache_key_get_the_same_decision(monkeypatch):
+    monkeypatch.setattr(main, "DECISION_CACHE_MAX", 0)
+    config = main.get_config()
+    rng = random.Random(5)
+    spacing = ["", " ", "  ", "\n", " \t "]
+    punctuation = ["?", "??", "!", "...", "!?", "'", "-", ":)"]
+    by_key = {}
+    for text in sample_texts(300):
+        for _ in range(4):
+            words = text.split(" ")
+            variant = rng.choice(spacing).join(words) if len(words) > 1 else text
+            variant = rng.choice(spacing) + variant + rng.choice(spacing) + rng.choice(punctuation) + rng.choice(spacing)
+            variant = variant.upper() if rng.random() < 0.2 else variant
+            by_key.setdefault(config.classifier.cache_key(variant), []).append(variant)
+
+    shared = [texts for texts in by_key.values() if len(texts) > 1]
+    assert shared
+    for texts in shared:
+        decisions = [main.classify_message(text, config) for text in texts]
+        assert all(decision == decisions[0] for decision in decisions), texts
+
+def test_acks_with_a_question_mark_still_need_a_response():
+    config = main.PipConfig(main.builtin_tables())
+    assert main.classify_message("ok!!", config)["needs_response"] is False
+    assert main.classify_message("ok?", config)["needs_response"] is True
@@ -0,0 +1,53 @@
+import io
+import json
+import zipfile
+
+import classify_export
+import main
+
+def export_zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in files.items():
+            archive.writestr(name, json.dumps(content))
+    return zipfile.ZipFile(buffer)
+
+def record(text, user="UCLIENT", **fields):
+    return classify_export._message_record({"text": text, "user": user, "ts": "1.0", **fields}, "CEXPORT1")
+
+def test_export_folders_map_to_channel_ids():
+    archive = export_zip({
+        "channels.json": [{"id": "C0000ACME", "name": "acme-support"}],
+        "groups.json": [{"id": "G0000PRIV", "name": "private-chat"}],
+        "acme-support/2024-01-02.json": [
+            {"type": "message", "user": "U1", "text": "second day", "ts": "2.0"}],
+        "acme-support/2024-01-01.json": [
+            {"type": "message", "user": "U1", "text": "first day", "ts": "1.0"},
+            {"type": "channel_join", "user": "U2", "ts": "1.5"}],
+        "private-chat/2024-01-01.json": [{"type": "message", "user": "U3", "text": "hidden", "ts": "3.0"}],
+        "unlisted/2024-01-01.json": [{"type": "message", "user": "U4", "text": "no listing", "ts": "4.0"}],
+        "users.json": [{"id": "U1"}],
+    })
+    records = list(classify_export.read_slack_export(archive.namelist(), archive.read))
+    assert [(r["channel"], r["text"]) for r in records] == [
+        ("C0000ACME", "first day"), ("C0000ACME", "second day"),
+        ("G0000PRIV", "hidden"), ("unlisted", "no listing")]
+
+def test_records_get_the_outcome_handle_message_would_reach():
+    team_member = next(iter(main.get_config().internal_team_ids))
+    outcomes = {
+        "bot": record("Deployed", bot_id="B1"),
+        "join": record("joined", subtype="channel_join"),
+        "team": record("how do i see the report?", user=team_member),
+        "ack": record("thanks"),
+        "faq": record("how do i see the report?"),
+        "meeting": record("can we schedule a call this week?"),
+        "escalation": record("our account was suspended, please fix this asap"),
+    }
+    decided = {name: classify_export.classify_record(r)["outcome"] for name, r in outcomes.items()}
+    assert decided == {"bot": "skipped", "join": "skipped", "team": "team_member", "ack": "ignored_ack",
+                       "faq": "faq", "meeting": "meeting", "escalation": "escalation"}
+
+    faq = classify_export.classify_record(outcomes["faq"])
+    assert faq["faq_category"] == "campaigns" and faq["faq_score"] is None
+    assert classify_export.classify_record(outcomes["faq"], exact_only=True)["outcome"] == "faq"
@@ -0,0 +1,55 @@
+import pytest
+
+import main
+
+CLIENTS = [
+    {"name": "Acme", "channels": ["CACME001"], "team_id": "TACME", "calendly_link": "https://calendly.com/acme",
+     "default_handoff": "rish", "routing_owners": {"campaigns": "suraj"},
+     "faq_database": [{"question_patterns": ["how do i see the report"], "answer": "Acme reports live in Looker",
+                       "category": "campaigns"}]},
+    {"name": "Beta", "channels": ["CBETA001"]},
+]
+
+def config_with(clients):
+    return main.PipConfig(dict(main.builtin_tables(), clients=clients))
+
+def test_channels_then_workspaces_pick_the_client():
+    config = config_with(CLIENTS)
+    assert config.client_for("CACME001").name == "Acme"
+    assert config.client_for("CSHARED1", "TACME").name == "Acme"
+    # A listed channel wins over its workspace
+    assert config.client_for("CBETA001", "TACME").name == "Beta"
+    assert config.client_for("CSHARED1", "TOTHER") is None
+
+def test_client_owners_and_faqs_override_the_shared_ones():
+    config = config_with(CLIENTS)
+    acme, beta = config.client_by_name["Acme"], config.client_by_name["Beta"]
+    team = config.team_members
+
+    shared = main.classify_message("how do i see the report?", config)
+    own = main.classify_message("how do i see the report?", config, acme)
+    assert own["faq"]["answer"] == "Acme reports live in Looker" != shared["faq"]["answer"]
+    assert own["team_member"] == team["suraj"] and shared["team_member"] == team["hassan"]
+    # Categories without an override keep the shared owner; unrouted questions go to the client's handoff
+    assert main.classify_message("can you check our targeting?", config, acme)["team_member"] == team["sahil"]
+    assert main.classify_message("can you call me back?", config, acme)["team_member"] == team["rish"]
+    assert main.classify_message("can you call me back?", config)["team_member"] == team["hassan"]
+
+    # Clients without overrides share the default matcher and its cached decisions
+    assert config.matcher_for(beta)[0] is config.classifier
+    assert main.classify_message("how do i see the report?", config, beta) == shared
+
+def test_client_links_fill_the_onboarding_text():
+    acme = config_with(CLIENTS).client_by_name["Acme"]
+    assert "<https://calendly.com/acme|book a call>" in main.onboard_main_text("Welcome", acme)
+    assert f"<{main.CALENDLY_LINK}|book a call>" in main.onboard_main_text("Welcome")
+
+@pytest.mark.parametrize("clients, error", [
+    ([{"channels": ["C1"]}], "needs a name"),
+    ([{"name": "Acme"}, {"name": "Acme"}], "listed twice"),
+    ([{"name": "Acme", "channels": ["C1"]}, {"name": "Beta", "channels": ["C1"]}], "more than one client"),
+    ([{"name": "Acme", "routing_owners": {"billing": "rish"}}], "unknown categories"),
+])
+def test_conflicting_client_entries_are_rejected(clients, error):
+    with pytest.raises(ValueError, match=error):
+        main.validate_tables(dict(main.builtin_tables(), clients=clients))
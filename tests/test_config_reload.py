@@ -0,0 +1,68 @@
+import json
+import os
+
+import pytest
+
+import main
+
+@pytest.fixture
+def config_path(tmp_path, monkeypatch):
+    """Point the reloader at a scratch path, starting from the built-in snapshot"""
+    path = tmp_path / "pip.json"
+    monkeypatch.setattr(main, "PIP_CONFIG_PATH", str(path))
+    monkeypatch.setattr(main, "_config", main.PipConfig(main.builtin_tables()))
+    monkeypatch.setattr(main, "_config_signature_seen", None)
+    # Reloads are driven by the test, not by a watcher thread
+    monkeypatch.setattr(main, "_config_watcher_pid", os.getpid())
+    return path
+
+def write(path, tables, bump=0):
+    path.write_text(json.dumps(tables))
+    # Rewrites within one mtime tick still have to look changed
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + bump))
+
+def test_a_changed_file_swaps_in_a_new_snapshot(config_path):
+    write(config_path, {
+        "team_members": dict(main.builtin_tables()["team_members"], Robin="UROBIN01"),
+        "faq_database": [{"question_patterns": ["where is my parcel"], "answer": "It ships on Fridays", "category": "shipping"}],
+    })
+    before = main.get_config()
+    assert main.reload_config() is True
+    after = main.get_config()
+    assert after.generation == before.generation + 1 and after.source == str(config_path)
+    assert main.is_internal_team_member("UROBIN01")
+    assert main.classify_message("where is my parcel?")["faq"]["answer"] == "It ships on Fridays"
+    # Snapshots are never changed in place
+    assert "UROBIN01" not in before.internal_team_ids
+
+    assert main.reload_config() is False
+    assert main.get_config() is after
+
+def test_a_broken_file_keeps_the_current_tables_until_it_is_fixed(config_path):
+    write(config_path, {"short_acks": ["ok", "cheers"]})
+    assert main.reload_config() is True
+    loaded = main.get_config()
+
+    write(config_path, {"short_acks": "cheers"}, bump=1000)
+    assert main.reload_config() is False
+    config_path.write_text("{not json")
+    assert main.reload_config() is False
+    assert main.get_config() is loaded
+
+    write(config_path, {"short_acks": ["cheers"]}, bump=2000)
+    assert main.reload_config() is True
+    assert main.get_config().short_acks == ["cheers"]
+
+def test_a_directory_is_merged_in_file_name_order(tmp_path, monkeypatch, config_path):
+    directory = tmp_path / "conf.d"
+    directory.mkdir()
+    write(directory / "10-acks.json", {"short_acks": ["first"], "meeting_keywords": ["huddle"]})
+    write(directory / "20-acks.json", {"short_acks": ["second"]})
+    (directory / "notes.txt").write_text("ignored")
+    monkeypatch.setattr(main, "PIP_CONFIG_PATH", str(directory))
+
+    assert main.reload_config() is True
+    config = main.get_config()
+    assert config.short_acks == ["second"] and config.meeting_keywords == ["huddle"]
+    assert config.question_starters == main.QUESTION_STARTERS
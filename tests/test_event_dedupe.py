@@ -0,0 +1,86 @@
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+from slack_sdk.signature import SignatureVerifier
+
+import main
+
+def signed(body, secret="secret"):
+    timestamp = str(int(time.time()))
+    signature = "v0=" + hmac.new(secret.encode(), f"v0:{timestamp}:{body}".encode(), hashlib.sha256).hexdigest()
+    return {"X-Slack-Request-Timestamp": timestamp, "X-Slack-Signature": signature}
+
+def event_body(event_id, **event):
+    return json.dumps({"type": "event_callback", "event_id": event_id, "event": {"type": "message", **event}})
+
+@pytest.fixture
+def verifier(monkeypatch):
+    monkeypatch.setattr(main, "signature_verifier", SignatureVerifier("secret"))
+
+def test_event_counts_as_seen_only_after_it_is_accepted(verifier):
+    body = event_body("EvAccepted", client_msg_id="m-1", text="hi")
+    assert not main.is_duplicate_event(body, signed(body))
+    # A retry that arrives before the first delivery was queued still gets through
+    assert not main.is_duplicate_event(body, signed(body))
+
+    main.mark_event_seen(json.loads(body))
+    assert main.is_duplicate_event(body, signed(body))
+
+    # The same message in a different event is not a duplicate
+    other = event_body("EvOther", client_msg_id="m-1", text="hi")
+    assert not main.is_duplicate_event(other, signed(other))
+
+def test_badly_signed_retry_is_never_dropped(verifier):
+    body = event_body("EvForged", text="hi")
+    main.mark_event_seen(json.loads(body))
+    assert not main.is_duplicate_event(body, signed(body, secret="wrong"))
+
+def test_dropped_message_is_not_marked_seen(verifier, monkeypatch):
+    monkeypatch.setattr(main, "BURST_WINDOW_SECONDS", 0)
+    monkeypatch.setattr(main.message_queue, "submit", lambda *args, **kwargs: False)
+    body = event_body("EvDropped", user="UCLIENT", text="how do I see the report?", ts="1.0", channel="C1")
+
+    main.handle_message(json.loads(body)["event"], json.loads(body))
+    assert not main.is_duplicate_event(body, signed(body))
+
+def test_unsigned_setup_never_writes_dedupe_rows(monkeypatch):
+    monkeypatch.setattr(main, "signature_verifier", None)
+    before = len(main.seen_events)
+    body = event_body("EvUnsigned", text="hi")
+    assert not main.is_duplicate_event(body, {})
+    main.mark_event_seen(json.loads(body))
+    assert len(main.seen_events) == before
+    assert not main.is_duplicate_event(body, {})
+
+def test_burst_marks_its_events_seen_only_once_queued(verifier, monkeypatch):
+    monkeypatch.setattr(main, "MESSAGE_ENQUEUE_TIMEOUT_SECONDS", 0)
+    monkeypatch.setattr(main.message_queue, "submit", lambda *args, **kwargs: False)
+    body = event_body("EvBurstDropped", user="UCLIENT", text="how do I see the report?", ts="2.0", channel="C1")
+    main.handle_burst([json.loads(body)["event"]], time.perf_counter(), [json.loads(body)])
+    assert not main.is_duplicate_event(body, signed(body))
+
+    # The queued job marks the events seen before it replies
+    seen_when_replying = []
+    monkeypatch.setattr(main, "process_client_message",
+                        lambda *args: seen_when_replying.append(main.is_duplicate_event(body, signed(body))))
+    monkeypatch.setattr(main.message_queue, "submit", lambda key, func, *args, **kwargs: func(*args) or True)
+    main.handle_burst([json.loads(body)["event"]], time.perf_counter(), [json.loads(body)])
+    assert seen_when_replying == [True]
+
+def test_retry_of_a_waiting_message_is_not_added_to_its_burst():
+    flushed = []
+    bursts = main.BurstCoalescer(60, 60, lambda messages, received_at, bodies: flushed.append((messages, bodies)))
+    message = {"user": "UCLIENT", "text": "hi", "ts": "3.0", "channel": "C1"}
+    bursts.add(main.burst_key(message), message, 0, {"event_id": "EvFirst"})
+    bursts.add(main.burst_key(message), dict(message), 0, {"event_id": "EvFirst"})
+    bursts.flush_all()
+    assert flushed == [([message], [{"event_id": "EvFirst"}])]
+
+def test_member_events_are_marked_seen(verifier):
+    body = json.dumps({"type": "event_callback", "event_id": "EvJoined",
+                       "event": {"type": "member_joined_channel", "channel": "C1", "user": "U1"}})
+    main.handle_member_joined(json.loads(body)["event"], json.loads(body))
+    assert main.is_duplicate_event(body, signed(body))
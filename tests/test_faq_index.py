@@ -0,0 +1,56 @@
+import math
+
+import main
+
+FAQS = [
+    {"question_patterns": ["how do i see the report", "where is the campaign report"], "answer": "reports", "category": "campaigns"},
+    {"question_patterns": ["how do i reset my password"], "answer": "password", "category": "account"},
+    {"question_patterns": ["when will my invoice arrive"], "answer": "billing", "category": "billing"},
+]
+
+def dense_scores(index, message_text):
+    """Cosine similarity against every pattern, computed directly from the n-gram counts"""
+    def vector(text):
+        return {gram: (1 + math.log(count)) * index.idf.get(gram, index.unknown_idf)
+                for gram, count in main._char_ngrams(main.normalize_for_search(text)).items()}
+
+    query = vector(message_text)
+    query_norm = math.sqrt(sum(weight * weight for weight in query.values()))
+    scores = []
+    for pattern in index.patterns:
+        row = vector(pattern)
+        row_norm = math.sqrt(sum(weight * weight for weight in row.values()))
+        scores.append(sum(weight * row.get(gram, 0) for gram, weight in query.items()) / (query_norm * row_norm))
+    return scores
+
+def test_typos_and_rewordings_find_the_right_entry():
+    index = main.FaqIndex(FAQS)
+    faq, score, pattern = index.search("How do I see the REPORT?", top_k=1)[0]
+    assert (faq["answer"], pattern) == ("reports", "how do i see the report") and score > 0.99
+    assert index.search("how do i reset my pasword??", top_k=1, threshold=main.FAQ_MATCH_THRESHOLD)[0][0]["category"] == "account"
+    assert index.search("invoice arrival date", top_k=1)[0][0]["category"] == "billing"
+    assert index.search("the weather is lovely today", threshold=main.FAQ_MATCH_THRESHOLD) == []
+    assert index.search("?!") == []
+
+def test_each_entry_is_reported_once_with_its_best_pattern():
+    index = main.FaqIndex(FAQS)
+    results = index.search("where do i see the campaign report", top_k=3)
+    assert [faq["answer"] for faq, _, _ in results][0] == "reports"
+    assert len({faq["answer"] for faq, _, _ in results}) == len(results)
+    scores = [score for _, score, _ in results]
+    assert scores == sorted(scores, reverse=True)
+
+def test_sparse_scores_match_a_dense_cosine():
+    index = main.FaqIndex(FAQS)
+    for text in ["how do i see the report", "reset password please", "my invoice", "campaign"]:
+        expected = dense_scores(index, text)
+        best = max(range(len(expected)), key=expected.__getitem__)
+        faq, score, pattern = index.search(text, top_k=1)[0]
+        assert pattern == index.patterns[best]
+        assert math.isclose(score, expected[best], rel_tol=1e-4)
+
+def test_fuzzy_matches_fill_in_when_no_pattern_matches_exactly():
+    config = main.PipConfig(main.builtin_tables())
+    decision = main.classify_message("how can i see reportng?", config)
+    assert decision["faq"]["category"] == "campaigns"
+    assert main.FAQ_MATCH_THRESHOLD <= decision["faq"]["score"] < 1
@@ -0,0 +1,87 @@
+import json
+import urllib.error
+import urllib.request
+
+from slack_sdk.signature import SignatureVerifier
+
+import loadtest
+
+TEAM = {"UTEAM001"}
+
+def post(url, payload=None):
+    request = urllib.request.Request(url, data=json.dumps(payload or {}).encode(),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers)
+
+def test_signatures_are_the_ones_slack_would_send():
+    headers = loadtest.sign("secret", '{"type": "event_callback"}')
+    verifier = SignatureVerifier("secret")
+    assert verifier.is_valid('{"type": "event_callback"}', headers["X-Slack-Request-Timestamp"], headers["X-Slack-Signature"])
+    assert not verifier.is_valid("{}", headers["X-Slack-Request-Timestamp"], headers["X-Slack-Signature"])
+
+def test_mock_api_answers_and_counts_calls():
+    mock = loadtest.start_mock(0, 0, TEAM)
+    try:
+        assert post(mock.base_url + "api/auth.test")[1]["user_id"] == "U0PIP"
+        status, body = post(mock.base_url + "api/chat.postMessage", {"channel": "C0LOAD0001", "text": "hi"})
+        assert status == 200 and body["channel"] == "C0LOAD0001" and body["ts"]
+        assert "UTEAM001" in post(mock.base_url + "api/conversations.members")[1]["members"]
+        assert mock.take_calls() == {("auth.test", "ok"): 1, ("chat.postMessage", "ok"): 1, ("conversations.members", "ok"): 1}
+        assert mock.take_calls() == {}
+
+        mock.rate_429 = 1.0
+        status, headers = post(mock.base_url + "api/chat.postMessage", {"channel": "C0LOAD0001"})
+        assert status == 429 and headers["Retry-After"] == "1"
+        # auth.test is never rate limited, so servers can always start
+        assert post(mock.base_url + "api/auth.test")[0] == 200
+        assert mock.take_calls() == {("chat.postMessage", "429"): 1, ("auth.test", "ok"): 1}
+    finally:
+        mock.shutdown()
+
+def test_request_mix_threads_team_replies_under_client_questions():
+    mix = loadtest.RequestMix(seed=1, team_users=TEAM, command_share=0.1, team_share=0.3, response_url="http://mock/")
+    questions, kinds = set(), []
+    for _ in range(300):
+        kind, path, body, content_type = mix.next()
+        kinds.append(kind)
+        if kind.startswith("command:"):
+            assert path == "/slack/commands" and content_type == "application/x-www-form-urlencoded"
+            assert "response_url=http%3A%2F%2Fmock%2Fcommands%2F" in body
+            continue
+        event = json.loads(body)["event"]
+        assert path == "/slack/events" and content_type == "application/json"
+        if kind == "event:question":
+            questions.add((event["channel"], event["ts"]))
+        elif kind == "event:team":
+            assert event["user"] in TEAM and (event["channel"], event["thread_ts"]) in questions
+    assert {"event:question", "event:chatter", "event:team", "command:new-campaign", "command:pip-onboard"} <= set(kinds)
+
+def test_summary_counts_non_200s_as_errors_and_reports_percentiles():
+    results = [("event:question", 200, seconds / 1000) for seconds in range(1, 101)]
+    results += [("event:chatter", 200, 0.005), ("event:chatter", "timeout", 10.0)]
+    rows = loadtest.summarize(results, elapsed=2.0)
+    assert rows["event:question"] == {"requests": 100, "per_sec": 50.0, "error_rate": 0.0,
+                                      "p50_ms": 51.0, "p95_ms": 96.0, "p99_ms": 100.0, "max_ms": 100.0}
+    assert rows["event:chatter"]["error_rate"] == 0.5 and rows["event:chatter"]["max_ms"] == 10000.0
+    assert rows["all"]["requests"] == 102
+
+def test_a_short_run_against_gunicorn_gets_replies_to_the_mock(tmp_path, monkeypatch):
+    # Replies go out as soon as a question is handled, not after a burst window
+    monkeypatch.setenv("BURST_WINDOW_SECONDS", "0")
+    mock = loadtest.start_mock(0, 0, TEAM)
+    process, target, log_path = loadtest.start_server("gunicorn:1x4", "secret", mock, str(tmp_path))
+    try:
+        assert loadtest.wait_healthy(target, process), open(log_path).read()
+        args = type("Args", (), dict(seed=3, command_share=0.0, team_share=0.0, rate=20, duration=1,
+                                     max_connections=10, timeout=10, drain_seconds=1))
+        report = loadtest.run_config("gunicorn:1x4", target, "secret", mock, args, TEAM)
+    finally:
+        loadtest.stop_server(process)
+        mock.shutdown()
+    assert report["statuses"] == {"200": 20}
+    assert report["by_kind"]["all"]["error_rate"] == 0.0
+    assert report["slack_api_by_method"].get("chat.postMessage:ok", 0) == report["by_kind"]["event:question"]["requests"]
@@ -0,0 +1,69 @@
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+
+import logs
+import main
+
+SCRIPT = """
+import logging, threading
+import main
+
+main.log_event("Starting", level=logging.INFO, workers=2)
+
+def handle():
+    main.correlation_id.set("C1:1700000000.000100")
+    main.log_event("Handling message", level=logging.INFO, user="U1")
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        main.log_event("Error handling message", level=logging.ERROR, exc_info=True)
+    main.log_event("Ignoring message from team member", level=logging.INFO, sampled=True)
+
+thread = threading.Thread(target=handle, name="worker-1")
+thread.start()
+thread.join()
+"""
+
+def run_logging(tmp_path, **env):
+    """stdout of SCRIPT in a fresh process; the queued lines are written out at exit"""
+    env = dict(os.environ, STATE_DB_PATH=str(tmp_path / "state.db"), METRICS_DIR=str(tmp_path / "metrics"),
+               LOG_LEVEL="INFO", **env)
+    return subprocess.run([sys.executable, "-c", SCRIPT], cwd=os.path.dirname(os.path.abspath(main.__file__)), env=env, check=True,
+                          capture_output=True, text=True, timeout=60).stdout
+
+def test_json_lines_carry_fields_and_the_callers_correlation_id(tmp_path):
+    lines = [json.loads(line) for line in run_logging(tmp_path, LOG_SAMPLE_RATE="0").splitlines()]
+    assert [line["msg"] for line in lines] == ["Starting", "Handling message", "Error handling message"]
+
+    starting, handling, error = lines
+    assert starting["level"] == "INFO" and starting["workers"] == 2 and "cid" not in starting
+    assert handling["cid"] == "C1:1700000000.000100" and handling["user"] == "U1"
+    # Formatted on the listener thread, but named after the thread that logged it
+    assert handling["thread"] == "worker-1" and handling["pid"] == starting["pid"]
+    assert error["level"] == "ERROR" and "ValueError: boom" in error["exc"]
+
+def test_sampled_lines_say_how_they_were_sampled(tmp_path):
+    lines = [json.loads(line) for line in run_logging(tmp_path, LOG_SAMPLE_RATE="1").splitlines()]
+    assert lines[-1]["msg"] == "Ignoring message from team member" and lines[-1]["sample_rate"] == 1.0
+
+def test_text_format_for_local_runs(tmp_path):
+    lines = run_logging(tmp_path, LOG_FORMAT="text", LOG_SAMPLE_RATE="0").splitlines()
+    assert lines[0].endswith("INFO [-] Starting workers=2")
+    assert "INFO [C1:1700000000.000100] Handling message user=U1" in lines[1]
+    assert any(line == "ValueError: boom" for line in lines)
+
+def test_a_full_log_queue_drops_records_instead_of_blocking():
+    handler = logs.BackgroundQueueHandler(queue.Queue(maxsize=1))
+    before = logs.dropped_records()
+    for message in ["first", "second"]:
+        record = logging.LogRecord("pip", logging.INFO, __file__, 1, message, None, None)
+        record.fields = {}
+        handler.handle(record)
+    assert handler.queue.get_nowait().getMessage() == "first"
+    assert logs.dropped_records() == before + 1
+    counters = main.metrics.snapshot()["counters"]
+    assert ["pip_log_records_dropped_total", {}, before + 1] in counters
@@ -0,0 +1,69 @@
+import json
+import os
+import threading
+
+import main
+
+def make_registry(directory):
+    return main.MetricsRegistry(str(directory), main.LATENCY_BUCKETS, flush_seconds=3600)
+
+def test_shards_of_finished_threads_are_folded(tmp_path):
+    registry = make_registry(tmp_path)
+
+    def record():
+        registry.inc("pip_messages_total", outcome="faq")
+        registry.observe("pip_classification_seconds", 0.002)
+
+    for _ in range(100):
+        thread = threading.Thread(target=record)
+        thread.start()
+        thread.join()
+    record()
+
+    snapshot = registry.snapshot()
+    assert len(registry._shards) == 1
+    assert snapshot["counters"] == [["pip_messages_total", {"outcome": "faq"}, 101]]
+    assert sum(snapshot["histograms"][0][2][:-1]) == 101
+
+def test_label_values_are_escaped(tmp_path):
+    registry = make_registry(tmp_path)
+    registry.inc("pip_messages_total", outcome='say "hi"\\\nbye')
+    assert 'pip_messages_total{outcome="say \\"hi\\"\\\\\\nbye"} 1' in registry.render().splitlines()
+
+def test_stats_counts_added_from_many_threads_are_all_kept():
+    counts = main.StatsCounter()
+
+    def add():
+        for _ in range(20000):
+            counts.add(("decisions", "hit"))
+
+    threads = [threading.Thread(target=add) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counts.copy() == {("decisions", "hit"): 160000}
+
+def test_cache_counts_are_exported_from_a_copy(monkeypatch):
+    monkeypatch.setattr(main, "cache_stats", main.StatsCounter())
+    main.cache_stats.add(("decisions", "hit"), 3)
+    counters = [[labels, value] for name, labels, value in main.metrics.snapshot()["counters"]
+                if name == "pip_cache_requests_total"]
+    assert counters == [[{"cache": "decisions", "result": "hit"}, 3]]
+
+def test_a_reused_pid_does_not_replace_a_dead_workers_counts(tmp_path):
+    # A worker that died after counting 5 messages, whose pid now belongs to this process
+    dead = {"pid": os.getpid(), "started_at": 1.0, "written_at": main.time.time(),
+            "counters": [["pip_messages_total", {"outcome": "faq"}, 5]], "histograms": [], "gauges": []}
+    (tmp_path / f"metrics-{os.getpid()}-1000.json").write_text(json.dumps(dead))
+
+    registry = make_registry(tmp_path)
+    registry.inc("pip_messages_total", outcome="faq")
+    assert 'pip_messages_total{outcome="faq"} 6' in registry.render().splitlines()
+
+def test_exit_writes_a_final_snapshot(run_main, tmp_path):
+    run_main("""
+main.metrics.inc("pip_messages_total", outcome="faq")
+""", METRICS_FLUSH_SECONDS=3600)
+    snapshots = [json.loads(path.read_text()) for path in (tmp_path / "metrics").glob("*.json")]
+    assert [snapshot["counters"] for snapshot in snapshots] == [[["pip_messages_total", {"outcome": "faq"}, 1]]]
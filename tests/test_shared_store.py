@@ -0,0 +1,43 @@
+import main
+
+def make_store(path, **settings):
+    settings = {"ttl_seconds": 60, "max_entries": 1000, "local_cache_size": 100, **settings}
+    return main.SharedKeyStore(str(path), "test_keys", **settings)
+
+def test_a_key_is_claimed_once_across_connections(tmp_path):
+    # Two stores on one file stand in for two gunicorn workers
+    first, second = make_store(tmp_path / "state.db"), make_store(tmp_path / "state.db")
+    assert first.add("C1:1700000000.000100")
+    assert not second.add("C1:1700000000.000100")
+    assert "C1:1700000000.000100" in second
+    assert "C1:1700000000.000200" not in second
+
+def test_entries_expire_after_the_ttl(tmp_path, monkeypatch):
+    store = make_store(tmp_path / "state.db", ttl_seconds=10)
+    clock = [1000.0]
+    monkeypatch.setattr(main.time, "time", lambda: clock[0])
+    assert store.add("k")
+    clock[0] += 9
+    assert "k" in store and not store.add("k")
+    clock[0] += 20
+    assert "k" not in store
+    assert store.add("k")
+
+def test_eviction_trims_the_oldest_entries_past_max_entries(tmp_path, monkeypatch):
+    store = make_store(tmp_path / "state.db", max_entries=5, local_cache_size=1)
+    clock = [1000.0]
+    monkeypatch.setattr(main.time, "time", lambda: clock[0])
+    for index in range(8):
+        clock[0] += 1
+        store.add(f"k{index}")
+    store.evict()
+    assert len(store) == 5
+    assert "k0" not in store and "k2" not in store
+    assert "k3" in store and "k7" in store
+
+def test_without_the_database_a_worker_still_claims_a_key_only_once(tmp_path):
+    # A directory can't be opened as a database, so every write fails
+    store = make_store(tmp_path)
+    assert store.add("C1:1700000000.000100")
+    assert not store.add("C1:1700000000.000100")
+    assert store.add("C1:1700000000.000200")
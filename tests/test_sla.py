@@ -0,0 +1,18 @@
+import main
+
+def reply_to(text, ts):
+    message = {"user": "UCLIENT", "text": text, "ts": ts, "channel": "C7"}
+    decision = main.classify_message(text)
+    decision["client"] = None
+    main.process_client_message(message, decision, 0)
+
+def test_only_escalations_start_the_clock(slack, monkeypatch):
+    escalated = []
+    monkeypatch.setattr(main.sla_ledger, "escalated", lambda *args, **kwargs: escalated.append(args))
+
+    reply_to("how do i see the report?", "1700000200.000100")
+    reply_to("can we schedule a call?", "1700000201.000100")
+    assert escalated == []
+
+    reply_to("can you check the campaign numbers?", "1700000202.000100")
+    assert [args[5] for args in escalated] == ["escalation"]
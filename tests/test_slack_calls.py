@@ -0,0 +1,50 @@
+import pytest
+from slack_sdk.errors import SlackApiError
+
+import main
+
+def test_server_errors_and_dropped_connections_are_retried(slack, api_error):
+    slack.failures["chat.postMessage"] = [api_error(503), ConnectionError("reset"), api_error(500)]
+    assert main.slack_call("chat.postMessage", channel="C1", text="hi")["ok"]
+    assert slack.methods() == ["chat.postMessage"] * 4
+
+def test_client_errors_are_not_retried(slack, api_error):
+    slack.failures["chat.postMessage"] = [api_error(404, "channel_not_found")]
+    with pytest.raises(SlackApiError):
+        main.slack_call("chat.postMessage", channel="C1", text="hi")
+    assert slack.methods() == ["chat.postMessage"]
+
+def test_retries_stop_at_the_limit(slack, monkeypatch, api_error):
+    monkeypatch.setattr(main, "SLACK_MAX_RETRIES", 2)
+    slack.failures["chat.postMessage"] = [api_error(503) for _ in range(5)]
+    with pytest.raises(SlackApiError):
+        main.slack_call("chat.postMessage", channel="C1", text="hi")
+    assert len(slack.calls) == 3
+
+def test_best_effort_call_is_skipped_without_a_free_token(slack, monkeypatch):
+    monkeypatch.setattr(main, "SLACK_RATE_LIMITING", True)
+    bucket = main.TokenBucket(0.001, 1)
+    monkeypatch.setitem(main.tier_buckets, main.SLACK_METHOD_TIERS["reactions.add"], bucket)
+    assert main.slack_call("reactions.add", best_effort=True, channel="C1", timestamp="1.0", name="x")
+    assert main.slack_call("reactions.add", best_effort=True, channel="C1", timestamp="1.0", name="x") is None
+    assert slack.methods() == ["reactions.add"]
+
+def client_question():
+    message = {"user": "UCLIENT", "text": "can you check the campaign numbers?", "ts": "1700000100.000100", "channel": "C5"}
+    decision = main.classify_message(message["text"])
+    decision["client"] = None
+    return message, decision
+
+def test_reply_is_posted_before_any_reaction(slack):
+    message, decision = client_question()
+    main.process_client_message(message, decision, 0)
+    assert slack.methods()[0] == "chat.postMessage"
+    assert "reactions.add" in slack.methods()
+
+def test_failed_reply_raises_without_reacting(slack, api_error):
+    message, decision = client_question()
+    message["ts"] = "1700000101.000100"
+    slack.failures["chat.postMessage"] = [api_error(403, "not_in_channel")]
+    with pytest.raises(SlackApiError):
+        main.process_client_message(message, decision, 0)
+    assert slack.methods() == ["chat.postMessage"]
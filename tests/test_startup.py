@@ -0,0 +1,13 @@
+import main
+
+def test_importing_main_builds_nothing_that_needs_slack(run_main):
+    run_main("""
+assert main._handler is None
+assert main.STARTUP_METRICS["import_seconds"] > 0
+""")
+
+def test_startup_timings_are_exported_to_metrics(monkeypatch):
+    monkeypatch.setitem(main.STARTUP_METRICS, "warmup_seconds", 0.25)
+    lines = main.metrics.render().splitlines()
+    assert any(line.startswith("pip_startup_import_seconds{pid=") for line in lines)
+    assert any(line.startswith("pip_startup_warmup_seconds{pid=") and line.endswith(" 0.25") for line in lines)
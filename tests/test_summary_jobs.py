@@ -0,0 +1,55 @@
+import main
+
+def make_queue(tmp_path, post):
+    return main.SummaryJobQueue(str(tmp_path / "state.db"), post, workers=0, max_attempts=5,
+                                poll_seconds=1, ttl_seconds=3600)
+
+def failing_post(error):
+    def post(job, mark_progress):
+        raise error
+    return post
+
+def test_server_error_is_retried_later(tmp_path, api_error):
+    jobs = make_queue(tmp_path, failing_post(api_error(503)))
+    jobs.enqueue([("k1", "C1", "summary")])
+    jobs._process(jobs._lease())
+    assert jobs.status("k1")["status"] == "queued"
+    assert jobs.status("k1")["attempts"] == 1
+
+def test_client_error_fails_the_job(tmp_path, api_error):
+    jobs = make_queue(tmp_path, failing_post(api_error(404, "channel_not_found")))
+    jobs.enqueue([("k1", "C1", "summary")])
+    jobs._process(jobs._lease())
+    assert jobs.status("k1")["status"] == "failed"
+
+def test_each_chunk_renews_the_lease(tmp_path):
+    leases = []
+
+    def post(job, mark_progress):
+        for index in range(3):
+            mark_progress("1700000000.000001", index + 1)
+            leases.append(jobs._connection().execute("SELECT available_at FROM summary_jobs").fetchone()[0])
+
+    jobs = make_queue(tmp_path, post)
+    jobs.enqueue([("k1", "C1", "summary")])
+    jobs._process(jobs._lease())
+    assert leases == sorted(leases) and leases[0] < leases[-1]
+    assert jobs.status("k1")["status"] == "done"
+
+def test_a_worker_that_lost_its_lease_stops_posting(tmp_path):
+    posted = []
+
+    def post(job, mark_progress):
+        for index in range(job["chunks_posted"], 3):
+            posted.append((job["attempts"], index))
+            if job["attempts"] == 1 and index == 1:
+                # This post outlived the lease and another worker took the job over
+                jobs._update("k1", available_at=0)
+                jobs._process(jobs._lease())
+            mark_progress("1700000000.000001", index + 1)
+
+    jobs = make_queue(tmp_path, post)
+    jobs.enqueue([("k1", "C1", "summary")])
+    jobs._process(jobs._lease())
+    assert posted == [(1, 0), (1, 1), (2, 1), (2, 2)]
+    assert jobs.status("k1")["status"] == "done"
@@ -0,0 +1,46 @@
+import main
+
+def team_member():
+    return next(iter(main.get_config().internal_team_ids))
+
+def test_a_team_reply_event_answers_without_reading_the_thread(slack):
+    main.triage_message({"user": team_member(), "text": "on it", "channel": "CTT1", "ts": "20.1", "thread_ts": "20.0"})
+    assert main.has_team_replied_in_thread("CTT1", "20.0") is True
+    # Top-level team messages are not thread replies
+    main.triage_message({"user": team_member(), "text": "hello", "channel": "CTT1", "ts": "21.0"})
+    assert main.cached_team_reply("CTT1", "21.0") is None
+    assert "conversations.replies" not in slack.methods()
+
+def test_the_first_page_with_a_team_reply_is_indexed(slack):
+    pages = iter([
+        {"ok": True, "messages": [{"user": team_member(), "ts": "30.0"}, {"user": "UCLIENT", "ts": "30.1"}],
+         "response_metadata": {"next_cursor": "page2"}},
+        {"ok": True, "messages": [{"user": team_member(), "ts": "30.2"}]},
+    ])
+    slack.responses["conversations.replies"] = lambda **kwargs: next(pages)
+    # The parent's author doesn't count, so the second page is read
+    assert main.has_team_replied_in_thread("CTT2", "30.0") is True
+    assert slack.methods() == ["conversations.replies"] * 2
+    assert main.has_team_replied_in_thread("CTT2", "30.0") is True
+    assert len(slack.calls) == 2
+
+def test_no_team_reply_is_rechecked_once_the_negative_entry_expires(slack, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(main.time, "time", lambda: now[0])
+    assert main.has_team_replied_in_thread("CTT3", "40.0") is False
+    assert main.has_team_replied_in_thread("CTT3", "40.0") is False
+    assert len(slack.calls) == 1
+
+    now[0] += main.TEAM_THREAD_NEGATIVE_TTL_SECONDS + 1
+    assert main.has_team_replied_in_thread("CTT3", "40.0") is False
+    assert len(slack.calls) == 2
+
+def test_the_index_keeps_the_most_recently_touched_threads(monkeypatch):
+    monkeypatch.setattr(main, "TEAM_THREAD_INDEX_MAX", 3)
+    monkeypatch.setattr(main, "team_thread_index", main.OrderedDict())
+    for thread_ts in ["1.0", "2.0", "3.0"]:
+        main.record_team_reply("CTT4", thread_ts, "UTEAM")
+    main.record_team_reply("CTT4", "1.0", "UTEAM2")
+    main.record_team_reply("CTT4", "4.0", "UTEAM")
+    assert list(main.team_thread_index) == [("CTT4", "3.0"), ("CTT4", "1.0"), ("CTT4", "4.0")]
+    assert main.team_thread_index[("CTT4", "1.0")][0] == {"UTEAM", "UTEAM2"}
@@ -0,0 +1,44 @@
+import sqlite3
+import threading
+import time
+
+import main
+
+def test_jobs_with_the_same_key_run_in_order_and_drain_on_shutdown():
+    work_queue = main.OrderedWorkQueue("test-worker", workers=3, depth=100, enqueue_timeout=1)
+    done = []
+    lock = threading.Lock()
+
+    def job(key, index):
+        time.sleep(0.001)
+        with lock:
+            done.append((key, index))
+
+    for index in range(30):
+        for key in ["a", "b", "c", "d"]:
+            assert work_queue.submit(key, job, key, index)
+    work_queue.shutdown(timeout=10)
+
+    assert len(done) == 120
+    for key in ["a", "b", "c", "d"]:
+        assert [index for done_key, index in done if done_key == key] == list(range(30))
+    assert not work_queue.submit("a", job, "a", 99)
+
+def test_full_queue_applies_backpressure():
+    work_queue = main.OrderedWorkQueue("test-full", workers=1, depth=1, enqueue_timeout=0.05)
+    release = threading.Event()
+    work_queue.submit("k", release.wait)
+    work_queue.submit("k", lambda: None)
+    assert not work_queue.submit("k", lambda: None)
+    release.set()
+    work_queue.shutdown(timeout=5)
+
+def test_exit_finishes_queued_messages(run_main):
+    path = run_main("""
+for index in range(5):
+    main.handle_message({"user": f"UCLIENT{index}", "text": f"can you check the campaign numbers {index}?",
+                         "ts": f"{1700000000 + index}.000100", "channel": "C0TEST"})
+# Exit straight away: the queued messages are left to the atexit handlers
+""", BURST_WINDOW_SECONDS=0)
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM handled_threads").fetchone()[0] == 5
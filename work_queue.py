@@ -0,0 +1,151 @@
+"""
+Background work for the Flask workers: an ordered worker pool and a timer thread
+"""
+
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+
+from logs import log_event
+
+class OrderedWorkQueue:
+    """
+    Bounded worker pool keyed by ordering key
+    Jobs with the same key always land on the same worker, so they run in order;
+    different keys spread across workers and run in parallel
+    """
+
+    def __init__(self, name, workers, depth, enqueue_timeout):
+        self.name = name
+        self.workers = workers
+        self.depth = depth
+        self.enqueue_timeout = enqueue_timeout
+        self._queues = []
+        self._threads = []
+        self._pid = None
+        self._accepting = True
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Threads don't survive a fork, so start them lazily in each worker process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queues = [queue.Queue(maxsize=self.depth) for _ in range(self.workers)]
+            self._threads = []
+            for index, jobs in enumerate(self._queues):
+                thread = threading.Thread(target=self._run, args=(jobs,), name=f"{self.name}-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._accepting = True
+            self._pid = os.getpid()
+
+    def _run(self, jobs):
+        while True:
+            job = jobs.get()
+            try:
+                if job is None:
+                    return
+                context, func, args = job
+                context.run(func, *args)
+            except Exception as e:
+                log_event("Error in work queue job", level=logging.ERROR, exc_info=True, queue=self.name, error=str(e))
+            finally:
+                jobs.task_done()
+
+    def submit(self, key, func, *args, timeout=None):
+        """
+        Queue func(*args); returns False if the queue stayed full (backpressure) or is draining
+        A full queue blocks for enqueue_timeout, or timeout seconds if given (0 never blocks)
+        """
+        if not self._accepting:
+            return False
+        self._ensure_started()
+        jobs = self._queues[zlib.crc32(key.encode()) % self.workers]
+        try:
+            # The job runs in the submitter's context, so its log lines keep the correlation id
+            jobs.put((contextvars.copy_context(), func, args), timeout=self.enqueue_timeout if timeout is None else timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def pending(self):
+        return sum(jobs.qsize() for jobs in self._queues) if self._pid == os.getpid() else 0
+
+    def shutdown(self, timeout):
+        """Stop accepting work and let queued jobs finish, up to timeout seconds"""
+        self._accepting = False
+        if self._pid != os.getpid():
+            return
+        deadline = time.time() + timeout
+        for jobs in self._queues:
+            try:
+                jobs.put(None, timeout=max(0, deadline - time.time()))
+            except queue.Full:
+                pass
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.time()))
+        if self.pending():
+            log_event("Work queue shut down with jobs still queued", level=logging.WARNING, queue=self.name, pending=self.pending())
+
+class Scheduler:
+    """
+    One thread running callbacks at their due time (debounce windows, delayed reactions)
+    Timers are entries in a heap, so call_later() and cancel() never start a thread.
+    Callbacks run on the scheduler thread and must be quick: anything that calls
+    Slack goes on to a work queue
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._pid = None
+
+    def _ensure_started(self):
+        # Threads don't survive a fork, so start the thread lazily in each worker process
+        if self._pid == os.getpid():
+            return
+        with self._condition:
+            if self._pid == os.getpid():
+                return
+            self._heap = []
+            threading.Thread(target=self._run, name=self.name, daemon=True).start()
+            self._pid = os.getpid()
+
+    def call_later(self, delay, func, *args):
+        """Run func(*args) on the scheduler thread after delay seconds; returns a handle for cancel()"""
+        self._ensure_started()
+        timer = [time.monotonic() + delay, next(self._sequence), func, args]
+        with self._condition:
+            heapq.heappush(self._heap, timer)
+            if self._heap[0] is timer:
+                self._condition.notify()
+        return timer
+
+    def cancel(self, timer):
+        # Left in the heap and skipped when it comes due
+        with self._condition:
+            timer[2] = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._condition.wait(max(0, self._heap[0][0] - time.monotonic()) if self._heap else None)
+                _, _, func, args = heapq.heappop(self._heap)
+            if func is None:
+                continue
+            try:
+                func(*args)
+            except Exception as e:
+                log_event("Error in scheduled callback", level=logging.ERROR, exc_info=True, scheduler=self.name, error=str(e))